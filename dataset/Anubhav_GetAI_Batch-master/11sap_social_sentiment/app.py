@@ -13,6 +13,7 @@ from hana_ml import dataframe
 from cfenv import AppEnv
 from hdbcli import dbapi
 from datetime import datetime
+from hana_pool import get_pool
 
 ##1. Load Environment Variables
 load_dotenv()
@@ -160,6 +161,7 @@ class issue_reporting_app():
         self.last_issue_id = 0
         self.conn = None
         self.conn_context = None
+        self.pool = None
 
 
     def get_uuid(self) -> str:
@@ -199,33 +201,50 @@ class issue_reporting_app():
             logging.error(f"Error generating UUID: {str(e)}")
             raise e
     
+    def get_credentials(self) -> tuple:
+
+        # Handle different data structures for local vs Cloud Foundry
+        if env.name is None:  # Local environment - hana is a dict
+            dbHost = hana['credentials']['host']
+            dbPort = hana['credentials']['port']
+            dbUser = hana['credentials']['user']
+            dbPwd = hana['credentials']['password']
+            ssl_cert = ""
+        else:  # Cloud Foundry environment - hana is a service object
+            dbHost = hana.credentials['host']
+            dbPort = hana.credentials['port']
+            dbUser = hana.credentials['user']
+            dbPwd = hana.credentials['password']
+            ssl_cert = hana.credentials['certificate']
+        return dbHost, dbPort, dbUser, dbPwd, ssl_cert
+
     def set_db_connection(self) -> None:
 
-        if hana is not None:
-
-            # Handle different data structures for local vs Cloud Foundry
-            if env.name is None:  # Local environment - hana is a dict
-                dbHost = hana['credentials']['host']
-                dbPort = hana['credentials']['port']
-                dbUser = hana['credentials']['user']
-                dbPwd = hana['credentials']['password']
-                ssl_cert = ""
-            else:  # Cloud Foundry environment - hana is a service object
-                dbHost = hana.credentials['host']
-                dbPort = hana.credentials['port']
-                dbUser = hana.credentials['user']
-                dbPwd = hana.credentials['password']
-                ssl_cert = hana.credentials['certificate']
-
-            self.conn = dbapi.connect(
-                address = dbHost,
-                port = dbPort,
-                user = dbUser,
-                password = dbPwd,
+        if hana is not None and self.conn is None:
+
+            dbHost, dbPort, dbUser, dbPwd, ssl_cert = self.get_credentials()
+
+            # Borrow from the process wide pool, every request used to pay a new TLS handshake
+            self.pool = get_pool(
+                dbHost,
+                dbPort,
+                dbUser,
+                dbPwd,
                 encrypt = 'true',
                 sslTrustStore = ssl_cert
                 )
-
+            self.conn = self.pool.acquire()
+
+    def release_db_connection(self) -> None:
+        # Give the connection back to the pool instead of leaking it
+        if self.conn is not None:
+            self.pool.release(self.conn)
+            self.conn = None
+
+    def get_conn_context(self):
+        # hana_ml context is only needed for write_table_to_hana, open it on first use
+        if self.conn_context is None:
+            dbHost, dbPort, dbUser, dbPwd, ssl_cert = self.get_credentials()
             self.conn_context = hana_ml.dataframe.ConnectionContext(
                 dbHost,
                 dbPort,
@@ -234,6 +253,7 @@ class issue_reporting_app():
                 encrypt='true',
                 sslValidateCertificate='false'
                 )
+        return self.conn_context
 
 
     def hello(self):
@@ -243,11 +263,13 @@ class issue_reporting_app():
         else:
             self.set_db_connection()
             connection = self.conn
-        cursor = connection.cursor()
-        cursor.execute("select CURRENT_UTCTIMESTAMP from DUMMY")
-        ro = cursor.fetchone()
-        cursor.close()
-        connection.close()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("select CURRENT_UTCTIMESTAMP from DUMMY")
+            ro = cursor.fetchone()
+            cursor.close()
+        finally:
+            self.release_db_connection()
 
         return "Current time is: " + str(ro["CURRENT_UTCTIMESTAMP"])
     
@@ -321,7 +343,7 @@ class issue_reporting_app():
         #print(df)
         
         df_remote = dataframe.create_dataframe_from_pandas(
-            connection_context = self.conn_context,
+            connection_context = self.get_conn_context(),
             schema = schema,
             pandas_df = df,
             table_name = table_name,
@@ -350,19 +372,26 @@ class issue_reporting_app():
         values_str = ', '.join(values)
         sql = f"INSERT INTO {full_table_name} ({columns_str}) VALUES ({values_str})"
         print(sql)
-        self.conn_context.sql(sql)
-        self.conn_context.connection.commit()
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(sql)
+        finally:
+            cursor.close()
+        self.conn.commit()
 
     def run_workflow(self):
         self.prepare_content()
         self.ask_llm()
         self.set_db_connection()
-        self.prepare_output()
-        #self.write_table_to_hana(self.output, "CUST_TICKETS", "DBADMIN")
-        self.insert_dataframe_to_hana(self.output, 
-                                      "USR_BI8PJTQYTZWPXDX4DCBIVKJXO",
-                                      "CUST_TICKETS"
-                                         )
+        try:
+            self.prepare_output()
+            #self.write_table_to_hana(self.output, "CUST_TICKETS", "DBADMIN")
+            self.insert_dataframe_to_hana(self.output, 
+                                          "USR_BI8PJTQYTZWPXDX4DCBIVKJXO",
+                                          "CUST_TICKETS"
+                                             )
+        finally:
+            self.release_db_connection()
         return self.response
 
 
@@ -4,6 +4,12 @@ import os
 from datetime import datetime
 from io import StringIO
 import logging
+import copy
+import time
+import threading
+import hashlib
+from contextlib import contextmanager
+from collections import OrderedDict
 
 # Import your existing vector store class and dependencies
 from langchain.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
@@ -22,6 +28,22 @@ import hana_ml
 from hana_ml import dataframe
 from cfenv import AppEnv
 from hdbcli import dbapi
+from utils.chunk_hashing import annotate_chunks, plan_sync
+from utils.ingestion_pipeline import IngestionPipeline
+from utils.embedding_cache import CachedEmbeddings, get_shared_cache
+from utils.semantic_cache import SemanticAnswerCache
+from utils.local_vector_index import LocalVectorIndex
+from utils.hybrid_retriever import BM25Index, HybridRetriever
+from utils.splitters import build_text_splitter
+from utils.context_packing import pack_context, count_tokens
+from utils.ingestion_jobs import JobStore, IngestionJobRunner, ACTIVE_STATES
+from utils.hana_pool import get_pool, pool_stats
+from utils.document_loader import load_documents
+from utils.config_diff import plan_rebuild
+from utils.snapshots import export_bytes, import_snapshot, snapshot_format
+from utils.metrics import get_metrics
+from langchain_community.callbacks import get_openai_callback
+from langchain_core.documents import Document
 
 # Initialize environment
 load_dotenv()
@@ -67,52 +89,140 @@ else:
     else:
         logging.info(f"Cloud Foundry HANA service found: {hana_service}")
 
+DEFAULT_CONFIG = {
+    'text_splitter': {
+        'type': 'CharacterTextSplitter',
+        'chunk_size': 500,
+        'chunk_overlap': 50
+    },
+    'llm_settings': {
+        'temperature': 0.7,
+        'top_p': 1.0,
+        'top_k': 50,
+        'max_tokens': 1000
+    },
+    'vector_store': {
+        'table_name': 'CUSTOM_EMBEDDINGS',
+        # hana | local | hana_replica (HANA for writes, local index for reads)
+        'backend': 'hana',
+        'local_index_dir': 'local_index',
+        'local_dtype': 'float32',
+        # none | float16 | int8 | pca; the top candidates are re-scored with the exact vectors
+        'local_compression': 'none',
+        'pca_dim': 128,
+        'rescore_factor': 4,
+        # HALF_VECTOR halves the HANA column size, only applied when the table is created
+        'hana_vector_type': 'REAL_VECTOR',
+        # similarity | hybrid (BM25 + vector, fused with reciprocal rank fusion)
+        'retrieval_mode': 'similarity',
+        'k': 4
+    },
+    'ingestion': {
+        'embed_batch_size': 64,
+        'max_workers': 4,
+        'insert_batch_size': 500,
+        # Documents ingested at the same time by the background job runner
+        'max_concurrent_jobs': 2
+    },
+    'semantic_cache': {
+        'enabled': True,
+        'threshold': 0.95,
+        'ttl_seconds': 3600,
+        'max_entries': 500
+    },
+    'context_packing': {
+        'enabled': True,
+        'max_context_tokens': 2000,
+        'dedup_threshold': 0.9
+    }
+}
+
+def with_defaults(config):
+    """Fill sections and keys missing from older rag_config.json files"""
+    merged = copy.deepcopy(DEFAULT_CONFIG)
+    for section, values in (config or {}).items():
+        if isinstance(values, dict) and isinstance(merged.get(section), dict):
+            merged[section].update(values)
+        else:
+            merged[section] = values
+    return merged
+
 class EnhancedVectorStore():
     def __init__(self, config=None) -> None:
         # Load configuration
-        self.config = config if config else self.load_default_config()
+        self.config = with_defaults(config) if config else self.load_default_config()
         
-        dep_id = os.getenv("LLM_DEPLOYMENT_ID")
         embedding_dep_id = os.getenv("LLM_EMBEDDING_MODEL_ID")
         proxy_client = get_proxy_client('gen-ai-hub')
 
         # Initialize model with configuration
-        self.model = ChatOpenAI(
-            proxy_model_name='gpt-35-turbo', 
-            proxy_client=proxy_client, 
-            deployment_id=dep_id,
-            temperature=self.config['llm_settings']['temperature'],
-            top_p=self.config['llm_settings']['top_p'],
-            max_tokens=self.config['llm_settings']['max_tokens']
-        )
+        self.model = self.build_model()
         
-        self.embeddingModel = OpenAIEmbeddings(proxy_client=proxy_client, deployment_id=embedding_dep_id)
+        # Identical chunks are never embedded twice, across sessions, tables and restarts
+        self.embeddingModel = CachedEmbeddings(
+            OpenAIEmbeddings(proxy_client=proxy_client, deployment_id=embedding_dep_id),
+            get_shared_cache(),
+            embedding_dep_id
+        )
         
+        self.pool = None
+        # Only set while an operation has a pooled connection checked out
         self.conn = None
         self.db = None
         self.retriever = None
         self.chunks = None
         self.documents = None
+        self.sync_stats = None
+        self.retriever_qa = None
+        self.replica = None
+        self.bm25 = None
+        self.table_name = None
 
     def load_default_config(self):
-        return {
-            'text_splitter': {
-                'type': 'CharacterTextSplitter',
-                'chunk_size': 500,
-                'chunk_overlap': 50
-            },
-            'llm_settings': {
-                'temperature': 0.7,
-                'top_p': 1.0,
-                'top_k': 50,
-                'max_tokens': 1000
-            },
-            'vector_store': {
-                'table_name': 'CUSTOM_EMBEDDINGS'
-            }
-        }
+        return copy.deepcopy(DEFAULT_CONFIG)
+
+    def build_model(self):
+        return ChatOpenAI(
+            proxy_model_name='gpt-35-turbo', 
+            proxy_client=get_proxy_client('gen-ai-hub'), 
+            deployment_id=os.getenv("LLM_DEPLOYMENT_ID"),
+            temperature=self.config['llm_settings']['temperature'],
+            top_p=self.config['llm_settings']['top_p'],
+            max_tokens=self.config['llm_settings']['max_tokens']
+        )
+
+    def apply_config(self, new_config) -> list:
+        """Switch to a new configuration, rebuilding only the stages whose inputs changed.
+
+        Re-chunking needs the source documents and rewriting a local index must
+        happen before any session reopens it, so 'rechunk' and 'rebuild' are left
+        to the caller; every other stage is rebuilt here.
+        """
+        stages = plan_rebuild(self.config, new_config)
+        self.config = with_defaults(new_config)
+        
+        if 'connect' in stages:
+            self.close()
+            if not self.set_db_connection():
+                raise RuntimeError("Failed to establish database connection")
+        if 'bind' in stages:
+            self.db, self.replica, self.bm25 = None, None, None
+            if not self.bind_table(self.config['vector_store']['table_name']):
+                raise RuntimeError(f"Failed to open vector table {self.config['vector_store']['table_name']}")
+        if 'retriever' in stages and not self.init_retriever():
+            raise RuntimeError("Failed to initialize retriever")
+        if 'model' in stages:
+            self.model = self.build_model()
+        if 'chain' in stages and self.get_retriever_qa() is None:
+            raise RuntimeError("Failed to create RetrievalQA system")
+        
+        logging.info(f"Applied configuration change, rebuilt stages: {stages or 'none'}")
+        return stages
 
     def set_db_connection(self) -> bool:
+        if self.config['vector_store']['backend'] == 'local':
+            logging.info("Local vector backend selected, no database connection required")
+            return True
         if hana is not None:
             try:
                 if env.name is None:
@@ -128,106 +238,304 @@ class EnhancedVectorStore():
                     dbPwd = hana.credentials['password']
                     ssl_cert = hana.credentials['certificate']
 
-                self.conn = dbapi.connect(
-                    address=dbHost,
-                    port=dbPort,
-                    user=dbUser,
-                    password=dbPwd,
+                # Connections come from the process wide pool and are only checked out per operation,
+                # so idle sessions hold none and the pool only has to cover concurrent requests and jobs
+                pool = get_pool(
+                    dbHost,
+                    dbPort,
+                    dbUser,
+                    dbPwd,
                     encrypt='true',
                     autocommit=True,
                     sslTrustStore=ssl_cert
                 )
+                # Fail here rather than on the first query when the database is unreachable
+                with pool.connection():
+                    pass
+                self.pool = pool
                 logging.info("Database connection established successfully")
                 return True
             except Exception as e:
                 logging.error(f"Failed to establish database connection: {e}")
-                self.conn = None
+                self.pool = None
                 return False
         return False
 
-    def load_text_content(self, content: str) -> bool:
+    def close(self) -> None:
+        """Detach from the pool; connections are only held during an operation"""
+        self.pool = None
+
+    @contextmanager
+    def borrow_connection(self):
+        """Check a pooled connection out for one operation, nested calls share it"""
+        if self.pool is None or self.conn is not None:
+            yield self.conn
+            return
+        with self.pool.connection() as conn:
+            self.conn = conn
+            if isinstance(self.db, HanaDB):
+                self.db.connection = conn
+            try:
+                yield conn
+            finally:
+                self.conn = None
+                if isinstance(self.db, HanaDB):
+                    self.db.connection = None
+
+    def load_files(self, files) -> bool:
+        """Parse (name, bytes) pairs - txt, md, pdf, docx or zip - and split them page by page"""
         try:
-            # Create a temporary file-like object from the content
-            from langchain_community.document_loaders import TextLoader
-            from langchain.docstore.document import Document
-            
-            # Create document from content
-            self.documents = [Document(page_content=content)]
-            
-            # Split the text into chunks based on configuration
-            splitter_type = self.config['text_splitter']['type']
-            chunk_size = self.config['text_splitter']['chunk_size']
-            chunk_overlap = self.config['text_splitter']['chunk_overlap']
+            settings = self.config['text_splitter']
+            text_splitter = build_text_splitter(settings['type'], settings['chunk_size'], settings['chunk_overlap'])
             
-            if splitter_type == 'CharacterTextSplitter':
-                text_splitter = CharacterTextSplitter(
-                    chunk_size=chunk_size, 
-                    chunk_overlap=chunk_overlap
-                )
-            else:  # RecursiveCharacterTextSplitter
-                text_splitter = RecursiveCharacterTextSplitter(
-                    chunk_size=chunk_size, 
-                    chunk_overlap=chunk_overlap
-                )
-
-            self.chunks = text_splitter.split_documents(self.documents)
-            logging.info(f"Successfully split text into {len(self.chunks)} chunks")
+            # Pages stream out of the parser process pool and are dropped once split
+            self.chunks = []
+            pages = 0
+            with get_metrics().span('split') as span:
+                for page in load_documents(files):
+                    self.chunks.extend(text_splitter.split_documents([page]))
+                    pages += 1
+                span.items = len(self.chunks)
+            self.documents = None
+            logging.info(f"Successfully split {pages} pages into {len(self.chunks)} chunks")
             return True
             
         except Exception as e:
-            logging.error(f"Failed to load text content: {e}")
+            logging.error(f"Failed to load files: {e}")
             self.chunks = None
             return False
 
-    def check_existing_embeddings(self, table_name: str) -> bool:
-        if self.conn is not None:
+    def open_local_index(self, table_name: str) -> LocalVectorIndex:
+        settings = self.config['vector_store']
+        return LocalVectorIndex(
+            self.embeddingModel,
+            path=os.path.join(settings['local_index_dir'], table_name),
+            dtype=settings['local_dtype'],
+            compression=settings['local_compression'],
+            pca_dim=settings['pca_dim'],
+            rescore_factor=settings['rescore_factor']
+        )
+
+    def count_rows(self) -> int:
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(f'SELECT COUNT(*) FROM "{self.db.table_name}"')
+            return cursor.fetchone()[0]
+        finally:
+            cursor.close()
+
+    def source_ids(self) -> set:
+        """Documents the bound table holds chunks of"""
+        if isinstance(self.db, LocalVectorIndex):
+            return self.db.metadata_values('source_id')
+        with self.borrow_connection() as conn:
+            cursor = conn.cursor()
             try:
-                cursor = self.conn.cursor()
-                cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-                count = cursor.fetchone()[0]
+                cursor.execute(
+                    f'SELECT DISTINCT JSON_VALUE("{self.db.metadata_column}", \'$.source_id\') FROM "{self.db.table_name}"'
+                )
+                return {row[0] for row in cursor.fetchall() if row[0] is not None}
+            finally:
                 cursor.close()
-                return count > 0
-            except Exception as e:
-                return False
-        return False
 
-    def save_embeddings_to_db(self, table_name: str) -> bool:
-        if self.conn is not None and self.chunks is not None:
+    def bind_table(self, table_name: str, shared_replica: bool = True) -> bool:
+        """Attach a vector store handle to the table, creating the table if required.
+
+        Sessions read from the process wide replica of the table; an ingestion
+        job writes through a private one and refreshes the shared one when done.
+        """
+        backend = self.config['vector_store']['backend']
+        self.table_name = table_name
+        if backend == 'local':
+            self.db = self.open_local_index(table_name)
+            return True
+        if self.pool is not None:
             try:
-                self.db = HanaDB(
-                    embedding=self.embeddingModel,
-                    connection=self.conn,
-                    table_name=table_name
-                )
-                
-                self.db.add_documents(self.chunks)
-                logging.info(f"Successfully saved {len(self.chunks)} document chunks to database")
+                with self.borrow_connection():
+                    self.db = HanaDB(
+                        embedding=self.embeddingModel,
+                        connection=self.conn,
+                        table_name=table_name,
+                        vector_column_type=self.config['vector_store']['hana_vector_type']
+                    )
+                    if backend == 'hana_replica':
+                        if shared_replica:
+                            self.shared_replica()
+                        else:
+                            self.replica = self.open_local_index(table_name)
+                            if len(self.replica) != self.count_rows():
+                                self.replica.replicate_from_hana(self.conn, self.db)
                 return True
             except Exception as e:
-                logging.error(f"Failed to save embeddings to database: {e}")
+                logging.error(f"Failed to bind table {table_name}: {e}")
                 self.db = None
                 return False
         return False
 
-    def load_existing_embeddings(self, table_name: str) -> bool:
-        if self.conn is not None:
+    def shared_replica(self) -> LocalVectorIndex:
+        """The table's read replica shared by all sessions, opened (and caught up with HANA) on first use"""
+        registry, lock = replica_registry()
+        settings = self.config['vector_store']
+        key = (
+            self.table_name, settings['local_index_dir'], settings['local_dtype'], settings['local_compression'],
+            settings['pca_dim'], settings['rescore_factor']
+        )
+        with lock:
+            replica = registry.get(key)
+            if replica is None:
+                replica = self.open_local_index(self.table_name)
+                with self.borrow_connection():
+                    if len(replica) != self.count_rows():
+                        replica.replicate_from_hana(self.conn, self.db)
+                registry[key] = replica
+            return replica
+
+    def read_store(self):
+        """Queries go to the local replica when there is one"""
+        if self.replica is not None:
+            return self.replica
+        if self.db is not None and self.config['vector_store']['backend'] == 'hana_replica':
+            return self.shared_replica()
+        return self.db
+
+    def fetch_all_documents(self) -> list:
+        """All chunks of the bound table, used to build the sparse index"""
+        store = self.read_store()
+        if isinstance(store, LocalVectorIndex):
+            return [Document(page_content=t, metadata=dict(m)) for t, m in zip(store.texts, store.metadatas)]
+        with self.borrow_connection() as conn:
+            cursor = conn.cursor()
             try:
-                self.db = HanaDB(
-                    embedding_function=self.embeddingModel,
-                    connection=self.conn,
-                    table_name=table_name
+                cursor.execute(f'SELECT "{store.content_column}", "{store.metadata_column}" FROM "{store.table_name}"')
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+        return [Document(page_content=text, metadata=json.loads(meta) if meta else {}) for text, meta in rows]
+
+    def bm25_path(self) -> str:
+        return os.path.join(self.config['vector_store']['local_index_dir'], f"{self.table_name}.bm25.json")
+
+    def build_sparse_index(self) -> None:
+        """(Re)build the BM25 index over every chunk in the table and persist it"""
+        # Concurrent jobs into one table each rebuild; reading the table inside the lock means the last write is the newest
+        with BM25Index.rebuild_lock(self.bm25_path()):
+            self.bm25 = BM25Index().build(self.fetch_all_documents())
+            self.bm25.save(self.bm25_path())
+        logging.info(f"Built BM25 index over {len(self.bm25.docs)} chunks")
+
+    def get_existing_chunk_hashes(self, source_id: str) -> set:
+        """Read the chunk hashes already stored for one source document"""
+        if isinstance(self.db, LocalVectorIndex):
+            return self.db.metadata_values('chunk_hash', {'source_id': source_id})
+        with self.borrow_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(
+                    f'SELECT DISTINCT JSON_VALUE("{self.db.metadata_column}", \'$.chunk_hash\') '
+                    f'FROM "{self.db.table_name}" '
+                    f'WHERE JSON_VALUE("{self.db.metadata_column}", \'$.source_id\') = ?',
+                    (source_id,)
                 )
-                logging.info(f"Successfully loaded existing embeddings from table {table_name}")
-                return True
-            except Exception as e:
-                logging.error(f"Failed to load existing embeddings: {e}")
-                return False
+                return {row[0] for row in cursor.fetchall() if row[0] is not None}
+            finally:
+                cursor.close()
+
+    def save_embeddings_to_db(self, table_name: str, source_id: str, progress_callback=None, checkpoint_callback=None) -> bool:
+        """Embed only new or changed chunks of a document and delete stale ones.
+
+        Every bulk insert is committed (HANA runs in autocommit, local indexes are
+        saved), so a rerun after a crash only embeds the chunks still missing.
+        """
+        if self.chunks is not None:
+            # Held for the whole sync: one connection per running job
+            with self.borrow_connection():
+                try:
+                    if self.db is None and not self.bind_table(table_name):
+                        return False
+
+                    annotate_chunks(self.chunks, source_id)
+                    existing_hashes = self.get_existing_chunk_hashes(source_id)
+                    to_add, stale = plan_sync(self.chunks, existing_hashes)
+
+                    stores = [self.db] + ([self.replica] if self.replica is not None else [])
+                    # Keep the IN list well below HANA's parameter limits
+                    for i in range(0, len(stale), 500):
+                        for store in stores:
+                            store.delete(filter={
+                                "source_id": source_id,
+                                "chunk_hash": {"$in": stale[i:i + 500]}
+                            })
+                    def on_flush(committed):
+                        for store in stores:
+                            if isinstance(store, LocalVectorIndex):
+                                store.save()
+                        if checkpoint_callback is not None:
+                            checkpoint_callback(committed)
+
+                    if to_add:
+                        ingestion = self.config['ingestion']
+                        pipeline = IngestionPipeline(
+                            self.embeddingModel,
+                            self.db,
+                            embed_batch_size=ingestion['embed_batch_size'],
+                            max_workers=ingestion['max_workers'],
+                            insert_batch_size=ingestion['insert_batch_size'],
+                            progress_callback=progress_callback,
+                            mirrors=stores[1:],
+                            checkpoint_callback=on_flush
+                        )
+                        pipeline.run(to_add)
+                    for store in stores:
+                        if isinstance(store, LocalVectorIndex):
+                            store.save()
+                
+                    # The sparse index is built at ingestion time, only when the table changed
+                    if self.config['vector_store']['retrieval_mode'] == 'hybrid':
+                        if to_add or stale or not os.path.exists(self.bm25_path()):
+                            self.build_sparse_index()
+
+                    self.sync_stats = {
+                        'added': len(to_add),
+                        'deleted': len(stale),
+                        'unchanged': len(existing_hashes) - len(stale)
+                    }
+                    logging.info(f"Synced {source_id} into {table_name}: {self.sync_stats}")
+                    return True
+                except Exception as e:
+                    logging.error(f"Failed to sync embeddings to database: {e}")
+                    self.db = None
+                    return False
         return False
 
+    def import_snapshot(self, source, fmt: str) -> dict:
+        """Load a snapshot into the bound table without calling the embedding service"""
+        with self.borrow_connection():
+            manifest = import_snapshot(source, self.db, embedding_model=self.embeddingModel.deployment_id, fmt=fmt)
+            if self.config['vector_store']['backend'] == 'hana_replica':
+                # Rewrite the replica files, the sessions reopen them on their next query
+                self.open_local_index(self.table_name).replicate_from_hana(self.conn, self.db)
+                invalidate_replicas(self.table_name)
+            if self.config['vector_store']['retrieval_mode'] == 'hybrid':
+                self.build_sparse_index()
+        return manifest
+
     def init_retriever(self) -> bool:
         if self.db is not None:
             try:
-                self.retriever = self.db.as_retriever()
+                settings = self.config['vector_store']
+                if settings['retrieval_mode'] == 'hybrid':
+                    if self.bm25 is None:
+                        if os.path.exists(self.bm25_path()):
+                            self.bm25 = BM25Index.load(self.bm25_path())
+                        else:
+                            self.build_sparse_index()
+                    self.retriever = HybridRetriever(
+                        vector_store=self.read_store(),
+                        bm25=self.bm25,
+                        k=settings['k']
+                    )
+                else:
+                    self.retriever = self.read_store().as_retriever(search_kwargs={'k': settings['k']})
                 logging.info("Retriever initialized successfully")
                 return True
             except Exception as e:
@@ -243,12 +551,317 @@ class EnhancedVectorStore():
                     llm=self.model,
                     retriever=self.retriever
                 )
+                self.retriever_qa = retrieval_qa
                 return retrieval_qa
             except Exception as e:
                 logging.error(f"Failed to create RetrievalQA: {e}")
                 return None
         return None
 
+    def retrieve(self, query: str, query_vector: list) -> list:
+        """Similarity (or hybrid) search with an already computed query embedding"""
+        with self.borrow_connection():
+            store = self.read_store()
+            if isinstance(self.retriever, HybridRetriever):
+                # The shared replica is swapped for a fresh one after ingestion
+                self.retriever.vector_store = store
+                return self.retriever.search(query, query_vector)
+            return store.similarity_search_by_vector(query_vector, k=self.config['vector_store']['k'])
+
+    def answer_query(self, query: str, query_vector: list = None) -> dict:
+        """Retrieve once and feed the same documents to the LLM, timing each stage"""
+        metrics = get_metrics()
+        timings = {'embed': 0.0}
+        
+        if query_vector is None:
+            with metrics.span('query_embed') as span:
+                query_vector = self.embeddingModel.embed_query(query)
+                span.items = 1
+                span.tokens = {'input': count_tokens(query)}
+            timings['embed'] = span.duration
+        
+        with metrics.span('search') as span:
+            docs = self.retrieve(query, query_vector)
+            span.items = len(docs)
+        timings['search'] = span.duration
+        
+        # Merge overlapping chunks, drop near-duplicates and stay within the prompt token budget
+        packing = self.config['context_packing']
+        packing_stats = None
+        with metrics.span('pack') as span:
+            if packing['enabled']:
+                docs, packing_stats = pack_context(docs, packing['max_context_tokens'], packing['dedup_threshold'])
+            span.items = len(docs)
+        timings['pack'] = span.duration
+        
+        with metrics.span('generate') as span, get_openai_callback() as usage:
+            answer = self.retriever_qa.combine_documents_chain.run(input_documents=docs, question=query)
+            span.items = len(docs)
+            if usage.total_tokens:
+                span.tokens = {'prompt': usage.prompt_tokens, 'completion': usage.completion_tokens}
+            else:
+                # The proxy did not report usage, estimate it
+                span.tokens = {
+                    'prompt': count_tokens(query) + sum(count_tokens(d.page_content) for d in docs),
+                    'completion': count_tokens(answer)
+                }
+        timings['generate'] = span.duration
+        
+        return {'result': answer, 'source_documents': docs, 'timings': timings, 'packing': packing_stats}
+
+# Config sections that change the answer to a question; answers cached under other settings are not reused
+ANSWER_CONFIG_SECTIONS = ['llm_settings', 'vector_store', 'text_splitter', 'context_packing']
+# Settings variants kept per table; older ones are dropped with their answers
+SEMANTIC_CACHES_PER_TABLE = 4
+
+def answer_settings_key(config):
+    settings = {section: config.get(section) for section in ANSWER_CONFIG_SECTIONS}
+    settings['llm_deployment_id'] = os.getenv("LLM_DEPLOYMENT_ID")
+    return hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+@st.cache_resource
+def replica_registry():
+    """Local read replicas of this process by table and index settings"""
+    return {}, threading.Lock()
+
+def invalidate_replicas(table_name):
+    """Drop the shared replicas of a table; the next query reopens them from the files the job saved"""
+    registry, lock = replica_registry()
+    with lock:
+        for key in [key for key in registry if key[0] == table_name]:
+            del registry[key]
+
+@st.cache_resource
+def semantic_cache_registry():
+    """Answer caches of this process by table, then by cache and answer settings, least recently used first"""
+    return {}, threading.Lock()
+
+def get_semantic_cache(table_name, config):
+    """One answer cache per vector table and answer settings, shared by all sessions of this process"""
+    registry, lock = semantic_cache_registry()
+    settings = config['semantic_cache']
+    key = (settings['threshold'], settings['ttl_seconds'], settings['max_entries'], answer_settings_key(config))
+    with lock:
+        caches = registry.setdefault(table_name, OrderedDict())
+        if key in caches:
+            caches.move_to_end(key)
+        else:
+            caches[key] = SemanticAnswerCache(
+                threshold=settings['threshold'],
+                ttl_seconds=settings['ttl_seconds'],
+                max_entries=settings['max_entries']
+            )
+            while len(caches) > SEMANTIC_CACHES_PER_TABLE:
+                caches.popitem(last=False)
+        return caches[key]
+
+def invalidate_semantic_caches(table_name):
+    """Drop the cached answers of a table under every settings"""
+    registry, lock = semantic_cache_registry()
+    with lock:
+        caches = list(registry.get(table_name, {}).values())
+    for cache in caches:
+        cache.invalidate()
+
+def current_semantic_cache():
+    return get_semantic_cache(st.session_state.config['vector_store']['table_name'], st.session_state.config)
+
+def run_ingestion_job(job, report):
+    """Background worker: split one document and sync its chunks into the vector table"""
+    app = EnhancedVectorStore(job['config'])
+    try:
+        report(stage='connect')
+        if not app.set_db_connection():
+            raise RuntimeError("Failed to establish database connection")
+        
+        report(stage='split')
+        if not app.load_files([(job['source_id'], job['content'])]):
+            raise RuntimeError("Failed to process document")
+        
+        report(stage='bind')
+        if not app.bind_table(job['table_name'], shared_replica=False):
+            raise RuntimeError(f"Failed to open vector table {job['table_name']}")
+        
+        # Chunks committed by an earlier attempt are already in the table and are skipped
+        report(stage='embed', embedded=0)
+        if not app.save_embeddings_to_db(
+            job['table_name'],
+            job['source_id'],
+            progress_callback=lambda done, total: report(embedded=done, total=total),
+            checkpoint_callback=lambda committed: report(committed=committed)
+        ):
+            raise RuntimeError("Failed to save embeddings to database")
+        
+        stats = app.sync_stats
+        # Cached answers may quote chunks that just changed
+        if stats['added'] or stats['deleted']:
+            invalidate_replicas(job['table_name'])
+            invalidate_semantic_caches(job['table_name'])
+        return stats
+    finally:
+        app.close()
+
+@st.cache_resource
+def get_job_runner():
+    """One job runner per process; jobs left unfinished by a previous process are resumed"""
+    config = with_defaults(load_config_from_json())
+    runner = IngestionJobRunner(
+        JobStore(os.getenv("INGESTION_JOBS_PATH", "ingestion_jobs.sqlite")),
+        run_ingestion_job,
+        max_jobs=config['ingestion']['max_concurrent_jobs']
+    )
+    # Uploads of jobs that failed and were left alone are not kept forever
+    expired = runner.store.expire_failed_payloads(float(os.getenv("INGESTION_PAYLOAD_TTL_DAYS", "7")) * 86400)
+    if expired:
+        logging.info(f"Dropped the uploads of {expired} old failed ingestion jobs")
+    resumed = runner.resume_unfinished()
+    if resumed:
+        logging.info(f"Resumed {resumed} unfinished ingestion jobs")
+    return runner
+
+def submit_ingestion_job(config, source_id, content):
+    table_name = config['vector_store']['table_name']
+    # Local index files are rewritten on every checkpoint, so one writer per table there
+    if config['vector_store']['backend'] == 'hana':
+        lock_key = f"{table_name}/{source_id}"
+    else:
+        lock_key = table_name
+    return get_job_runner().submit(table_name, source_id, lock_key, copy.deepcopy(config), content)
+
+def rebuild_local_index(config):
+    """Rewrite the table's local index or replica in the configured storage dtype"""
+    settings = config['vector_store']
+    if settings['backend'] == 'hana':
+        return
+    # Same lock as the ingestion jobs writing a local index
+    with get_job_runner().lock_for(settings['table_name']):
+        index = LocalVectorIndex(
+            None,
+            path=os.path.join(settings['local_index_dir'], settings['table_name']),
+            dtype=settings['local_dtype'],
+            compression=settings['local_compression'],
+            pca_dim=settings['pca_dim']
+        )
+        if len(index) and index.dtype.name != settings['local_dtype']:
+            index.set_dtype(settings['local_dtype'])
+            index.save()
+            logging.info(f"Rewrote local index {index.path} as {settings['local_dtype']}")
+
+def table_source_ids(config):
+    """Documents in the configured table, through the session's store when it has the table open"""
+    app = st.session_state.vector_store_app
+    if not st.session_state.rag_initialized or app.table_name != config['vector_store']['table_name']:
+        app = EnhancedVectorStore(config)
+        if not app.set_db_connection() or not app.bind_table(config['vector_store']['table_name']):
+            raise RuntimeError("Failed to open the vector table")
+    return app.source_ids()
+
+def apply_config_change(old_config, new_config):
+    """Save a new configuration and rebuild only the parts of the RAG system it affects"""
+    if not save_config_to_json(new_config):
+        return None
+    stages = plan_rebuild(old_config, new_config)
+    
+    if 'rebuild' in stages:
+        try:
+            rebuild_local_index(new_config)
+        except Exception as e:
+            st.error(f"❌ Failed to rewrite the local index: {e}")
+    
+    if st.session_state.rag_initialized and stages:
+        try:
+            st.session_state.vector_store_app.apply_config(new_config)
+        except Exception as e:
+            st.error(f"❌ Failed to apply configuration: {e}")
+            st.session_state.rag_initialized = False
+            return stages
+    
+    if 'rechunk' in stages:
+        # Re-split the documents already in the table; the chunk hash sync only embeds chunks whose text changed
+        # The retriever and BM25 index are reattached when these jobs finish, see the main console
+        runner = get_job_runner()
+        table_name = new_config['vector_store']['table_name']
+        resubmitted = set()
+        for job in runner.store.latest_per_source(table_name):
+            job = runner.store.get(job['job_id'], with_content=True)
+            if job is None or not job['content']:
+                continue
+            st.session_state.ingestion_jobs.append(
+                submit_ingestion_job(new_config, job['source_id'], job['content'])
+            )
+            resubmitted.add(job['source_id'])
+        try:
+            missing = sorted(table_source_ids(new_config) - resubmitted)
+        except Exception as e:
+            st.warning(f"⚠️ Could not list the documents in {table_name}: {e}")
+            missing = []
+        if missing:
+            st.warning(
+                f"⚠️ {len(missing)} documents in {table_name} have no stored upload and keep their old chunks, "
+                f"upload them again to re-split them: {', '.join(missing)}"
+            )
+    return stages
+
+def attach_rag_system():
+    """Open the configured table for querying in this session"""
+    app = EnhancedVectorStore(st.session_state.config)
+    table_name = st.session_state.config['vector_store']['table_name']
+    if not app.set_db_connection():
+        st.error("❌ Failed to establish database connection")
+        return False
+    if not app.bind_table(table_name):
+        st.error(f"❌ Failed to open vector table {table_name}")
+        return False
+    if not app.init_retriever():
+        st.error("❌ Failed to initialize retriever")
+        return False
+    retriever_qa = app.get_retriever_qa()
+    if retriever_qa is None:
+        st.error("❌ Failed to create RetrievalQA system")
+        return False
+    
+    if st.session_state.vector_store_app is not None:
+        st.session_state.vector_store_app.close()
+    st.session_state.vector_store_app = app
+    st.session_state.retriever_qa = retriever_qa
+    st.session_state.rag_initialized = True
+    return True
+
+@st.fragment(run_every=2)
+def ingestion_jobs_panel():
+    """Polls the job store; the work itself happens on the job runner threads"""
+    runner = get_job_runner()
+    jobs = runner.store.recent(limit=10)
+    if not jobs:
+        st.caption("No ingestion jobs yet")
+        return
+    
+    for job in jobs:
+        label = f"**{job['source_id']}** → {job['table_name']}"
+        if job['status'] in ACTIVE_STATES:
+            done = job['embedded'] / job['total'] if job['total'] else 0.0
+            st.progress(
+                done,
+                text=f"{label} · {job['status']} ({job['stage'] or 'waiting'}) · "
+                     f"{job['embedded']}/{job['total']} embedded, {job['committed']} committed"
+            )
+        elif job['status'] == 'done':
+            st.write(
+                f"✅ {label}: {job['added']} new, {job['unchanged']} unchanged, "
+                f"{job['deleted']} stale removed"
+            )
+        else:
+            col_job, col_retry = st.columns([4, 1])
+            col_job.write(f"❌ {label}: {job['error']} ({job['committed']} chunks committed)")
+            if col_retry.button("🔁 Retry", key=f"retry_{job['job_id']}"):
+                runner.retry(job['job_id'])
+    
+    # Hand over to the full page once this session's jobs are finished
+    # Jobs whose rows were pruned from the store count as finished
+    session_jobs = [runner.store.get(job_id) for job_id in st.session_state.ingestion_jobs]
+    if session_jobs and all(job is None or job['status'] not in ACTIVE_STATES for job in session_jobs):
+        st.rerun()
+
 def save_config_to_json(config, filename="rag_config.json"):
     """Save configuration to JSON file"""
     try:
@@ -274,31 +887,16 @@ def load_config_from_json(filename="rag_config.json"):
 if 'config' not in st.session_state:
     # Try to load existing config
     saved_config = load_config_from_json()
-    if saved_config:
-        st.session_state.config = saved_config
-    else:
-        st.session_state.config = {
-            'text_splitter': {
-                'type': 'CharacterTextSplitter',
-                'chunk_size': 500,
-                'chunk_overlap': 50
-            },
-            'llm_settings': {
-                'temperature': 0.7,
-                'top_p': 1.0,
-                'top_k': 50,
-                'max_tokens': 1000
-            },
-            'vector_store': {
-                'table_name': 'CUSTOM_EMBEDDINGS'
-            }
-        }
+    st.session_state.config = with_defaults(saved_config)
 
 if 'rag_initialized' not in st.session_state:
     st.session_state.rag_initialized = False
     st.session_state.vector_store_app = None
     st.session_state.retriever_qa = None
 
+if 'ingestion_jobs' not in st.session_state:
+    st.session_state.ingestion_jobs = []
+
 # Page Layout
 st.set_page_config(page_title="RAG Admin Console", layout="wide")
 
@@ -378,9 +976,182 @@ with col1:
             "HANA Table Name",
             value=st.session_state.config['vector_store']['table_name']
         )
+        
+        backend_options = ["hana", "local", "hana_replica"]
+        vector_backend = st.selectbox(
+            "Vector Backend",
+            options=backend_options,
+            index=backend_options.index(st.session_state.config['vector_store']['backend']),
+            format_func=lambda b: {
+                'hana': 'SAP HANA Cloud',
+                'local': 'Local NumPy index (offline)',
+                'hana_replica': 'SAP HANA + local read replica'
+            }[b]
+        )
+        
+        local_dtype = st.selectbox(
+            "Local Index Precision",
+            options=["float32", "float16"],
+            index=0 if st.session_state.config['vector_store']['local_dtype'] == 'float32' else 1
+        )
+        
+        compression_options = ["none", "float16", "int8", "pca"]
+        local_compression = st.selectbox(
+            "Local Index Compression",
+            options=compression_options,
+            index=compression_options.index(st.session_state.config['vector_store']['local_compression']),
+            format_func=lambda c: {
+                'none': 'None (scan exact vectors)',
+                'float16': 'float16 (2x smaller)',
+                'int8': 'int8 with per-vector scale (4x smaller)',
+                'pca': 'PCA projection fitted on the corpus'
+            }[c],
+            help="Queries scan the compressed copy; the best candidates are re-scored with the exact vectors. "
+                 "Run benchmark_compression.py to see the recall loss per setting."
+        )
+        
+        pca_col, rescore_col = st.columns(2)
+        with pca_col:
+            pca_dim = st.number_input(
+                "PCA Dimensions",
+                min_value=16,
+                max_value=1536,
+                value=st.session_state.config['vector_store']['pca_dim'],
+                step=16,
+                disabled=local_compression != 'pca'
+            )
+        with rescore_col:
+            rescore_factor = st.number_input(
+                "Re-score Candidates (x k)",
+                min_value=0,
+                max_value=50,
+                value=st.session_state.config['vector_store']['rescore_factor'],
+                step=1,
+                help="0 returns the compressed scores without exact re-scoring"
+            )
+        
+        hana_vector_options = ["REAL_VECTOR", "HALF_VECTOR"]
+        hana_vector_type = st.selectbox(
+            "HANA Vector Column Type",
+            options=hana_vector_options,
+            index=hana_vector_options.index(st.session_state.config['vector_store']['hana_vector_type']),
+            help="HALF_VECTOR stores 16-bit floats (HANA Cloud 2025 QRC1 or newer). "
+                 "Only used when a new table is created."
+        )
+        
+        retrieval_mode = st.radio(
+            "Retrieval Mode",
+            options=["similarity", "hybrid"],
+            index=0 if st.session_state.config['vector_store']['retrieval_mode'] == 'similarity' else 1,
+            format_func=lambda m: "Vector similarity" if m == 'similarity' else "Hybrid (BM25 + vector, RRF)",
+            horizontal=True
+        )
+        
+        # Chunks passed to the LLM per question
+        retriever_k = st.number_input(
+            "Documents per Query (k)",
+            min_value=1,
+            max_value=20,
+            value=st.session_state.config['vector_store']['k'],
+            step=1
+        )
+    
+    with st.expander("📥 Ingestion Settings", expanded=False):
+        # Chunks sent to the embedding deployment per request
+        embed_batch_size = st.number_input(
+            "Embedding Batch Size",
+            min_value=1,
+            max_value=2048,
+            value=st.session_state.config['ingestion']['embed_batch_size'],
+            step=16
+        )
+        
+        # Upper bound for parallel embedding requests (reduced automatically on throttling)
+        max_workers = st.number_input(
+            "Max Concurrent Embedding Requests",
+            min_value=1,
+            max_value=32,
+            value=st.session_state.config['ingestion']['max_workers'],
+            step=1
+        )
+        
+        # Rows per HANA bulk insert
+        insert_batch_size = st.number_input(
+            "HANA Insert Batch Size",
+            min_value=50,
+            max_value=10000,
+            value=st.session_state.config['ingestion']['insert_batch_size'],
+            step=50
+        )
+        
+        max_concurrent_jobs = st.number_input(
+            "Concurrent Ingestion Jobs",
+            min_value=1,
+            max_value=8,
+            value=st.session_state.config['ingestion']['max_concurrent_jobs'],
+            step=1,
+            help="Applied when the admin console process starts"
+        )
+    
+    with st.expander("⚡ Semantic Answer Cache", expanded=False):
+        cache_enabled = st.checkbox(
+            "Enable Semantic Cache",
+            value=st.session_state.config['semantic_cache']['enabled']
+        )
+        
+        # Minimum cosine similarity between two questions to reuse an answer
+        cache_threshold = st.slider(
+            "Similarity Threshold",
+            min_value=0.80,
+            max_value=1.0,
+            value=float(st.session_state.config['semantic_cache']['threshold']),
+            step=0.01
+        )
+        
+        cache_ttl = st.number_input(
+            "Answer TTL (seconds)",
+            min_value=60,
+            max_value=7 * 24 * 3600,
+            value=st.session_state.config['semantic_cache']['ttl_seconds'],
+            step=300
+        )
+        
+        cache_max_entries = st.number_input(
+            "Max Cached Answers",
+            min_value=10,
+            max_value=10000,
+            value=st.session_state.config['semantic_cache']['max_entries'],
+            step=50
+        )
+    
+    with st.expander("🧩 Context Packing", expanded=False):
+        packing_enabled = st.checkbox(
+            "Pack Retrieved Context",
+            value=st.session_state.config['context_packing']['enabled'],
+            help="Merge overlapping chunks and drop near-duplicates before calling the LLM"
+        )
+        
+        # Token budget for the retrieved documents in the prompt
+        max_context_tokens = st.number_input(
+            "Max Context Tokens",
+            min_value=100,
+            max_value=32000,
+            value=st.session_state.config['context_packing']['max_context_tokens'],
+            step=100
+        )
+        
+        # Share of common word 3-grams above which the lower ranked chunk is dropped
+        dedup_threshold = st.slider(
+            "Near-Duplicate Threshold",
+            min_value=0.5,
+            max_value=1.0,
+            value=float(st.session_state.config['context_packing']['dedup_threshold']),
+            step=0.05
+        )
     
     # Save Configuration Button
     if st.button("💾 Save Configuration", type="primary"):
+        old_config = copy.deepcopy(st.session_state.config)
         # Update session state with new values
         st.session_state.config = {
             'text_splitter': {
@@ -395,13 +1166,49 @@ with col1:
                 'max_tokens': max_tokens
             },
             'vector_store': {
-                'table_name': table_name
+                'table_name': table_name,
+                'backend': vector_backend,
+                'local_index_dir': st.session_state.config['vector_store']['local_index_dir'],
+                'local_dtype': local_dtype,
+                'local_compression': local_compression,
+                'pca_dim': pca_dim,
+                'rescore_factor': rescore_factor,
+                'hana_vector_type': hana_vector_type,
+                'retrieval_mode': retrieval_mode,
+                'k': retriever_k
+            },
+            'ingestion': {
+                'embed_batch_size': embed_batch_size,
+                'max_workers': max_workers,
+                'insert_batch_size': insert_batch_size,
+                'max_concurrent_jobs': max_concurrent_jobs
+            },
+            'semantic_cache': {
+                'enabled': cache_enabled,
+                'threshold': cache_threshold,
+                'ttl_seconds': cache_ttl,
+                'max_entries': cache_max_entries
+            },
+            'context_packing': {
+                'enabled': packing_enabled,
+                'max_context_tokens': max_context_tokens,
+                'dedup_threshold': dedup_threshold
             }
         }
         
-        # Save to JSON file
-        if save_config_to_json(st.session_state.config):
+        # Save to JSON file and rebuild only the affected stages
+        start = time.perf_counter()
+        stages = apply_config_change(old_config, st.session_state.config)
+        if stages is not None:
             st.success("✅ Configuration saved successfully!")
+            if st.session_state.rag_initialized:
+                rebuilt = ", ".join(s for s in stages if s != 'rechunk') or "nothing"
+                st.caption(f"Rebuilt {rebuilt} in {(time.perf_counter() - start) * 1000:.0f} ms")
+            if 'rechunk' in stages:
+                st.info(
+                    "🔁 Splitter changed: re-chunking the documents in the background, only changed chunks are embedded. "
+                    "The retriever switches to the new chunks once the jobs finish."
+                )
             st.json(st.session_state.config)
         else:
             st.error("❌ Failed to save configuration")
@@ -412,27 +1219,30 @@ with col2:
     
     # File Upload Section
     st.subheader("📎 Document Upload")
-    uploaded_file = st.file_uploader(
-        "Choose a text file",
-        type=['txt'],
-        help="Upload a text file to create embeddings for the RAG system"
+    uploaded_files = st.file_uploader(
+        "Choose documents",
+        type=['txt', 'md', 'pdf', 'docx', 'zip'],
+        accept_multiple_files=True,
+        help="Upload text, Markdown, PDF or Word files (or a zip of them) to create embeddings for the RAG system"
     )
     
     # Show file details if uploaded
-    if uploaded_file is not None:
-        file_details = {
-            "Filename": uploaded_file.name,
-            "File size": f"{uploaded_file.size} bytes",
-            "File type": uploaded_file.type
-        }
-        
+    if uploaded_files:
         st.subheader("📋 File Details")
-        for key, value in file_details.items():
-            st.write(f"**{key}:** {value}")
+        st.dataframe(pd.DataFrame([
+            {
+                "Filename": uploaded_file.name,
+                "File size": f"{uploaded_file.size} bytes",
+                "File type": uploaded_file.type
+            }
+            for uploaded_file in uploaded_files
+        ]), hide_index=True)
         
         # Show file content preview
         if st.checkbox("Show file preview"):
-            content = StringIO(uploaded_file.getvalue().decode("utf-8")).read()
+            preview_file = st.selectbox("File", uploaded_files, format_func=lambda f: f.name)
+            preview_page = next(load_documents([(preview_file.name, preview_file.getvalue())]), None)
+            content = preview_page.page_content if preview_page is not None else ""
             st.text_area("File Content Preview", content[:1000] + "..." if len(content) > 1000 else content, height=200)
     
     # Configuration Status
@@ -445,7 +1255,10 @@ with col2:
         st.metric("Configuration", config_status)
     
     with col_status2:
-        db_status = "✅ Connected" if hana is not None else "❌ Not Connected" 
+        if st.session_state.config['vector_store']['backend'] == 'local':
+            db_status = "💻 Local Index"
+        else:
+            db_status = "✅ Connected" if hana is not None else "❌ Not Connected" 
         st.metric("Database", db_status)
     
     with col_status3:
@@ -459,135 +1272,50 @@ with col2:
     # Initialize RAG System Button
     st.subheader("🚀 Initialize RAG System")
     
-    if uploaded_file is not None:
-        if st.button("🔄 Initialize RAG System", type="primary", disabled=st.session_state.rag_initialized):
-            
-            # Progress tracking
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-            step_container = st.container()
-            
-            try:
-                with step_container:
-                    # Step 1: Initialize Vector Store
-                    status_text.text("Step 1/6: Initializing Vector Store...")
-                    progress_bar.progress(10)
-                    
-                    app = EnhancedVectorStore(st.session_state.config)
-                    st.write("✅ Vector Store object created")
-                    
-                    # Step 2: Set Database Connection
-                    status_text.text("Step 2/6: Establishing Database Connection...")
-                    progress_bar.progress(20)
-                    
-                    if app.set_db_connection():
-                        st.write("✅ Database connection established")
-                    else:
-                        st.error("❌ Failed to establish database connection")
-                        st.stop()
-                    
-                    # Step 3: Process Document
-                    status_text.text("Step 3/6: Processing Document...")
-                    progress_bar.progress(40)
-                    
-                    # Read uploaded file content
-                    content = StringIO(uploaded_file.getvalue().decode("utf-8")).read()
-                    
-                    if app.load_text_content(content):
-                        st.write(f"✅ Document processed into {len(app.chunks)} chunks")
-                        
-                        # Show chunk preview
-                        with st.expander("Document Chunks Preview"):
-                            for i, chunk in enumerate(app.chunks[:3]):  # Show first 3 chunks
-                                st.write(f"**Chunk {i+1}:** {chunk.page_content[:150]}...")
-                    else:
-                        st.error("❌ Failed to process document")
-                        st.stop()
-                    
-                    # Step 4: Check Existing Embeddings
-                    status_text.text("Step 4/6: Checking Existing Embeddings...")
-                    progress_bar.progress(50)
-                    
-                    table_name = st.session_state.config['vector_store']['table_name']
-                    embeddings_exist = app.check_existing_embeddings(table_name)
-                    
-                    if embeddings_exist:
-                        st.write(f"✅ Found existing embeddings in table {table_name}")
-                        if app.load_existing_embeddings(table_name):
-                            st.write("✅ Existing embeddings loaded")
-                        else:
-                            st.write("⚠️ Failed to load existing embeddings, creating new ones...")
-                            embeddings_exist = False
-                    else:
-                        st.write(f"ℹ️ No existing embeddings found in table {table_name}")
-                    
-                    # Step 5: Create/Save Embeddings
-                    if not embeddings_exist:
-                        status_text.text("Step 5/6: Creating and Saving Embeddings...")
-                        progress_bar.progress(70)
-                        
-                        if app.save_embeddings_to_db(table_name):
-                            st.write("✅ Embeddings created and saved to database")
-                        else:
-                            st.error("❌ Failed to save embeddings to database")
-                            st.stop()
-                    else:
-                        progress_bar.progress(70)
-                    
-                    # Step 6: Initialize Retriever
-                    status_text.text("Step 6/6: Initializing Retriever...")
-                    progress_bar.progress(90)
-                    
-                    if app.init_retriever():
-                        st.write("✅ Retriever initialized")
-                    else:
-                        st.error("❌ Failed to initialize retriever")
-                        st.stop()
-                    
-                    # Final step: Create RetrievalQA
-                    retriever_qa = app.get_retriever_qa()
-                    if retriever_qa is not None:
-                        st.write("✅ RetrievalQA system created")
-                        
-                        # Store in session state
-                        st.session_state.vector_store_app = app
-                        st.session_state.retriever_qa = retriever_qa
-                        st.session_state.rag_initialized = True
-                        
-                        progress_bar.progress(100)
-                        status_text.text("🎉 RAG System Successfully Initialized!")
-                        
-                        st.success("🎉 **HANA Vector DB is Ready!**")
-                        st.balloons()
-                        
-                        # Test the system
-                        with st.expander("🧪 Test the System"):
-                            test_query = st.text_input("Enter a test query:", value="What is this document about?")
-                            if st.button("Test Query"):
-                                if test_query:
-                                    try:
-                                        response = retriever_qa.invoke(test_query)
-                                        st.write("**Test Response:**")
-                                        st.write(response['result'])
-                                    except Exception as e:
-                                        st.error(f"Test query failed: {e}")
-                    else:
-                        st.error("❌ Failed to create RetrievalQA system")
-                        
-            except Exception as e:
-                st.error(f"❌ Initialization failed: {e}")
-                logging.error(f"RAG initialization failed: {e}")
-        
-        # Reset button
-        if st.session_state.rag_initialized:
-            if st.button("🔄 Reset RAG System"):
-                st.session_state.rag_initialized = False
-                st.session_state.vector_store_app = None
-                st.session_state.retriever_qa = None
-                st.rerun()
+    # Ingestion runs in background jobs; this page only submits them and polls their progress
+    session_jobs_active = any(
+        job is not None and job['status'] in ACTIVE_STATES
+        for job in (get_job_runner().store.get(job_id) for job_id in st.session_state.ingestion_jobs)
+    )
+    
+    # Once this session's jobs are finished, open the table for querying
+    if st.session_state.ingestion_jobs and not session_jobs_active:
+        finished = [get_job_runner().store.get(job_id) for job_id in st.session_state.ingestion_jobs]
+        st.session_state.ingestion_jobs = []
+        if all(job is not None and job['status'] == 'done' for job in finished):
+            with st.spinner("Initializing retriever..."):
+                if attach_rag_system():
+                    st.success("🎉 **HANA Vector DB is Ready!**")
+                    st.balloons()
+        else:
+            st.error("❌ Some documents failed to ingest, retry them below")
     
+    if uploaded_files:
+        if st.button("🔄 Initialize RAG System", type="primary", disabled=session_jobs_active):
+            for uploaded_file in uploaded_files:
+                job_id = submit_ingestion_job(st.session_state.config, uploaded_file.name, uploaded_file.getvalue())
+                st.session_state.ingestion_jobs.append(job_id)
+            st.rerun()
     else:
-        st.info("📁 Please upload a text file to initialize the RAG system")
+        st.info("📁 Please upload documents to initialize the RAG system")
+    
+    st.subheader("📋 Ingestion Jobs")
+    ingestion_jobs_panel()
+    
+    # Jobs keep running after a browser refresh; reconnect to the table without re-uploading
+    if not st.session_state.rag_initialized and not session_jobs_active:
+        if st.button("🔗 Connect to Existing Table"):
+            if attach_rag_system():
+                st.rerun()
+    
+    # Reset button
+    if st.session_state.rag_initialized:
+        if st.button("🔄 Reset RAG System"):
+            st.session_state.rag_initialized = False
+            st.session_state.vector_store_app.close()
+            st.session_state.vector_store_app = None
+            st.session_state.retriever_qa = None
+            st.rerun()
     
     # Show initialization status
     if st.session_state.rag_initialized:
@@ -601,13 +1329,56 @@ with col2:
             if user_query.strip():
                 try:
                     with st.spinner("Processing query..."):
-                        response = st.session_state.retriever_qa.invoke(user_query)
+                        app = st.session_state.vector_store_app
+                        use_cache = st.session_state.config['semantic_cache']['enabled']
+                        semantic_cache = current_semantic_cache()
+                        
+                        # The query is embedded once and reused for the cache lookup and the search
+                        with get_metrics().span('query_embed') as span:
+                            query_vector = app.embeddingModel.embed_query(user_query)
+                            span.items = 1
+                            span.tokens = {'input': count_tokens(user_query)}
+                        embed_time = span.duration
+                        # An ingestion job finishing while this answer is generated makes it stale
+                        generation = semantic_cache.generation
+                        hit = semantic_cache.lookup(query_vector) if use_cache else None
+                        
+                        if hit is not None:
+                            answer, docs = hit['answer'], hit['sources']
+                            timings = {'embed': embed_time, 'search': 0.0, 'pack': 0.0, 'generate': 0.0}
+                            packing_stats = None
+                            st.caption(
+                                f"⚡ Answered from semantic cache (similar to \"{hit['query']}\", "
+                                f"similarity {hit['similarity']:.3f}, saved {hit['latency']:.2f}s)"
+                            )
+                        else:
+                            response = app.answer_query(user_query, query_vector)
+                            answer, docs, timings = response['result'], response['source_documents'], response['timings']
+                            packing_stats = response['packing']
+                            timings['embed'] = embed_time
+                            if use_cache:
+                                semantic_cache.store(
+                                    user_query, query_vector, answer, docs, sum(timings.values()), generation=generation
+                                )
+                        
                         st.write("**Response:**")
-                        st.write(response['result'])
+                        st.write(answer)
                         
-                        # Show retrieved documents
+                        # Per-stage timings
+                        col_t1, col_t2, col_t3, col_t4 = st.columns(4)
+                        col_t1.metric("Embed", f"{timings['embed'] * 1000:.0f} ms")
+                        col_t2.metric("Search", f"{timings['search'] * 1000:.0f} ms")
+                        col_t3.metric("Pack", f"{timings['pack'] * 1000:.0f} ms")
+                        col_t4.metric("Generate", f"{timings['generate'] * 1000:.0f} ms")
+                        if packing_stats:
+                            st.caption(
+                                f"🧩 {packing_stats['retrieved']} chunks retrieved → {packing_stats['packed']} sent "
+                                f"(~{packing_stats['tokens']} tokens; {packing_stats['merged']} merged, "
+                                f"{packing_stats['duplicates']} duplicates, {packing_stats['over_budget']} over budget)"
+                            )
+                        
+                        # Show the same documents the answer was generated from
                         with st.expander("📚 Retrieved Documents"):
-                            docs = st.session_state.vector_store_app.retriever.invoke(user_query)
                             for i, doc in enumerate(docs):
                                 st.write(f"**Document {i+1}:**")
                                 st.write(doc.page_content)
@@ -632,6 +1403,7 @@ with st.sidebar:
     if st.button("🗑️ Clear All Data"):
         if st.session_state.rag_initialized:
             st.session_state.rag_initialized = False
+            st.session_state.vector_store_app.close()
             st.session_state.vector_store_app = None
             st.session_state.retriever_qa = None
         if os.path.exists("rag_config.json"):
@@ -642,4 +1414,108 @@ with st.sidebar:
     st.subheader("📊 System Info")
     st.write(f"**Config Loaded:** {'Yes' if 'config' in st.session_state else 'No'}")
     st.write(f"**RAG Initialized:** {'Yes' if st.session_state.rag_initialized else 'No'}")
-    st.write(f"**Database Available:** {'Yes' if hana is not None else 'No'}")
\ No newline at end of file
+    st.write(f"**Database Available:** {'Yes' if hana is not None else 'No'}")
+    
+    st.subheader("🔌 HANA Connection Pool")
+    for endpoint, stats in pool_stats().items():
+        st.write(f"**{endpoint}**")
+        st.write(f"**In Use / Idle:** {stats['in_use']} / {stats['idle']} (max {stats['max_size']})")
+        st.write(f"**Opened / Checkouts:** {stats['created']} / {stats['checkouts']}")
+    
+    st.subheader("💾 Embedding Snapshot")
+    if st.session_state.rag_initialized:
+        app = st.session_state.vector_store_app
+        if st.button("📦 Prepare Snapshot"):
+            with st.spinner("Exporting vectors..."):
+                # Export the primary store: a local read replica holds normalized, possibly float16 copies
+                with app.borrow_connection() as conn:
+                    st.session_state.snapshot_bytes = export_bytes(
+                        app.db, app.embeddingModel.deployment_id, app.table_name, conn=conn
+                    )
+        if st.session_state.get('snapshot_bytes'):
+            st.download_button(
+                "⬇️ Download Snapshot",
+                st.session_state.snapshot_bytes,
+                file_name=f"{app.table_name}.npz",
+                mime="application/octet-stream"
+            )
+        
+        snapshot_file = st.file_uploader("Import snapshot", type=['npz', 'parquet'])
+        if snapshot_file is not None and st.button("📥 Import Snapshot"):
+            try:
+                with st.spinner("Importing vectors..."):
+                    manifest = app.import_snapshot(snapshot_file, snapshot_format(snapshot_file.name))
+                    app.init_retriever()
+                    st.session_state.retriever_qa = app.get_retriever_qa()
+                    invalidate_semantic_caches(app.table_name)
+                st.success(f"Imported {manifest['count']} vectors from {manifest['table_name']} ({manifest['created_at'][:16]})")
+            except Exception as e:
+                st.error(f"Snapshot import failed: {e}")
+    else:
+        st.caption("Initialize or connect the RAG system to export or import snapshots")
+    
+    st.subheader("⏱️ Pipeline Latency")
+    latency = get_metrics().summary()
+    if latency:
+        st.dataframe(pd.DataFrame([
+            {
+                'stage': row['stage'],
+                'n': row['count'],
+                'p50 ms': round(row['p50_ms'], 1),
+                'p95 ms': round(row['p95_ms'], 1),
+                'items': row['items'],
+                'tokens': row['tokens'],
+                'errors': row['errors']
+            }
+            for row in latency
+        ]), hide_index=True)
+        st.download_button(
+            "⬇️ Prometheus Metrics",
+            get_metrics().render_prometheus(),
+            file_name="rag_metrics.prom",
+            mime="text/plain"
+        )
+    else:
+        st.caption("No pipeline activity recorded yet")
+    
+    st.subheader("🧠 Embedding Cache")
+    cache_stats = get_shared_cache().stats()
+    st.write(f"**Hits / Misses:** {cache_stats['hits']} / {cache_stats['misses']}")
+    st.write(f"**Hit Rate:** {cache_stats['hit_rate']:.1%}")
+    st.write(f"**Cached Vectors:** {cache_stats['entries']} ({cache_stats['size_bytes'] / (1024 * 1024):.1f} MB)")
+    
+    st.subheader("📊 Chunking Benchmark")
+    if os.path.exists("benchmark_results.json"):
+        with open("benchmark_results.json", 'r') as f:
+            benchmark = json.load(f)
+        st.caption(
+            f"{benchmark['document']} · {benchmark['questions']} questions · k={benchmark['k']} · {benchmark['timestamp'][:16]}"
+        )
+        st.dataframe(pd.DataFrame([
+            {
+                'splitter': r['text_splitter']['type'].replace('TextSplitter', ''),
+                'size': r['text_splitter']['chunk_size'],
+                'overlap': r['text_splitter']['chunk_overlap'],
+                'chunks': r['chunks'],
+                f"recall@{benchmark['k']}": round(r[f"recall_at_{benchmark['k']}"], 3),
+                'mrr': round(r['mrr'], 3),
+                'p95 ms': round(r['p95_retrieval_ms'], 2)
+            }
+            for r in benchmark['results']
+        ]), hide_index=True)
+        if benchmark.get('recommended'):
+            st.write(f"**Recommended:** {benchmark['recommended']}")
+            if st.button("✅ Apply Recommended Splitter"):
+                old_config = copy.deepcopy(st.session_state.config)
+                st.session_state.config['text_splitter'] = benchmark['recommended']
+                if apply_config_change(old_config, st.session_state.config) is not None:
+                    st.success("Recommended splitter settings saved")
+                    st.rerun()
+    else:
+        st.caption("Run benchmark_chunking.py to compare splitter settings")
+    
+    st.subheader("⚡ Semantic Answer Cache")
+    answer_stats = current_semantic_cache().stats()
+    st.write(f"**Cached Answers:** {answer_stats['entries']}")
+    st.write(f"**Hit Rate:** {answer_stats['hit_rate']:.1%} ({answer_stats['hits']} / {answer_stats['hits'] + answer_stats['misses']})")
+    st.write(f"**Latency Saved:** {answer_stats['saved_seconds']:.1f}s")
\ No newline at end of file
@@ -0,0 +1,164 @@
+# Anubhav Trainings : Offline benchmark of chunking configurations for the training RAG
+# Sweeps text splitter settings in parallel processes and measures retrieval quality and latency
+# with a deterministic hashing embedding model, so it runs without AI Core or HANA.
+#
+# Usage:
+#   python benchmark_chunking.py --document playground/ats_profile.txt --questions questions.jsonl
+#
+# questions.jsonl holds one {"question": "...", "expected": "passage that answers it"} per line.
+# Results are written to benchmark_results.json, which the admin console can load.
+import argparse
+import itertools
+import json
+import logging
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from langchain_core.documents import Document
+
+from utils.chunk_hashing import normalize_text
+from utils.hashing_embeddings import HashingEmbeddings
+from utils.hybrid_retriever import tokenize
+from utils.local_vector_index import LocalVectorIndex
+from utils.metrics import percentile
+from utils.splitters import build_text_splitter
+
+FORMAT = "%(asctime)s:%(name)s:%(levelname)s - %(message)s"
+logging.basicConfig(format=FORMAT, level=logging.INFO)
+
+
+def load_questions(path: str) -> list:
+    """Read questions as JSON lines or as one JSON list"""
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read().strip()
+    if content.startswith("["):
+        return json.loads(content)
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+def is_relevant(chunk_text: str, expected: str, min_coverage: float = 0.6) -> bool:
+    """A chunk is relevant if it contains the expected passage, lies inside it, or covers most of its words"""
+    chunk_norm = normalize_text(chunk_text).lower()
+    expected_norm = normalize_text(expected).lower()
+    if expected_norm in chunk_norm or chunk_norm in expected_norm:
+        return True
+    expected_tokens = set(tokenize(expected))
+    if not expected_tokens:
+        return False
+    return len(expected_tokens & set(tokenize(chunk_text))) / len(expected_tokens) >= min_coverage
+
+
+def run_config(text: str, questions: list, splitter_type: str, chunk_size: int, chunk_overlap: int, k: int) -> dict:
+    """Evaluate one splitter configuration (executed in a worker process)"""
+    embeddings = HashingEmbeddings()
+
+    start = time.perf_counter()
+    splitter = build_text_splitter(splitter_type, chunk_size, chunk_overlap)
+    chunks = splitter.split_documents([Document(page_content=text)])
+    split_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectors = embeddings.embed_documents([c.page_content for c in chunks])
+    embed_time = time.perf_counter() - start
+
+    index = LocalVectorIndex(embeddings)
+    index.add_texts([c.page_content for c in chunks], [c.metadata for c in chunks], embeddings=vectors)
+    index_bytes = index.matrix().nbytes + sum(len(c.page_content.encode("utf-8")) for c in chunks)
+
+    hits, reciprocal_ranks, latencies = 0, [], []
+    for item in questions:
+        start = time.perf_counter()
+        results = index.similarity_search(item["question"], k=k)
+        latencies.append(time.perf_counter() - start)
+
+        rank = next(
+            (i for i, doc in enumerate(results, start=1) if is_relevant(doc.page_content, item["expected"])),
+            None
+        )
+        hits += rank is not None
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+
+    return {
+        'text_splitter': {
+            'type': splitter_type,
+            'chunk_size': chunk_size,
+            'chunk_overlap': chunk_overlap
+        },
+        'chunks': len(chunks),
+        'split_seconds': split_time,
+        'embedding_seconds': embed_time,
+        'index_bytes': index_bytes,
+        f'recall_at_{k}': hits / len(questions) if questions else 0.0,
+        'mrr': statistics.mean(reciprocal_ranks) if reciprocal_ranks else 0.0,
+        'p50_retrieval_ms': percentile(latencies, 50) * 1000,
+        'p95_retrieval_ms': percentile(latencies, 95) * 1000
+    }
+
+
+def recommend(results: list, k: int) -> dict:
+    """Best recall, then MRR, then the smaller index and faster p95"""
+    best = max(
+        results,
+        key=lambda r: (r[f'recall_at_{k}'], r['mrr'], -r['index_bytes'], -r['p95_retrieval_ms'])
+    )
+    return best['text_splitter']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chunking configurations for the training RAG")
+    parser.add_argument("--document", required=True, help="Text document to chunk")
+    parser.add_argument("--questions", required=True, help="JSON lines file with question/expected pairs")
+    parser.add_argument("--splitters", nargs="+", default=["CharacterTextSplitter", "RecursiveCharacterTextSplitter"])
+    parser.add_argument("--chunk-sizes", nargs="+", type=int, default=[250, 500, 1000])
+    parser.add_argument("--overlaps", nargs="+", type=int, default=[0, 50, 100])
+    parser.add_argument("--k", type=int, default=4, help="Documents retrieved per question")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    with open(args.document, "r", encoding="utf-8") as f:
+        text = f.read()
+    questions = load_questions(args.questions)
+
+    configs = [
+        (splitter, size, overlap)
+        for splitter, size, overlap in itertools.product(args.splitters, args.chunk_sizes, args.overlaps)
+        if overlap < size
+    ]
+    logging.info(f"Benchmarking {len(configs)} configurations on {len(questions)} questions")
+
+    results = []
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [
+            executor.submit(run_config, text, questions, splitter, size, overlap, args.k)
+            for splitter, size, overlap in configs
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            logging.info(
+                f"{result['text_splitter']} -> recall@{args.k}={result[f'recall_at_{args.k}']:.2f} "
+                f"mrr={result['mrr']:.2f} chunks={result['chunks']}"
+            )
+
+    results.sort(key=lambda r: (r['text_splitter']['type'], r['text_splitter']['chunk_size'], r['text_splitter']['chunk_overlap']))
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'document': os.path.basename(args.document),
+        'questions': len(questions),
+        'k': args.k,
+        'embedding_model': 'HashingEmbeddings',
+        'results': results,
+        'recommended': recommend(results, args.k) if results else None
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=4)
+    logging.info(f"Recommended text_splitter: {report['recommended']}")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
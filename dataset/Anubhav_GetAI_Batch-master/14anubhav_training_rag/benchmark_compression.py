@@ -0,0 +1,136 @@
+# Anubhav Trainings : Recall vs memory benchmark of the local index compression settings
+# Replays held-out corpus vectors as queries against float16, int8 and PCA compressed copies of a
+# vector table and compares their top-k with an exact float32 search, with and without re-scoring.
+#
+# Usage:
+#   python snapshot.py export --table CUSTOM_EMBEDDINGS --path training.npz
+#   python benchmark_compression.py --snapshot training.npz
+#   python benchmark_compression.py --index local_index/CUSTOM_EMBEDDINGS --pca-dims 128 256
+#
+# Results are written to compression_results.json.
+import argparse
+import json
+import logging
+import os
+import statistics
+import time
+from datetime import datetime
+
+import numpy as np
+
+from utils.hashing_embeddings import HashingEmbeddings
+from utils.local_vector_index import LocalVectorIndex
+from utils.metrics import percentile
+from utils.snapshots import read_rows, read_snapshot, snapshot_format
+
+FORMAT = "%(asctime)s:%(name)s:%(levelname)s - %(message)s"
+logging.basicConfig(format=FORMAT, level=logging.INFO)
+
+
+def load_vectors(args) -> np.ndarray:
+    if args.snapshot:
+        _, _, _, _, vectors = read_snapshot(args.snapshot, snapshot_format(args.snapshot))
+        return np.asarray(vectors, dtype=np.float32)
+    _, _, _, vectors = read_rows(LocalVectorIndex(HashingEmbeddings(), path=args.index))
+    return vectors
+
+
+def build_index(vectors: np.ndarray, compression, pca_dim: int, rescore_factor: int) -> LocalVectorIndex:
+    # Queries are passed as vectors, the embedding model is never called
+    index = LocalVectorIndex(HashingEmbeddings(), compression=compression, pca_dim=pca_dim, rescore_factor=rescore_factor)
+    index.add_texts([str(i) for i in range(len(vectors))], embeddings=vectors, ids=[str(i) for i in range(len(vectors))])
+    index.compressed()
+    return index
+
+
+def search(index: LocalVectorIndex, queries: np.ndarray, k: int):
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = index.similarity_search_with_score_by_vector(query, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append([doc.page_content for doc, _ in hits])
+    return results, latencies
+
+
+def run_setting(vectors, queries, truth, k, compression, pca_dim, rescore_factor) -> dict:
+    index = build_index(vectors, compression, pca_dim, rescore_factor)
+    results, latencies = search(index, queries, k)
+    stats = index.memory_stats()
+    recall = statistics.mean(len(set(r) & set(t)) / len(t) for r, t in zip(results, truth) if t)
+    # Exact rows read per query when the candidates are re-scored
+    rescored = min(k * rescore_factor, stats['rows']) if compression and rescore_factor > 0 else 0
+    row_bytes = stats['exact_bytes'] // stats['rows'] if stats['rows'] else 0
+    return {
+        'compression': compression or 'none',
+        'pca_dim': pca_dim if compression == 'pca' else None,
+        'rescore_factor': rescore_factor if compression else None,
+        f'recall_at_{k}': round(recall, 4),
+        'search_bytes': stats['search_bytes'],
+        'memory_ratio': round(stats['ratio'], 2),
+        'bytes_read_per_query': stats['search_bytes'] + rescored * row_bytes,
+        'p50_search_ms': round(percentile(latencies, 50), 3),
+        'p95_search_ms': round(percentile(latencies, 95), 3)
+    }
+
+
+def recommend(results: list, k: int, min_recall: float) -> dict:
+    """Smallest search matrix that keeps the recall target, then the faster p95"""
+    eligible = [r for r in results if r[f'recall_at_{k}'] >= min_recall] or results
+    best = min(eligible, key=lambda r: (r['search_bytes'], r['p95_search_ms']))
+    return {key: best[key] for key in ('compression', 'pca_dim', 'rescore_factor')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark recall and memory of local index compression settings")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--snapshot", help="Snapshot file written by snapshot.py (.npz or .parquet)")
+    source.add_argument("--index", help="Directory of a saved local vector index")
+    parser.add_argument("--queries", type=int, default=200, help="Corpus vectors held out as queries")
+    parser.add_argument("--k", type=int, default=4, help="Documents retrieved per query")
+    parser.add_argument("--pca-dims", nargs="+", type=int, default=[64, 128, 256])
+    parser.add_argument("--rescore-factors", nargs="+", type=int, default=[0, 4])
+    parser.add_argument("--min-recall", type=float, default=0.95)
+    parser.add_argument("--output", default="compression_results.json")
+    args = parser.parse_args()
+
+    vectors = load_vectors(args)
+    if len(vectors) <= args.queries:
+        parser.error(f"Need more than {args.queries} vectors, the table has {len(vectors)}")
+    order = np.random.default_rng(0).permutation(len(vectors))
+    queries, corpus = vectors[order[:args.queries]], vectors[order[args.queries:]]
+    logging.info(f"Benchmarking on {len(corpus)} vectors of dim {vectors.shape[1]} with {len(queries)} queries")
+
+    truth, _ = search(build_index(corpus, None, 0, 0), queries, args.k)
+    settings = [(None, 0, 0)]
+    for rescore_factor in args.rescore_factors:
+        settings += [("float16", 0, rescore_factor), ("int8", 0, rescore_factor)]
+        settings += [("pca", dim, rescore_factor) for dim in args.pca_dims if dim < vectors.shape[1]]
+
+    results = []
+    for compression, pca_dim, rescore_factor in settings:
+        result = run_setting(corpus, queries, truth, args.k, compression, pca_dim, rescore_factor)
+        results.append(result)
+        logging.info(
+            f"{result['compression']} pca_dim={result['pca_dim']} rescore={result['rescore_factor']} -> "
+            f"recall@{args.k}={result[f'recall_at_{args.k}']:.3f} memory x{result['memory_ratio']}"
+        )
+
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'source': os.path.basename(args.snapshot or args.index),
+        'vectors': len(corpus),
+        'dim': int(vectors.shape[1]),
+        'queries': len(queries),
+        'k': args.k,
+        'results': results,
+        'recommended': recommend(results, args.k, args.min_recall)
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=4)
+    logging.info(f"Recommended local index compression: {report['recommended']}")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,17 +15,29 @@ from langchain_hana import HanaDB
 
 from dotenv import load_dotenv
 import os
+import sys
+import weakref
 from langchain.memory import ConversationBufferMemory
 import logging
 from cfenv import AppEnv
 from hdbcli import dbapi
 import streamlit as st
 
+# Shared helpers live next to admin.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.embedding_cache import CachedEmbeddings, get_shared_cache
+from utils.chunk_hashing import content_hash
+from utils.local_vector_index import LocalVectorIndex
+from utils.hana_pool import get_pool
+
 ##1. Load Environment Variables
 load_dotenv()
 ##2. Load Cloud Foundry Environment Variables
 env = AppEnv()
 
+##Vector backend: "hana" (default) or "local" for machines without HANA access
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "hana")
+
 ##3. Prepare Logging
 FORMAT = "%(asctime)s:%(name)s:%(levelname)s - %(message)s"
 # Use filename="file.log" as a param to logging to log to a file
@@ -95,16 +107,24 @@ class vector_store():
         proxy_client = get_proxy_client('gen-ai-hub')
 
         self.model = ChatOpenAI(proxy_model_name='gpt-35-turbo', proxy_client=proxy_client, deployment_id=dep_id)
-        self.embedding_model = OpenAIEmbeddings(proxy_client=proxy_client, deployment_id=embedding_dep_id)
+        self.embedding_model = CachedEmbeddings(
+            OpenAIEmbeddings(proxy_client=proxy_client, deployment_id=embedding_dep_id),
+            get_shared_cache(),
+            embedding_dep_id
+        )
         
         self.conn = None
         self.db = None
         self.retriever = None
         self.chunks = None
+        self.fingerprint = None
 
  
     def set_db_connection(self) -> None:
 
+        if VECTOR_BACKEND == "local":
+            return
+
         if hana is not None:
 
             # Handle different data structures for local vs Cloud Foundry
@@ -121,14 +141,18 @@ class vector_store():
                 dbPwd = hana.credentials['password']
                 ssl_cert = hana.credentials['certificate']
 
-            self.conn = dbapi.connect(
-                address = dbHost,
-                port = dbPort,
-                user = dbUser,
-                password = dbPwd,
+            ##Borrow a connection from the process wide pool, it goes back when this object is dropped,
+            ##so keep this object alive for as long as anything built on self.conn is in use
+            pool = get_pool(
+                dbHost,
+                dbPort,
+                dbUser,
+                dbPwd,
                 encrypt = 'true',
                 sslTrustStore = ssl_cert
                 )
+            self.conn = pool.acquire()
+            weakref.finalize(self, pool.release, self.conn)
 
 
     def load_textfile(self, file_path: str) -> None:
@@ -148,29 +172,61 @@ class vector_store():
         # )
         self.chunks = text_splitter.split_documents(documents)
 
+        ##Tag every chunk with the fingerprint of the file it came from
+        self.fingerprint = content_hash(documents[0].page_content) if documents else None
+        for chunk in self.chunks:
+            chunk.metadata["source_fingerprint"] = self.fingerprint
+
         ##Print chunk size and each chunk token
         print(f"Number of chunks created: {len(self.chunks)}")
         for i, chunk in enumerate(self.chunks):
             print(f"Chunk {i} (size: {len(chunk.page_content)}): ...")
 
 
+    def is_table_current(self) -> bool:
+        ##The table is current when it holds exactly the chunks of this file version
+        if isinstance(self.db, LocalVectorIndex):
+            total = self.db.count()
+            return total == len(self.chunks) and self.db.count({"source_fingerprint": self.fingerprint}) == total
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(
+                f'SELECT COUNT(*), SUM(CASE WHEN JSON_VALUE("{self.db.metadata_column}", \'$.source_fingerprint\') = ? '
+                f'THEN 1 ELSE 0 END) FROM "{self.db.table_name}"',
+                (self.fingerprint,)
+            )
+            total, matching = cursor.fetchone()
+            return total == len(self.chunks) and matching == total
+        finally:
+            cursor.close()
+
     def save_embeddings_to_db(self, table_name) -> None:
-        if self.conn is None:
+        if VECTOR_BACKEND == "local":
+            self.db = LocalVectorIndex(self.embedding_model, path=os.path.join("local_index", table_name))
+        elif self.conn is None:
             self.set_db_connection()
         
         if self.conn is not None and self.chunks is not None:
             self.db = HanaDB(connection=self.conn, embedding=self.embedding_model, table_name=table_name)
+        
+        if self.db is not None and self.chunks is not None:
+            ##Skip the wipe and re-embed when the table already holds this file version
+            if self.is_table_current():
+                print(f"Table {table_name} already holds the current file, skipping ingestion")
+                return
             ##Delete chunks which are already there
             self.db.delete(filter={})
             ##Save the embeddings in hana vector db
             self.db.add_documents(self.chunks)
+            if isinstance(self.db, LocalVectorIndex):
+                self.db.save()
             print(f"Embeddings saved to table {table_name}")
 
     def init_retriever(self) -> None:
         if self.conn is None:
             self.set_db_connection()
 
-        if self.conn is not None:
+        if self.db is not None:
             self.retriever = self.db.as_retriever()
 
     def get_retriever_qa(self) -> RetrievalQA:
@@ -187,13 +243,24 @@ class vector_store():
             print("Retriever is not initialized.")
             return None
 
-##Run the design time for creating the vector store
-app = vector_store()
-app.set_db_connection()
-app.load_textfile("./ats_profile.txt")
-app.save_embeddings_to_db("ats_profile_embeddings")
-app.init_retriever()
-retriever=app.get_retriever_qa()
+##Run the design time for creating the vector store once per process, not on every Streamlit rerun
+@st.cache_resource(show_spinner="Preparing the knowledge base...")
+def build_retriever(file_path: str, table_name: str, fingerprint: str) -> tuple[vector_store, RetrievalQA]:
+    ##fingerprint is only part of the cache key so that an edited file triggers a rebuild
+    app = vector_store()
+    app.set_db_connection()
+    app.load_textfile(file_path)
+    app.save_embeddings_to_db(table_name)
+    app.init_retriever()
+    ##Cache the vector store together with the chain: its pooled connection is released once it is dropped,
+    ##so it has to live as long as the cached chain that queries through that connection
+    return app, app.get_retriever_qa()
+
+def file_fingerprint(file_path: str) -> str:
+    with open(file_path, encoding="utf-8") as f:
+        return content_hash(f.read())
+
+_, retriever = build_retriever("./ats_profile.txt", "ats_profile_embeddings", file_fingerprint("./ats_profile.txt"))
 
 st.title("Simple Anubhav RAG application")
 user_query = st.text_input("Enter your question related to Anubhav Trainings:")
@@ -0,0 +1,105 @@
+# Anubhav Trainings : Export and import embedding snapshots of a vector table
+# Lets a new environment (laptop, CF space, test runner) load an already embedded corpus
+# instead of re-embedding it through AI Core.
+#
+# Usage:
+#   python snapshot.py export --table CUSTOM_EMBEDDINGS --path training.npz
+#   python snapshot.py import --table CUSTOM_EMBEDDINGS --path training.npz --backend local
+#
+# Paths ending in .parquet are written/read as Parquet (needs pyarrow), anything else as NPZ.
+import argparse
+import json
+import logging
+import os
+
+from cfenv import AppEnv
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+
+from utils.local_vector_index import LocalVectorIndex
+from utils.snapshots import export_snapshot, import_snapshot
+
+FORMAT = "%(asctime)s:%(name)s:%(levelname)s - %(message)s"
+logging.basicConfig(format=FORMAT, level=logging.INFO)
+
+
+class SnapshotOnlyEmbeddings(Embeddings):
+    """Placeholder for the vector stores: snapshot transfers never embed anything"""
+
+    def embed_documents(self, texts):
+        raise RuntimeError("Snapshot import/export must not call the embedding service")
+
+    def embed_query(self, text):
+        raise RuntimeError("Snapshot import/export must not call the embedding service")
+
+
+def hana_credentials() -> dict:
+    env = AppEnv()
+    if env.name is None:
+        return {
+            'address': os.getenv("db_host"),
+            'port': os.getenv("db_port"),
+            'user': os.getenv("db_user"),
+            'password': os.getenv("db_password"),
+            'sslTrustStore': ""
+        }
+    credentials = env.get_service(label='hana').credentials
+    return {
+        'address': credentials['host'],
+        'port': credentials['port'],
+        'user': credentials['user'],
+        'password': credentials['password'],
+        'sslTrustStore': credentials['certificate']
+    }
+
+
+def open_store(args):
+    """Returns (store, connection) for the selected backend"""
+    if args.backend == 'local':
+        return LocalVectorIndex(SnapshotOnlyEmbeddings(), path=os.path.join(args.local_index_dir, args.table)), None
+
+    from hdbcli import dbapi
+    from langchain_hana import HanaDB
+
+    conn = dbapi.connect(encrypt='true', autocommit=True, **hana_credentials())
+    return HanaDB(embedding=SnapshotOnlyEmbeddings(), connection=conn, table_name=args.table), conn
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Export or import embedding snapshots of a RAG vector table")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("--table", required=True, help="Vector table name")
+    parser.add_argument("--path", required=True, help="Snapshot file (.npz or .parquet)")
+    parser.add_argument("--backend", choices=["hana", "local"], default="hana")
+    parser.add_argument("--local-index-dir", default="local_index")
+    parser.add_argument("--embedding-model", default=os.getenv("LLM_EMBEDDING_MODEL_ID"),
+                        help="Embedding deployment id recorded on export and checked on import")
+    parser.add_argument("--append", action="store_true", help="Keep existing rows instead of replacing them")
+    parser.add_argument("--force", action="store_true", help="Import even if the embedding model differs")
+    args = parser.parse_args()
+
+    store, conn = open_store(args)
+    try:
+        if args.command == "export":
+            manifest = export_snapshot(store, args.path, args.embedding_model, args.table, conn=conn)
+        else:
+            manifest = import_snapshot(
+                args.path,
+                store,
+                embedding_model=args.embedding_model,
+                replace=not args.append,
+                force=args.force
+            )
+            # The admin console rebuilds the BM25 index on the next hybrid retriever init
+            bm25_file = os.path.join(args.local_index_dir, f"{args.table}.bm25.json")
+            if os.path.exists(bm25_file):
+                os.remove(bm25_file)
+    finally:
+        if conn is not None:
+            conn.close()
+    print(json.dumps(manifest, indent=4))
+
+
+if __name__ == "__main__":
+    main()
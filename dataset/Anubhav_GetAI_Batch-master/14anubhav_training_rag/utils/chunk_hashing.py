@@ -0,0 +1,44 @@
+import hashlib
+import re
+from typing import Iterable, List, Set, Tuple
+
+from langchain_core.documents import Document
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so formatting-only edits do not change the hash"""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def content_hash(text: str) -> str:
+    """SHA-256 of the normalized chunk text"""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def annotate_chunks(chunks: List[Document], source_id: str) -> List[Document]:
+    """Attach the source document id and content hash to every chunk"""
+    for chunk in chunks:
+        chunk.metadata["source_id"] = source_id
+        chunk.metadata["chunk_hash"] = content_hash(chunk.page_content)
+    return chunks
+
+
+def plan_sync(chunks: List[Document], existing_hashes: Iterable[str]) -> Tuple[List[Document], List[str]]:
+    """Compare annotated chunks with the hashes already stored for the same source.
+
+    Returns the chunks that still have to be embedded and the stored hashes
+    that no longer occur in the document.
+    """
+    existing: Set[str] = set(existing_hashes)
+    seen: Set[str] = set()
+    to_add = []
+    for chunk in chunks:
+        chunk_hash = chunk.metadata["chunk_hash"]
+        # Identical paragraphs inside one document only need one vector
+        if chunk_hash in seen:
+            continue
+        seen.add(chunk_hash)
+        if chunk_hash not in existing:
+            to_add.append(chunk)
+    stale = sorted(existing - seen)
+    return to_add, stale
@@ -0,0 +1,67 @@
+from typing import List, Set
+
+# Config keys each stage of the RAG system is built from ("section.*" matches the whole section)
+STAGE_INPUTS = {
+    'rechunk': ['text_splitter.*'],
+    'connect': ['vector_store.backend'],
+    # LocalVectorIndex.load keeps the dtype the index was saved with, so the files are rewritten
+    'rebuild': ['vector_store.local_dtype'],
+    'bind': [
+        'vector_store.table_name', 'vector_store.backend', 'vector_store.local_dtype', 'vector_store.local_index_dir',
+        'vector_store.local_compression', 'vector_store.pca_dim', 'vector_store.rescore_factor',
+        'vector_store.hana_vector_type'
+    ],
+    'retriever': ['vector_store.retrieval_mode', 'vector_store.k'],
+    'model': ['llm_settings.*'],
+    'chain': []
+}
+
+# A rebuilt stage invalidates everything built on top of it
+# Re-chunking runs in background jobs, the retriever is reattached once they finish
+STAGE_DEPENDENTS = {
+    'rechunk': [],
+    'connect': ['bind'],
+    'rebuild': ['bind'],
+    'bind': ['retriever'],
+    'retriever': ['chain'],
+    'model': ['chain'],
+    'chain': []
+}
+
+STAGE_ORDER = ['rechunk', 'connect', 'rebuild', 'bind', 'retriever', 'model', 'chain']
+
+
+def changed_keys(old: dict, new: dict) -> Set[str]:
+    """Dotted section.key paths whose values differ between two configs"""
+    changed = set()
+    for section in set(old or {}) | set(new or {}):
+        old_values = (old or {}).get(section)
+        new_values = (new or {}).get(section)
+        if not isinstance(old_values, dict) or not isinstance(new_values, dict):
+            # Top level values such as the save timestamp do not feed any stage
+            continue
+        for key in set(old_values) | set(new_values):
+            if old_values.get(key) != new_values.get(key):
+                changed.add(f"{section}.{key}")
+    return changed
+
+
+def plan_rebuild(old: dict, new: dict) -> List[str]:
+    """Stages that must be rebuilt, in execution order; empty when only runtime settings changed"""
+    changed = changed_keys(old, new)
+    stages = set()
+    for stage, inputs in STAGE_INPUTS.items():
+        for pattern in inputs:
+            if pattern.endswith('.*'):
+                hit = any(key.startswith(pattern[:-1]) for key in changed)
+            else:
+                hit = pattern in changed
+            if hit:
+                stages.add(stage)
+    pending = list(stages)
+    while pending:
+        for dependent in STAGE_DEPENDENTS[pending.pop()]:
+            if dependent not in stages:
+                stages.add(dependent)
+                pending.append(dependent)
+    return [stage for stage in STAGE_ORDER if stage in stages]
@@ -0,0 +1,137 @@
+from collections import defaultdict
+from typing import List, Tuple
+
+from langchain_core.documents import Document
+
+from utils.hybrid_retriever import tokenize
+
+try:
+    import tiktoken
+    ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    # tiktoken is optional (and needs to download its BPE file once), fall back to an estimate
+    ENCODING = None
+
+
+def count_tokens(text: str) -> int:
+    if ENCODING is not None:
+        return len(ENCODING.encode(text))
+    # Roughly 4 characters per token for English text with GPT tokenizers
+    return max(1, len(text) // 4)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if ENCODING is not None:
+        return ENCODING.decode(ENCODING.encode(text)[:max_tokens])
+    return text[:max_tokens * 4]
+
+
+def source_key(doc: Document):
+    """start_index is relative to one page, so spans only merge within the same file and page"""
+    source = doc.metadata.get("source_id") or doc.metadata.get("source")
+    if source is None:
+        return None
+    return (source, doc.metadata.get("source"), doc.metadata.get("page"))
+
+
+def merge_overlapping(docs: List[Document]) -> Tuple[List[Document], int]:
+    """Join chunks of the same source whose character spans overlap or touch.
+
+    Needs the start_index metadata written by the splitters; chunks are only
+    joined where their texts agree on the overlap, and a merged chunk takes
+    the rank of its best member. Returns the documents in rank order
+    and the number of chunks that were folded into a neighbour.
+    """
+    by_source = defaultdict(list)
+    singles = []
+    for rank, doc in enumerate(docs):
+        start = doc.metadata.get("start_index")
+        if source_key(doc) is None or start is None or start < 0:
+            singles.append((rank, doc))
+        else:
+            by_source[source_key(doc)].append((start, rank, doc))
+
+    merged, folded = list(singles), 0
+    for spans in by_source.values():
+        spans.sort(key=lambda span: span[0])
+        start, rank, doc = spans[0]
+        text, metadata = doc.page_content, dict(doc.metadata)
+        for next_start, next_rank, next_doc in spans[1:]:
+            end = start + len(text)
+            # Offsets of unchanged chunks can predate a revision of the document, so the claimed
+            # overlap must actually hold before the covered part of the next chunk is dropped
+            covered = text[next_start - start:]
+            if next_start > end or not next_doc.page_content.startswith(covered[:len(next_doc.page_content)]):
+                merged.append((rank, Document(page_content=text, metadata=metadata)))
+                start, rank, text, metadata = next_start, next_rank, next_doc.page_content, dict(next_doc.metadata)
+                continue
+            # Append only the part of the next chunk that is not already covered
+            text += next_doc.page_content[end - next_start:]
+            rank = min(rank, next_rank)
+            metadata["merged_chunks"] = metadata.get("merged_chunks", 1) + 1
+            folded += 1
+        merged.append((rank, Document(page_content=text, metadata=metadata)))
+
+    merged.sort(key=lambda item: item[0])
+    return [doc for _, doc in merged], folded
+
+
+def shingles(text: str, size: int = 3) -> set:
+    tokens = tokenize(text)
+    if len(tokens) < size:
+        return {" ".join(tokens)} if tokens else set()
+    return {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+def drop_near_duplicates(docs: List[Document], threshold: float = 0.9) -> Tuple[List[Document], int]:
+    """Keep the higher ranked of two chunks whose word 3-grams mostly coincide.
+
+    Uses the overlap coefficient |A & B| / min(|A|, |B|), so a chunk that is
+    contained in a larger one also counts as a duplicate.
+    """
+    kept, kept_shingles, dropped = [], [], 0
+    for doc in docs:
+        current = shingles(doc.page_content)
+        duplicate = any(
+            current and other and len(current & other) / min(len(current), len(other)) >= threshold
+            for other in kept_shingles
+        )
+        if duplicate:
+            dropped += 1
+            continue
+        kept.append(doc)
+        kept_shingles.append(current)
+    return kept, dropped
+
+
+def pack_context(docs: List[Document], max_tokens: int, dedup_threshold: float = 0.9) -> Tuple[List[Document], dict]:
+    """Merge, de-duplicate and fill a token budget with retrieved chunks in score order"""
+    merged, folded = merge_overlapping(docs)
+    unique, dropped = drop_near_duplicates(merged, dedup_threshold)
+
+    packed, used, skipped = [], 0, 0
+    for doc in unique:
+        tokens = count_tokens(doc.page_content)
+        if used + tokens <= max_tokens:
+            packed.append(doc)
+            used += tokens
+        else:
+            skipped += 1
+
+    if not packed and unique:
+        # The best chunk alone exceeds the budget: send a truncated copy rather than nothing
+        best = unique[0]
+        text = truncate_to_tokens(best.page_content, max_tokens)
+        packed.append(Document(page_content=text, metadata=dict(best.metadata, truncated=True)))
+        used = count_tokens(text)
+        skipped -= 1
+
+    stats = {
+        'retrieved': len(docs),
+        'merged': folded,
+        'duplicates': dropped,
+        'over_budget': skipped,
+        'packed': len(packed),
+        'tokens': used
+    }
+    return packed, stats
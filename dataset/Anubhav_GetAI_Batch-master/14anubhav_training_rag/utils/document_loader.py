@@ -0,0 +1,179 @@
+import io
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Iterable, Iterator, List, Tuple
+
+from langchain_core.documents import Document
+
+SUPPORTED_EXTENSIONS = ('.txt', '.md', '.pdf', '.docx')
+# Large PDFs are parsed in page ranges so one file can use several cores
+PDF_PAGES_PER_TASK = 20
+
+
+def extension(name: str) -> str:
+    return os.path.splitext(name)[1].lower()
+
+
+def parse_pdf_pages(name: str, path: str, first_page: int, last_page: int) -> List[Tuple[str, dict]]:
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    pages = []
+    for number in range(first_page, min(last_page, len(reader.pages))):
+        text = reader.pages[number].extract_text() or ""
+        if text.strip():
+            pages.append((text, {"source": name, "page": number + 1}))
+    return pages
+
+
+def parse_docx(name: str, data: bytes) -> List[Tuple[str, dict]]:
+    import docx
+
+    document = docx.Document(io.BytesIO(data))
+    # DOCX has no stored page layout, the whole body counts as page 1
+    text = "\n\n".join(p.text for p in document.paragraphs if p.text.strip())
+    return [(text, {"source": name, "page": 1})] if text else []
+
+
+def parse_text(name: str, data: bytes) -> List[Tuple[str, dict]]:
+    text = data.decode("utf-8", errors="replace")
+    return [(text, {"source": name, "page": 1})] if text.strip() else []
+
+
+def parse_task(name: str, data: bytes = None, path: str = None, first_page: int = 0, last_page: int = 0) -> List[Tuple[str, dict]]:
+    """Runs in a worker process; returns plain tuples so results pickle cheaply.
+
+    PDFs come as a temp file path and a page range, not as bytes, so a large
+    PDF is not copied to the workers once per page range.
+    """
+    ext = extension(name)
+    if ext == '.pdf':
+        return parse_pdf_pages(name, path, first_page, last_page)
+    if ext == '.docx':
+        return parse_docx(name, data)
+    return parse_text(name, data)
+
+
+def expand_archives(files: Iterable[Tuple[str, bytes]]) -> Iterator[Tuple[str, bytes]]:
+    """Yield (name, bytes) per supported file, unpacking zip archives member by member"""
+    for name, data in files:
+        if extension(name) == '.zip':
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                for member in archive.infolist():
+                    if member.is_dir() or extension(member.filename) not in SUPPORTED_EXTENSIONS:
+                        continue
+                    yield f"{name}/{member.filename}", archive.read(member)
+        elif extension(name) in SUPPORTED_EXTENSIONS:
+            yield name, data
+        else:
+            logging.warning(f"Skipping unsupported file {name}")
+
+
+def split_into_tasks(name: str, data: bytes) -> Tuple[List[dict], str]:
+    """parse_task keyword arguments for one file, and the temp file to delete once they are done"""
+    if extension(name) != '.pdf':
+        return [{'name': name, 'data': data}], None
+    from pypdf import PdfReader
+
+    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+        f.write(data)
+    try:
+        page_count = len(PdfReader(f.name).pages)
+    except Exception:
+        os.remove(f.name)
+        raise
+    tasks = [
+        {'name': name, 'path': f.name, 'first_page': first, 'last_page': first + PDF_PAGES_PER_TASK}
+        for first in range(0, page_count, PDF_PAGES_PER_TASK)
+    ]
+    if not tasks:
+        os.remove(f.name)
+        return [], None
+    return tasks, f.name
+
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+
+def parse_workers() -> int:
+    return int(os.getenv("PARSE_WORKERS", os.cpu_count() or 1))
+
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    """Process pool shared by all concurrent ingestion jobs, sized to the machine's cores.
+
+    Workers are spawned, not forked: the pool is created from job runner threads,
+    and a fork would copy whatever locks other threads hold at that moment.
+    """
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=parse_workers(),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _parse_pool
+
+
+def load_documents(files: Iterable[Tuple[str, bytes]], max_pending: int = None) -> Iterator[Document]:
+    """Parse files in the process pool and yield one Document per page, in file and page order.
+
+    At most max_pending parse tasks are in flight or waiting for an earlier one
+    to finish, so only a bounded number of files and pages are held in memory
+    regardless of how much was uploaded.
+    """
+    pool = get_parse_pool()
+    max_pending = max_pending or 2 * parse_workers()
+    file_tasks = (split_into_tasks(name, data) for name, data in expand_archives(files))
+    queued = deque()
+    # Temp file of a PDF -> its parse tasks that have not finished yet
+    remaining = {}
+    # future -> (task number, temp file), and finished results waiting for an earlier task
+    pending = {}
+    finished = {}
+    submitted = 0
+    next_out = 0
+    exhausted = False
+    try:
+        while pending or queued or not exhausted:
+            while len(pending) + len(finished) < max_pending and (queued or not exhausted):
+                if not queued:
+                    next_file = next(file_tasks, None)
+                    if next_file is None:
+                        exhausted = True
+                        continue
+                    tasks, temp_path = next_file
+                    if temp_path is not None:
+                        remaining[temp_path] = len(tasks)
+                    queued.extend((task, temp_path) for task in tasks)
+                    continue
+                task, temp_path = queued.popleft()
+                pending[pool.submit(parse_task, **task)] = (submitted, temp_path)
+                submitted += 1
+            if not pending:
+                continue
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                number, temp_path = pending.pop(future)
+                if temp_path is not None:
+                    remaining[temp_path] -= 1
+                    if remaining[temp_path] == 0:
+                        del remaining[temp_path]
+                        os.remove(temp_path)
+                finished[number] = future.result()
+            # Tasks are numbered in file and page order, later ones wait for the earlier ones
+            while next_out in finished:
+                for text, metadata in finished.pop(next_out):
+                    yield Document(page_content=text, metadata=metadata)
+                next_out += 1
+    finally:
+        for temp_path in remaining:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
@@ -0,0 +1,162 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List
+
+from langchain_core.embeddings import Embeddings
+
+from utils.chunk_hashing import content_hash
+
+
+class EmbeddingCache:
+    """SQLite backed cache of float32 vectors keyed by (deployment id, text hash)"""
+
+    def __init__(self, path: str = "embedding_cache.sqlite", max_bytes: int = 512 * 1024 * 1024) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " deployment_id TEXT NOT NULL,"
+            " text_hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (deployment_id, text_hash))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self.conn.commit()
+
+    def get_many(self, deployment_id: str, hashes: List[str]) -> Dict[str, List[float]]:
+        """Look up several hashes at once and refresh their LRU timestamp"""
+        found = {}
+        with self.lock:
+            for i in range(0, len(hashes), 500):
+                part = hashes[i:i + 500]
+                placeholders = ", ".join("?" * len(part))
+                rows = self.conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE deployment_id = ? AND text_hash IN ({placeholders})",
+                    (deployment_id, *part)
+                ).fetchall()
+                for text_hash, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[text_hash] = vector.tolist()
+            if found:
+                now = time.time()
+                self.conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE deployment_id = ? AND text_hash = ?",
+                    [(now, deployment_id, h) for h in found]
+                )
+                self.conn.commit()
+            self.hits += sum(1 for h in hashes if h in found)
+            self.misses += sum(1 for h in hashes if h not in found)
+        return found
+
+    def put_many(self, deployment_id: str, vectors: Dict[str, List[float]]) -> None:
+        """Store new vectors and evict least recently used rows above the size limit"""
+        if not vectors:
+            return
+        now = time.time()
+        rows = []
+        for text_hash, vector in vectors.items():
+            blob = array("f", vector).tobytes()
+            rows.append((deployment_id, text_hash, blob, len(blob), now))
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (deployment_id, text_hash, vector, size, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self.conn.commit()
+            self._evict()
+
+    def _evict(self) -> None:
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Trim to 90% so we do not evict again on the very next insert
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        cursor = self.conn.execute("SELECT deployment_id, text_hash, size FROM embeddings ORDER BY last_used")
+        victims = []
+        for deployment_id, text_hash, size in cursor:
+            if total - removed <= target:
+                break
+            victims.append((deployment_id, text_hash))
+            removed += size
+        self.conn.executemany("DELETE FROM embeddings WHERE deployment_id = ? AND text_hash = ?", victims)
+        self.conn.commit()
+        logging.info(f"Embedding cache evicted {len(victims)} vectors ({removed} bytes)")
+
+    def stats(self) -> dict:
+        with self.lock:
+            entries, size = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM embeddings"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+            'size_bytes': size
+        }
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_cache() -> EmbeddingCache:
+    """Process wide cache so every Streamlit session and rerun reuses the same vectors"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = EmbeddingCache(
+                path=os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite"),
+                max_bytes=int(os.getenv("EMBEDDING_CACHE_MAX_MB", "512")) * 1024 * 1024
+            )
+        return _shared_cache
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only calls the underlying model for texts not seen before"""
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, deployment_id: str) -> None:
+        self.embeddings = embeddings
+        self.cache = cache
+        self.deployment_id = deployment_id or "default"
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [content_hash(text) for text in texts]
+        found = self.cache.get_many(self.deployment_id, list(dict.fromkeys(hashes)))
+
+        missing = {}
+        for text, text_hash in zip(texts, hashes):
+            if text_hash not in found and text_hash not in missing:
+                missing[text_hash] = text
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            new_vectors = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(self.deployment_id, new_vectors)
+            found.update(new_vectors)
+
+        return [found[text_hash] for text_hash in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        text_hash = content_hash(text)
+        found = self.cache.get_many(self.deployment_id, [text_hash])
+        if text_hash in found:
+            return found[text_hash]
+        vector = self.embeddings.embed_query(text)
+        self.cache.put_many(self.deployment_id, {text_hash: vector})
+        return vector
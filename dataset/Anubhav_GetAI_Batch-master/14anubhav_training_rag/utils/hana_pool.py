@@ -0,0 +1,208 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from hdbcli import dbapi
+
+
+class PoolTimeout(TimeoutError):
+    """No connection became available within the checkout timeout"""
+
+
+class HanaConnectionPool:
+    """Thread-safe pool of hdbcli connections.
+
+    min_size connections are opened up front and kept open. Connections are
+    health checked with SELECT 1 FROM DUMMY when they have been idle for a
+    while, idle connections above min_size are closed after
+    max_idle_seconds, and acquire() waits at most checkout_timeout seconds
+    once max_size connections are checked out.
+    """
+
+    def __init__(
+        self,
+        connect_args: dict,
+        min_size: int = 1,
+        max_size: int = 10,
+        max_idle_seconds: float = 300.0,
+        checkout_timeout: float = 30.0,
+        health_check_after: float = 30.0
+    ) -> None:
+        self.connect_args = connect_args
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.max_idle_seconds = max_idle_seconds
+        self.checkout_timeout = checkout_timeout
+        self.health_check_after = health_check_after
+        # (connection, returned at) with the most recently used connection last
+        self.idle = []
+        self.size = 0
+        self.created = 0
+        self.checkouts = 0
+        self.cond = threading.Condition()
+        # Pre-warm so the first requests skip the TLS handshake
+        for _ in range(self.min_size):
+            self.idle.append((self._connect(), time.time()))
+            self.size += 1
+
+    def _connect(self):
+        conn = dbapi.connect(**self.connect_args)
+        self.created += 1
+        logging.info(f"Opened HANA connection {self.created} to {self.connect_args.get('address')}")
+        return conn
+
+    @staticmethod
+    def _close(conn) -> None:
+        try:
+            conn.close()
+        except Exception as e:
+            logging.warning(f"Failed to close HANA connection: {e}")
+
+    @staticmethod
+    def is_healthy(conn) -> bool:
+        try:
+            if not conn.isconnected():
+                return False
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT 1 FROM DUMMY")
+                cursor.fetchone()
+            finally:
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _evict_idle(self) -> list:
+        """Take idle connections above min_size that passed max_idle_seconds (caller holds the lock)"""
+        now = time.time()
+        expired = []
+        while self.idle and self.size > self.min_size and now - self.idle[0][1] > self.max_idle_seconds:
+            expired.append(self.idle.pop(0)[0])
+            self.size -= 1
+        return expired
+
+    def acquire(self, timeout: Optional[float] = None):
+        timeout = self.checkout_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            conn, returned_at, create = None, None, False
+            with self.cond:
+                expired = self._evict_idle()
+                while not self.idle and self.size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(f"No HANA connection available within {timeout:g}s (max_size={self.max_size})")
+                    self.cond.wait(remaining)
+                if self.idle:
+                    conn, returned_at = self.idle.pop()
+                else:
+                    self.size += 1
+                    create = True
+            for old in expired:
+                self._close(old)
+
+            # Connecting and health checks happen outside the lock
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self.cond:
+                        self.size -= 1
+                        self.cond.notify()
+                    raise
+            elif time.time() - returned_at > self.health_check_after and not self.is_healthy(conn):
+                logging.info("Discarding broken HANA connection from pool")
+                self.release(conn, discard=True)
+                continue
+            with self.cond:
+                self.checkouts += 1
+            return conn
+
+    def release(self, conn, discard: bool = False) -> None:
+        if not discard:
+            try:
+                # Never hand over an open transaction to the next borrower
+                if not self.connect_args.get("autocommit", True):
+                    conn.rollback()
+            except Exception:
+                discard = True
+        with self.cond:
+            if discard:
+                self.size -= 1
+            else:
+                self.idle.append((conn, time.time()))
+            expired = self._evict_idle()
+            self.cond.notify()
+        if discard:
+            self._close(conn)
+        for old in expired:
+            self._close(old)
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        conn = self.acquire(timeout)
+        broken = False
+        try:
+            yield conn
+        except dbapi.Error:
+            broken = not self.is_healthy(conn)
+            raise
+        finally:
+            self.release(conn, discard=broken)
+
+    def close(self) -> None:
+        with self.cond:
+            idle, self.idle = self.idle, []
+            self.size -= len(idle)
+        for conn, _ in idle:
+            self._close(conn)
+
+    def stats(self) -> dict:
+        with self.cond:
+            return {
+                'size': self.size,
+                'idle': len(self.idle),
+                'in_use': self.size - len(self.idle),
+                'max_size': self.max_size,
+                'created': self.created,
+                'checkouts': self.checkouts
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(address: str, port, user: str, password: str, **connect_kwargs) -> HanaConnectionPool:
+    """Process wide pool per HANA endpoint and user, sized through HANA_POOL_* environment variables"""
+    key = (address, str(port), user)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            connect_args = dict(address=address, port=port, user=user, password=password, **connect_kwargs)
+            pool = HanaConnectionPool(
+                connect_args,
+                min_size=int(os.getenv("HANA_POOL_MIN_SIZE", "1")),
+                max_size=int(os.getenv("HANA_POOL_MAX_SIZE", "10")),
+                max_idle_seconds=float(os.getenv("HANA_POOL_MAX_IDLE_SECONDS", "300")),
+                checkout_timeout=float(os.getenv("HANA_POOL_CHECKOUT_TIMEOUT", "30"))
+            )
+            _pools[key] = pool
+        return pool
+
+
+def pool_stats() -> dict:
+    with _pools_lock:
+        return {f"{user}@{address}:{port}": pool.stats() for (address, port, user), pool in _pools.items()}
+
+
+@atexit.register
+def close_all_pools() -> None:
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
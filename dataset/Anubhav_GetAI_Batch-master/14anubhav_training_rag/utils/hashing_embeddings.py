@@ -0,0 +1,35 @@
+import hashlib
+import math
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from utils.hybrid_retriever import tokenize
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic, offline embedding model for benchmarks and CI.
+
+    Unigrams and bigrams are hashed into a fixed number of signed buckets, so
+    texts that share words get similar vectors without calling any service.
+    """
+
+    def __init__(self, dim: int = 384) -> None:
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        tokens = tokenize(text)
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        for feature in features:
+            digest = hashlib.md5(feature.encode("utf-8")).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
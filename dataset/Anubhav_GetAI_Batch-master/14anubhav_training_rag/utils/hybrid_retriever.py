@@ -0,0 +1,119 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Tuple
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased alphanumeric tokens, so course codes like CAPM or RAP match exactly"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+# One rebuild at a time per index file, see BM25Index.rebuild_lock
+_rebuild_locks = {}
+_rebuild_locks_lock = threading.Lock()
+
+
+def doc_key(doc: Document) -> str:
+    return doc.metadata.get("chunk_hash") or doc.page_content
+
+
+class BM25Index:
+    """Sparse inverted index over the chunks of one vector table"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self.docs: List[Document] = []
+        self.doc_lengths: List[int] = []
+        self.postings = defaultdict(dict)
+        self.avg_length = 0.0
+
+    def build(self, docs: List[Document]) -> "BM25Index":
+        self.docs = list(docs)
+        self.doc_lengths = []
+        self.postings = defaultdict(dict)
+        for i, doc in enumerate(self.docs):
+            tokens = tokenize(doc.page_content)
+            self.doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                self.postings[term][i] = tf
+        self.avg_length = sum(self.doc_lengths) / len(self.doc_lengths) if self.doc_lengths else 0.0
+        return self
+
+    def search(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        n = len(self.docs)
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for i, tf in posting.items():
+                norm = 1 - self.b + self.b * self.doc_lengths[i] / (self.avg_length or 1)
+                scores[i] += idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.docs[i], score) for i, score in best]
+
+    def save(self, path: str) -> None:
+        """Atomic write, readers never see a half written index"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump([{"text": d.page_content, "metadata": d.metadata} for d in self.docs], f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def rebuild_lock(path: str) -> threading.Lock:
+        """Serializes rebuilds of one index file, so a rebuild from an older table state never overwrites a newer one"""
+        with _rebuild_locks_lock:
+            return _rebuild_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with open(path, "r") as f:
+            records = json.load(f)
+        return cls().build([Document(page_content=r["text"], metadata=r["metadata"]) for r in records])
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Document]], k: int = 60) -> List[Document]:
+    """Merge ranked lists by summing 1 / (k + rank) per document"""
+    scores = defaultdict(float)
+    docs = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            key = doc_key(doc)
+            scores[key] += 1.0 / (k + rank)
+            docs.setdefault(key, doc)
+    return [docs[key] for key, _ in sorted(scores.items(), key=lambda item: item[1], reverse=True)]
+
+
+class HybridRetriever(BaseRetriever):
+    """Runs BM25 and vector search in parallel and fuses them with reciprocal rank fusion"""
+
+    vector_store: Any
+    bm25: Any
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+
+    def search(self, query: str, query_vector: List[float]) -> List[Document]:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            dense = executor.submit(self.vector_store.similarity_search_by_vector, query_vector, self.fetch_k)
+            sparse = executor.submit(self.bm25.search, query, self.fetch_k)
+            dense_docs = dense.result()
+            sparse_docs = [doc for doc, _ in sparse.result()]
+        return reciprocal_rank_fusion([dense_docs, sparse_docs], k=self.rrf_k)[:self.k]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.search(query, self.vector_store.embeddings.embed_query(query))
@@ -0,0 +1,223 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+ACTIVE_STATES = ('queued', 'running')
+JOB_COLUMNS = (
+    'job_id', 'table_name', 'source_id', 'lock_key', 'config', 'content', 'status', 'stage', 'total', 'embedded',
+    'committed', 'added', 'deleted', 'unchanged', 'attempts', 'error', 'created_at', 'updated_at'
+)
+PROGRESS_FIELDS = ('status', 'stage', 'total', 'embedded', 'committed', 'added', 'deleted', 'unchanged', 'attempts', 'error')
+
+
+class JobStore:
+    """SQLite table of ingestion jobs, so progress survives browser refreshes and restarts"""
+
+    def __init__(self, path: str = "ingestion_jobs.sqlite") -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY,"
+            " table_name TEXT NOT NULL,"
+            " source_id TEXT NOT NULL,"
+            " lock_key TEXT NOT NULL,"
+            " config TEXT NOT NULL,"
+            " content BLOB NOT NULL,"
+            " status TEXT NOT NULL,"
+            " stage TEXT,"
+            " total INTEGER DEFAULT 0,"
+            " embedded INTEGER DEFAULT 0,"
+            " committed INTEGER DEFAULT 0,"
+            " added INTEGER,"
+            " deleted INTEGER,"
+            " unchanged INTEGER,"
+            " attempts INTEGER DEFAULT 0,"
+            " error TEXT,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)")
+        self.conn.commit()
+
+    def create(self, table_name: str, source_id: str, lock_key: str, config: dict, content: bytes) -> str:
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO jobs (job_id, table_name, source_id, lock_key, config, content, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, 'queued', ?, ?)",
+                (job_id, table_name, source_id, lock_key, json.dumps(config), content, now, now)
+            )
+            self.conn.commit()
+        return job_id
+
+    def update(self, job_id: str, **fields) -> None:
+        unknown = set(fields) - set(PROGRESS_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown job fields: {unknown}")
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self.lock:
+            self.conn.execute(
+                f"UPDATE jobs SET {assignments}, updated_at = ? WHERE job_id = ?",
+                (*fields.values(), time.time(), job_id)
+            )
+            self.conn.commit()
+
+    def claim(self, job_id: str) -> bool:
+        """Mark a queued job as running; False if another thread already took it"""
+        with self.lock:
+            cursor = self.conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, error = NULL, updated_at = ? "
+                "WHERE job_id = ? AND status = 'queued'",
+                (time.time(), job_id)
+            )
+            self.conn.commit()
+        return cursor.rowcount == 1
+
+    def requeue_failed(self, job_id: str) -> bool:
+        """Queue a failed job again, unless it was already re-queued or its upload was dropped"""
+        with self.lock:
+            cursor = self.conn.execute(
+                "UPDATE jobs SET status = 'queued', error = NULL, updated_at = ? "
+                "WHERE job_id = ? AND status = 'failed' AND LENGTH(content) > 0",
+                (time.time(), job_id)
+            )
+            self.conn.commit()
+        return cursor.rowcount == 1
+
+    def drop_superseded_payloads(self, job_id: str) -> int:
+        """Delete the uploads of older jobs of the same table and source once a job is done.
+
+        Only the latest successful upload of a source is needed again, to re-chunk it
+        after a splitter change; older failed jobs would re-ingest an outdated version.
+        """
+        with self.lock:
+            cursor = self.conn.execute(
+                "UPDATE jobs SET content = X'', updated_at = ?, "
+                " error = CASE WHEN status = 'failed' THEN 'Superseded by job ' || ? ELSE error END "
+                "WHERE job_id != ? AND status IN ('done', 'failed') AND LENGTH(content) > 0 "
+                "AND (table_name, source_id) = (SELECT table_name, source_id FROM jobs WHERE job_id = ?) "
+                "AND created_at <= (SELECT created_at FROM jobs WHERE job_id = ?)",
+                (time.time(), job_id, job_id, job_id, job_id)
+            )
+            self.conn.commit()
+        return cursor.rowcount
+
+    def expire_failed_payloads(self, max_age_seconds: float) -> int:
+        """Delete the uploads of jobs that failed long ago and were never retried"""
+        with self.lock:
+            cursor = self.conn.execute(
+                "UPDATE jobs SET content = X'', error = 'Upload expired, submit the file again: ' || COALESCE(error, '') "
+                "WHERE status = 'failed' AND LENGTH(content) > 0 AND updated_at < ?",
+                (time.time() - max_age_seconds,)
+            )
+            self.conn.commit()
+        return cursor.rowcount
+
+    def _rows(self, where: str = "", params: tuple = (), limit: Optional[int] = None, with_content: bool = False) -> List[dict]:
+        # The uploaded file can be large, only the worker needs it
+        columns = "*" if with_content else ", ".join(c for c in JOB_COLUMNS if c != 'content')
+        query = f"SELECT {columns} FROM jobs {where} ORDER BY created_at DESC"
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+        with self.lock:
+            cursor = self.conn.execute(query, params)
+            names = [d[0] for d in cursor.description]
+            rows = cursor.fetchall()
+        jobs = []
+        for row in rows:
+            job = dict(zip(names, row))
+            job['config'] = json.loads(job['config'])
+            jobs.append(job)
+        return jobs
+
+    def get(self, job_id: str, with_content: bool = False) -> Optional[dict]:
+        jobs = self._rows("WHERE job_id = ?", (job_id,), with_content=with_content)
+        return jobs[0] if jobs else None
+
+    def recent(self, limit: int = 10) -> List[dict]:
+        return self._rows(limit=limit)
+
+    def unfinished(self) -> List[dict]:
+        return self._rows("WHERE status IN ('queued', 'running')")
+
+    def latest_per_source(self, table_name: str) -> List[dict]:
+        """Most recent successful job of every source in a table, i.e. what the table currently holds"""
+        return self._rows(
+            "WHERE job_id IN (SELECT job_id FROM jobs j WHERE table_name = ? AND status = 'done' "
+            "AND created_at = (SELECT MAX(created_at) FROM jobs WHERE table_name = j.table_name "
+            "AND source_id = j.source_id AND status = 'done'))",
+            (table_name,)
+        )
+
+
+class IngestionJobRunner:
+    """Runs ingestion jobs on its own thread pool, outside of any Streamlit script run.
+
+    The worker is called as worker(job, report) and returns the sync statistics;
+    report(**fields) persists progress. Jobs sharing a lock key (same table and
+    source, or same local index) never run at the same time.
+    """
+
+    def __init__(self, store: JobStore, worker: Callable[[dict, Callable], dict], max_jobs: int = 2) -> None:
+        self.store = store
+        self.worker = worker
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_jobs), thread_name_prefix="ingestion")
+        self.locks = {}
+        self.locks_lock = threading.Lock()
+
+    def lock_for(self, key: str) -> threading.Lock:
+        with self.locks_lock:
+            return self.locks.setdefault(key, threading.Lock())
+
+    def submit(self, table_name: str, source_id: str, lock_key: str, config: dict, content: bytes) -> str:
+        job_id = self.store.create(table_name, source_id, lock_key, config, content)
+        self.executor.submit(self._run, job_id)
+        logging.info(f"Queued ingestion job {job_id} for {source_id} into {table_name}")
+        return job_id
+
+    def retry(self, job_id: str) -> bool:
+        # Only one of several quick clicks gets to re-queue the job
+        if not self.store.requeue_failed(job_id):
+            return False
+        self.executor.submit(self._run, job_id)
+        return True
+
+    def resume_unfinished(self) -> int:
+        """Re-queue jobs that were queued or running when the previous process stopped"""
+        jobs = self.store.unfinished()
+        for job in jobs:
+            logging.info(f"Resuming ingestion job {job['job_id']} ({job['source_id']}, {job['committed']} chunks committed)")
+            self.store.update(job['job_id'], status='queued')
+            self.executor.submit(self._run, job['job_id'])
+        return len(jobs)
+
+    def _run(self, job_id: str) -> None:
+        job = self.store.get(job_id)
+        if job is None or job['status'] not in ACTIVE_STATES:
+            return
+        with self.lock_for(job['lock_key']):
+            # The same job can be submitted twice (retry plus resume); whoever claims it first runs it
+            if not self.store.claim(job_id):
+                return
+            job = self.store.get(job_id, with_content=True)
+
+            def report(**fields) -> None:
+                self.store.update(job_id, **fields)
+
+            try:
+                stats = self.worker(job, report)
+                self.store.update(job_id, status='done', stage='done', **stats)
+                self.store.drop_superseded_payloads(job_id)
+                logging.info(f"Ingestion job {job_id} finished: {stats}")
+            except Exception as e:
+                self.store.update(job_id, status='failed', error=str(e))
+                logging.error(f"Ingestion job {job_id} failed: {e}")
@@ -0,0 +1,199 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, List, Optional
+
+from langchain_core.documents import Document
+
+from utils.context_packing import count_tokens
+from utils.metrics import get_metrics
+
+
+def get_status_code(exc: Exception) -> Optional[int]:
+    """Best effort extraction of the HTTP status behind an embedding error"""
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(exc: Exception) -> bool:
+    """Throttling (429), server side errors (5xx) and timeouts are worth retrying"""
+    status = get_status_code(exc)
+    if status is not None:
+        return status == 429 or status >= 500
+    message = str(exc).lower()
+    return "429" in message or "rate limit" in message or "timed out" in message or "timeout" in message
+
+
+def get_retry_after(exc: Exception) -> Optional[float]:
+    """Honour a Retry-After header if the service sent one"""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveLimiter:
+    """Concurrency limit that halves on throttling and grows back slowly"""
+
+    def __init__(self, max_limit: int, increase_after: int = 5) -> None:
+        self.max_limit = max(1, max_limit)
+        self.limit = self.max_limit
+        self.increase_after = increase_after
+        self.in_flight = 0
+        self.successes = 0
+        self.cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self.cond:
+            while self.in_flight >= self.limit:
+                self.cond.wait()
+            self.in_flight += 1
+
+    def release(self, throttled: bool = False) -> None:
+        with self.cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(1, self.limit // 2)
+                self.successes = 0
+            else:
+                self.successes += 1
+                if self.successes >= self.increase_after and self.limit < self.max_limit:
+                    self.limit += 1
+                    self.successes = 0
+            self.cond.notify_all()
+
+
+class IngestionPipeline:
+    """Embed chunks in batches on a bounded worker pool and bulk insert them into a vector store"""
+
+    def __init__(
+        self,
+        embedding_model,
+        db,
+        embed_batch_size: int = 64,
+        max_workers: int = 4,
+        insert_batch_size: int = 500,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        mirrors: Optional[list] = None,
+        checkpoint_callback: Optional[Callable[[int], None]] = None
+    ) -> None:
+        self.embedding_model = embedding_model
+        self.db = db
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.max_workers = max(1, max_workers)
+        self.insert_batch_size = max(1, insert_batch_size)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.progress_callback = progress_callback
+        # Additional stores (e.g. a local read replica) that receive the same rows
+        self.mirrors = mirrors or []
+        # Called with the number of rows written so far after every bulk insert
+        self.checkpoint_callback = checkpoint_callback
+        self.limiter = AdaptiveLimiter(self.max_workers)
+        self.throttled_calls = 0
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed one batch, timed including any retries"""
+        with get_metrics().span('embed_batch') as span:
+            vectors = self._embed_with_retries(texts)
+            span.items = len(texts)
+            span.tokens = {'input': sum(count_tokens(text) for text in texts)}
+        return vectors
+
+    def _embed_with_retries(self, texts: List[str]) -> List[List[float]]:
+        """Embed one batch, backing off exponentially (with jitter) on retryable errors"""
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            try:
+                vectors = self.embedding_model.embed_documents(texts)
+            except Exception as e:
+                self.limiter.release(throttled=is_retryable(e))
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                self.throttled_calls += 1
+                delay = get_retry_after(e)
+                if delay is None:
+                    delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+                    delay = random.uniform(delay / 2, delay)
+                logging.warning(f"Embedding batch throttled ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.limiter.release()
+            return vectors
+
+    def run(self, documents: List[Document]) -> int:
+        """Embed and insert all documents, returns the number of rows written"""
+        total = len(documents)
+        if total == 0:
+            return 0
+
+        batches = [
+            documents[i:i + self.embed_batch_size]
+            for i in range(0, total, self.embed_batch_size)
+        ]
+        pending_texts, pending_metadatas, pending_vectors = [], [], []
+        embedded = 0
+        inserted = 0
+
+        def flush() -> int:
+            # Inserts happen on the calling thread so the HANA connection is never shared
+            with get_metrics().span('insert') as span:
+                self.db.add_texts(pending_texts, metadatas=pending_metadatas, embeddings=pending_vectors)
+                for mirror in self.mirrors:
+                    mirror.add_texts(pending_texts, metadatas=pending_metadatas, embeddings=pending_vectors)
+                span.items = len(pending_texts)
+            count = len(pending_texts)
+            pending_texts.clear()
+            pending_metadatas.clear()
+            pending_vectors.clear()
+            if self.checkpoint_callback is not None:
+                self.checkpoint_callback(inserted + count)
+            return count
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self.embed_batch, [doc.page_content for doc in batch]): batch
+                for batch in batches
+            }
+            try:
+                for future in as_completed(futures):
+                    batch = futures[future]
+                    vectors = future.result()
+                    pending_texts.extend(doc.page_content for doc in batch)
+                    pending_metadatas.extend(doc.metadata for doc in batch)
+                    pending_vectors.extend(vectors)
+                    embedded += len(batch)
+
+                    if len(pending_texts) >= self.insert_batch_size:
+                        inserted += flush()
+                    if self.progress_callback is not None:
+                        self.progress_callback(embedded, total)
+            except BaseException:
+                # The job fails anyway, do not embed the batches still queued first
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+
+        if pending_texts:
+            inserted += flush()
+
+        logging.info(
+            f"Ingested {inserted} chunks in {len(batches)} embedding batches "
+            f"({self.throttled_calls} throttled calls)"
+        )
+        return inserted
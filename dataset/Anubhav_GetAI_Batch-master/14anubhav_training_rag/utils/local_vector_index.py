@@ -0,0 +1,444 @@
+import json
+import logging
+import os
+import struct
+import uuid
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+# Search-side encodings of the unit vectors; the exact vectors stay on disk for re-scoring
+COMPRESSIONS = (None, "float16", "int8", "pca")
+# Rows per matrix product when up-casting compressed rows to float32
+BLOCK_ROWS = 65536
+# PCA is fitted on at most this many rows of the corpus
+PCA_SAMPLE = 20000
+
+
+def matches_filter(metadata: dict, filter: Optional[dict]) -> bool:
+    """Subset of the HanaDB filter syntax: equality and $in per metadata key"""
+    if not filter:
+        return True
+    for key, condition in filter.items():
+        value = metadata.get(key)
+        if isinstance(condition, dict):
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+            if "$nin" in condition and value in condition["$nin"]:
+                return False
+            if "$eq" in condition and value != condition["$eq"]:
+                return False
+            if "$ne" in condition and value == condition["$ne"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class LocalVectorIndex(VectorStore):
+    """In-process vector store: memory-mapped matrix of unit vectors plus a JSON id -> text/metadata map.
+
+    Drop-in replacement for HanaDB in the training RAG for machines without
+    HANA access, and usable as a read replica of a HANA table. Writes are
+    kept in memory until save() is called.
+
+    With compression set, queries scan a smaller copy of the matrix (float16,
+    int8 with a per-vector scale, or a PCA projection fitted on the corpus) and
+    only the rescore_factor * k best candidates are re-scored with the exact
+    vectors, which stay memory-mapped and are read row by row.
+    """
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        path: Optional[str] = None,
+        dtype: str = "float32",
+        compression: Optional[str] = None,
+        pca_dim: int = 128,
+        rescore_factor: int = 4
+    ) -> None:
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Unsupported storage dtype: {dtype}")
+        compression = None if compression in (None, "none") else compression
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unsupported compression: {compression}")
+        self.embedding = embedding
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.compression = compression
+        self.pca_dim = pca_dim
+        self.rescore_factor = rescore_factor
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[dict] = []
+        self.vectors = None
+        self.pending = []
+        # Compressed search matrix, built lazily from the exact vectors
+        self.codes = None
+        self.scales = None
+        self.pca_mean = None
+        self.pca_components = None
+        self.pca_fitted_on = 0
+        if path is not None and os.path.exists(os.path.join(path, "index.json")):
+            self.load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def matrix(self) -> Optional[np.ndarray]:
+        """All vectors as one matrix, folding in blocks added since the last call"""
+        if self.pending:
+            blocks = ([] if self.vectors is None else [np.asarray(self.vectors)]) + self.pending
+            self.vectors = np.vstack(blocks)
+            self.pending = []
+        return self.vectors
+
+    # ---- compression -------------------------------------------------------
+
+    def fit_pca(self, vectors: np.ndarray) -> None:
+        """Principal axes of (a sample of) the corpus, from the eigenvectors of its covariance"""
+        rows = vectors.shape[0]
+        if rows > PCA_SAMPLE:
+            sample = np.sort(np.random.default_rng(0).choice(rows, PCA_SAMPLE, replace=False))
+            matrix = np.asarray(vectors[sample], dtype=np.float32)
+        else:
+            matrix = np.asarray(vectors, dtype=np.float32)
+        mean = matrix.mean(axis=0)
+        centered = matrix - mean
+        eigenvalues, eigenvectors = np.linalg.eigh(centered.T @ centered)
+        dim = min(self.pca_dim, matrix.shape[1])
+        # eigh sorts ascending, keep the largest components
+        self.pca_components = np.ascontiguousarray(eigenvectors[:, ::-1][:, :dim].T, dtype=np.float32)
+        self.pca_mean = mean.astype(np.float32)
+        self.pca_fitted_on = rows
+        self.codes, self.scales = None, None
+        logging.info(f"Fitted PCA {matrix.shape[1]} -> {dim} dims on {matrix.shape[0]} vectors")
+
+    def encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Compressed codes (and int8 scales) of unit vectors"""
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if self.compression == "float16":
+            return matrix.astype(np.float16), None
+        if self.compression == "pca":
+            return (matrix - self.pca_mean) @ self.pca_components.T, None
+        # int8: each row is scaled so its largest component maps to +-127
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def compressed(self) -> Optional[np.ndarray]:
+        """Search matrix for the current compression, encoding rows added since the last call"""
+        vectors = self.matrix()
+        if self.compression is None or vectors is None:
+            return None
+        rows = vectors.shape[0]
+        if self.compression == "pca" and (
+            self.pca_components is None or (self.pca_fitted_on < PCA_SAMPLE and rows >= 2 * self.pca_fitted_on)
+        ):
+            # Refit while the corpus is still growing, early batches are not representative
+            self.fit_pca(vectors)
+        done = 0 if self.codes is None else self.codes.shape[0]
+        if done < rows:
+            blocks = [self.encode(vectors[i:i + BLOCK_ROWS]) for i in range(done, rows, BLOCK_ROWS)]
+            codes = ([] if self.codes is None else [np.asarray(self.codes)]) + [c for c, _ in blocks]
+            self.codes = np.concatenate(codes)
+            if self.compression == "int8":
+                scales = ([] if self.scales is None else [np.asarray(self.scales)]) + [s for _, s in blocks]
+                self.scales = np.concatenate(scales)
+        return self.codes
+
+    def memory_stats(self) -> dict:
+        """Bytes scanned per query with and without compression"""
+        vectors = self.matrix()
+        rows, dim = (0, 0) if vectors is None else vectors.shape
+        exact_bytes = rows * dim * self.dtype.itemsize
+        codes = self.compressed()
+        search_bytes = exact_bytes if codes is None else codes.nbytes + (0 if self.scales is None else self.scales.nbytes)
+        return {
+            'rows': rows,
+            'dim': dim,
+            'compression': self.compression or 'none',
+            'exact_bytes': exact_bytes,
+            'search_bytes': search_bytes,
+            'ratio': exact_bytes / search_bytes if search_bytes else 1.0
+        }
+
+    # ---- persistence -------------------------------------------------------
+
+    def load(self) -> None:
+        with open(os.path.join(self.path, "index.json"), "r") as f:
+            index = json.load(f)
+        self.dtype = np.dtype(index["dtype"])
+        self.ids = [r["id"] for r in index["records"]]
+        self.texts = [r["text"] for r in index["records"]]
+        self.metadatas = [r["metadata"] for r in index["records"]]
+        vectors_file = os.path.join(self.path, "vectors.npy")
+        self.vectors = np.load(vectors_file, mmap_mode="r") if self.ids else None
+        # Saved codes are reused only if they were built with the requested settings
+        saved = index.get("compression")
+        if self.ids and saved is not None and saved == self.compression and (
+            saved != "pca" or index.get("pca_dim") == self.pca_dim
+        ):
+            self.codes = np.load(os.path.join(self.path, "codes.npy"), mmap_mode="r")
+            if saved == "int8":
+                self.scales = np.load(os.path.join(self.path, "scales.npy"))
+            if saved == "pca":
+                with np.load(os.path.join(self.path, "pca.npz")) as pca:
+                    self.pca_mean, self.pca_components = pca["mean"], pca["components"]
+                self.pca_fitted_on = index.get("pca_fitted_on", len(self.ids))
+        logging.info(f"Loaded local vector index {self.path} with {len(self.ids)} vectors")
+
+    def set_dtype(self, dtype: str) -> None:
+        """Store the exact vectors in another dtype; save() writes them.
+
+        float16 -> float32 does not bring back the precision lost earlier.
+        """
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Unsupported storage dtype: {dtype}")
+        matrix = self.matrix()
+        self.dtype = np.dtype(dtype)
+        if matrix is not None:
+            self.vectors = np.asarray(matrix, dtype=self.dtype)
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        vectors_file = os.path.join(self.path, "vectors.npy")
+        self.matrix()
+        if self.vectors is not None:
+            # Write to a temp file first so a crash never leaves a half written matrix
+            np.save(vectors_file + ".tmp.npy", np.ascontiguousarray(self.vectors))
+            os.replace(vectors_file + ".tmp.npy", vectors_file)
+        elif os.path.exists(vectors_file):
+            os.remove(vectors_file)
+        codes = self.compressed()
+        arrays = {
+            "codes.npy": codes,
+            "scales.npy": self.scales if self.compression == "int8" else None
+        }
+        for name, array in arrays.items():
+            target = os.path.join(self.path, name)
+            if array is not None:
+                np.save(target + ".tmp.npy", np.ascontiguousarray(array))
+                os.replace(target + ".tmp.npy", target)
+            elif os.path.exists(target):
+                os.remove(target)
+        pca_file = os.path.join(self.path, "pca.npz")
+        if codes is not None and self.compression == "pca":
+            np.savez(pca_file + ".tmp.npz", mean=self.pca_mean, components=self.pca_components)
+            os.replace(pca_file + ".tmp.npz", pca_file)
+        elif os.path.exists(pca_file):
+            os.remove(pca_file)
+        records = [
+            {"id": i, "text": t, "metadata": m}
+            for i, t, m in zip(self.ids, self.texts, self.metadatas)
+        ]
+        with open(os.path.join(self.path, "index.json.tmp"), "w") as f:
+            json.dump({
+                "dtype": self.dtype.name,
+                "compression": self.compression if codes is not None else None,
+                "pca_dim": self.pca_dim,
+                "pca_fitted_on": self.pca_fitted_on,
+                "records": records
+            }, f)
+        os.replace(os.path.join(self.path, "index.json.tmp"), os.path.join(self.path, "index.json"))
+        # Re-open read-only so large indexes stay out of the process heap
+        if self.vectors is not None:
+            self.vectors = np.load(vectors_file, mmap_mode="r")
+        if codes is not None:
+            self.codes = np.load(os.path.join(self.path, "codes.npy"), mmap_mode="r")
+
+    # ---- writes ------------------------------------------------------------
+
+    def _to_unit(self, vectors: List[List[float]]) -> np.ndarray:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (matrix / norms).astype(self.dtype)
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        embeddings: Optional[List[List[float]]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any
+    ) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        if embeddings is None:
+            embeddings = self.embedding.embed_documents(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+
+        self.pending.append(self._to_unit(embeddings))
+        self.ids.extend(ids)
+        self.texts.extend(texts)
+        self.metadatas.extend(dict(m) for m in metadatas)
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, filter: Optional[dict] = None, **kwargs: Any) -> Optional[bool]:
+        if ids is None and filter is None:
+            raise ValueError("Parameter 'ids' or 'filter' is required when calling 'delete'")
+        id_set = set(ids or [])
+        keep = [
+            not ((ids is not None and i in id_set) or (filter is not None and matches_filter(m, filter)))
+            for i, m in zip(self.ids, self.metadatas)
+        ]
+        if all(keep):
+            return True
+        mask = np.array(keep, dtype=bool)
+        vectors = self.matrix()
+        self.vectors = np.asarray(vectors)[mask] if mask.any() else None
+        self.codes, self.scales = None, None
+        self.ids = [x for x, k in zip(self.ids, keep) if k]
+        self.texts = [x for x, k in zip(self.texts, keep) if k]
+        self.metadatas = [x for x, k in zip(self.metadatas, keep) if k]
+        return True
+
+    # ---- reads -------------------------------------------------------------
+
+    def count(self, filter: Optional[dict] = None) -> int:
+        if not filter:
+            return len(self.ids)
+        return sum(1 for m in self.metadatas if matches_filter(m, filter))
+
+    def metadata_values(self, key: str, filter: Optional[dict] = None) -> set:
+        """Distinct values of one metadata key, e.g. the chunk hashes of a source"""
+        return {m[key] for m in self.metadatas if key in m and matches_filter(m, filter)}
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[dict] = None
+    ) -> List[Tuple[Document, float]]:
+        vectors = self.matrix()
+        if vectors is None or k <= 0:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+
+        codes = self.compressed()
+        if codes is None:
+            scores = block_dot(vectors, query)
+        elif self.compression == "pca":
+            # v.q ~= (mean + P^T z).q = z.(P q) + mean.q
+            scores = block_dot(codes, self.pca_components @ query) + float(self.pca_mean @ query)
+        else:
+            scores = block_dot(codes, query)
+            if self.scales is not None:
+                scores *= self.scales
+        if filter:
+            mask = np.array([matches_filter(m, filter) for m in self.metadatas], dtype=bool)
+            scores = np.where(mask, scores, -np.inf)
+
+        if codes is not None and self.rescore_factor > 0:
+            candidates = top_k(scores, k * self.rescore_factor)
+            candidates = np.sort(candidates[np.isfinite(scores[candidates])])
+            # Only the candidate rows of the memory-mapped exact matrix are read
+            exact = np.asarray(vectors[candidates], dtype=np.float32) @ query
+            scores = np.full(scores.shape[0], -np.inf, dtype=np.float32)
+            scores[candidates] = exact
+        top = top_k(scores, k)
+        return [
+            (Document(page_content=self.texts[i], metadata=dict(self.metadatas[i])), float(scores[i]))
+            for i in top if np.isfinite(scores[i])
+        ]
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter)]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self.embedding.embed_query(query), k, filter)
+
+    def _select_relevance_score_fn(self):
+        return lambda score: score
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        path: Optional[str] = None,
+        dtype: str = "float32",
+        compression: Optional[str] = None,
+        **kwargs: Any
+    ) -> "LocalVectorIndex":
+        index = cls(embedding, path=path, dtype=dtype, compression=compression)
+        index.add_texts(texts, metadatas)
+        index.save()
+        return index
+
+    # ---- HANA replica ------------------------------------------------------
+
+    def replicate_from_hana(self, conn, db) -> int:
+        """Copy all rows of a HanaDB table into this index (used as a hot read replica)"""
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                f'SELECT "{db.content_column}", "{db.metadata_column}", "{db.vector_column}" '
+                f'FROM "{db.table_name}"'
+            )
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+
+        texts, metadatas, vectors = [], [], []
+        for text, metadata, vector in rows:
+            texts.append(text)
+            metadatas.append(json.loads(metadata) if metadata else {})
+            vectors.append(decode_fvecs(vector))
+
+        self.ids, self.texts, self.metadatas, self.vectors, self.pending = [], [], [], None, []
+        self.codes, self.scales = None, None
+        if texts:
+            self.add_texts(texts, metadatas, embeddings=vectors)
+        self.save()
+        logging.info(f"Replicated {len(texts)} rows from HANA table {db.table_name}")
+        return len(texts)
+
+
+def block_dot(matrix: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """matrix @ query, up-casting non-float32 rows block by block instead of copying the whole matrix"""
+    if matrix.dtype == np.float32:
+        return np.asarray(matrix @ query)
+    return np.concatenate([
+        np.asarray(matrix[i:i + BLOCK_ROWS], dtype=np.float32) @ query
+        for i in range(0, matrix.shape[0], BLOCK_ROWS)
+    ])
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first; argpartition is O(n), only the winners get sorted"""
+    k = min(k, scores.shape[0])
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def decode_fvecs(value) -> List[float]:
+    """Decode a REAL_VECTOR/HALF_VECTOR column value as returned by hdbcli"""
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    raw = bytes(value)
+    dim = struct.unpack_from("<I", raw, 0)[0]
+    # 4 bytes per component for REAL_VECTOR, 2 for HALF_VECTOR
+    fmt = "f" if len(raw) - 4 == 4 * dim else "e"
+    return list(struct.unpack_from(f"<{dim}{fmt}", raw, 4))
@@ -0,0 +1,178 @@
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# Upper bounds in seconds, from a local index lookup up to a slow LLM answer
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile of raw samples, used by the offline benchmarks"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus layout"""
+
+    def __init__(self, buckets=BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Linear interpolation inside the bucket holding the q-th observation, like histogram_quantile()"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, bound in enumerate(self.buckets):
+            if seen + self.counts[i] >= rank:
+                return lower + (bound - lower) * (rank - seen) / self.counts[i]
+            seen += self.counts[i]
+            lower = bound
+        return self.buckets[-1]
+
+
+class Span:
+    """One timed execution of a stage; set items and tokens while it runs"""
+
+    def __init__(self, stage: str) -> None:
+        self.stage = stage
+        self.items = 0
+        self.tokens: Dict[str, int] = {}
+        self.duration = 0.0
+
+
+class MetricsRegistry:
+    """Process wide per-stage latency histograms plus item and token counters"""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.histograms: Dict[str, Histogram] = {}
+        self.items = defaultdict(int)
+        self.tokens = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.exporter = None
+
+    def observe(self, stage: str, seconds: float, items: int = 0, tokens: Optional[Dict[str, int]] = None, error: bool = False) -> None:
+        with self.lock:
+            self.histograms.setdefault(stage, Histogram()).observe(seconds)
+            self.items[stage] += items
+            for kind, count in (tokens or {}).items():
+                self.tokens[(stage, kind)] += count
+            if error:
+                self.errors[stage] += 1
+
+    @contextmanager
+    def span(self, stage: str):
+        span = Span(stage)
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield span
+        except Exception:
+            failed = True
+            raise
+        finally:
+            span.duration = time.perf_counter() - start
+            self.observe(stage, span.duration, span.items, span.tokens, error=failed)
+
+    def summary(self) -> list:
+        with self.lock:
+            return [
+                {
+                    'stage': stage,
+                    'count': histogram.count,
+                    'p50_ms': histogram.quantile(0.5) * 1000,
+                    'p95_ms': histogram.quantile(0.95) * 1000,
+                    'avg_ms': histogram.sum / histogram.count * 1000 if histogram.count else 0.0,
+                    'items': self.items[stage],
+                    'tokens': sum(c for (s, _), c in self.tokens.items() if s == stage),
+                    'errors': self.errors[stage]
+                }
+                for stage, histogram in sorted(self.histograms.items())
+            ]
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# HELP rag_stage_duration_seconds Duration of RAG pipeline stages",
+            "# TYPE rag_stage_duration_seconds histogram"
+        ]
+        with self.lock:
+            for stage, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'rag_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'rag_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'rag_stage_duration_seconds_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+                lines.append(f'rag_stage_duration_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+            lines += ["# HELP rag_stage_items_total Items (chunks, rows, documents) processed per stage",
+                      "# TYPE rag_stage_items_total counter"]
+            lines += [f'rag_stage_items_total{{stage="{s}"}} {c}' for s, c in sorted(self.items.items())]
+
+            lines += ["# HELP rag_tokens_total Tokens used per stage and kind",
+                      "# TYPE rag_tokens_total counter"]
+            lines += [f'rag_tokens_total{{stage="{s}",kind="{k}"}} {c}' for (s, k), c in sorted(self.tokens.items())]
+
+            lines += ["# HELP rag_stage_errors_total Failed stage executions",
+                      "# TYPE rag_stage_errors_total counter"]
+            lines += [f'rag_stage_errors_total{{stage="{s}"}} {c}' for s, c in sorted(self.errors.items())]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus_file(self, path: str) -> None:
+        """Atomic write for the node_exporter textfile collector"""
+        with open(path + ".tmp", "w") as f:
+            f.write(self.render_prometheus())
+        os.replace(path + ".tmp", path)
+
+    def start_file_export(self, path: str, interval: float = 15.0) -> None:
+        if self.exporter is not None:
+            return
+
+        def export_loop():
+            while True:
+                try:
+                    self.write_prometheus_file(path)
+                except Exception as e:
+                    logging.warning(f"Failed to write metrics file {path}: {e}")
+                time.sleep(interval)
+
+        self.exporter = threading.Thread(target=export_loop, name="metrics-export", daemon=True)
+        self.exporter.start()
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Process wide registry; written to METRICS_FILE (if set) every METRICS_INTERVAL seconds"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = MetricsRegistry()
+            if os.getenv("METRICS_FILE"):
+                _metrics.start_file_export(os.getenv("METRICS_FILE"), float(os.getenv("METRICS_INTERVAL", "15")))
+        return _metrics
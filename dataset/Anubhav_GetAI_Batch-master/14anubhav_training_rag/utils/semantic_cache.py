@@ -0,0 +1,114 @@
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """In-memory answer cache matched by cosine similarity of the query embedding"""
+
+    def __init__(self, threshold: float = 0.95, ttl_seconds: float = 3600, max_entries: int = 500) -> None:
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.vectors = None
+        self.entries = []
+        # Bumped by invalidate(); answers computed before that are not stored
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm > 0 else v
+
+    def _drop(self, keep: np.ndarray) -> None:
+        self.entries = [entry for entry, k in zip(self.entries, keep) if k]
+        self.vectors = self.vectors[keep] if self.entries else None
+
+    def _expire(self, now: float) -> None:
+        if self.entries:
+            keep = np.array([now - e['created'] < self.ttl_seconds for e in self.entries])
+            if not keep.all():
+                self._drop(keep)
+
+    def lookup(self, query_vector: List[float]) -> Optional[dict]:
+        """Return the cached entry of the most similar earlier query above the threshold"""
+        q = self._normalize(query_vector)
+        now = time.time()
+        with self.lock:
+            self._expire(now)
+            if self.vectors is None or self.vectors.shape[1] != q.shape[0]:
+                self.misses += 1
+                return None
+            similarities = self.vectors @ q
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            entry = self.entries[best]
+            entry['last_used'] = now
+            self.hits += 1
+            self.saved_seconds += entry['latency']
+            return dict(entry, similarity=float(similarities[best]))
+
+    def store(
+        self,
+        query: str,
+        query_vector: List[float],
+        answer: str,
+        sources: list,
+        latency: float,
+        generation: Optional[int] = None
+    ) -> None:
+        """Remember an answer, evicting the least recently used entry when full.
+
+        Pass the generation read before retrieving: an answer computed while the
+        cache was invalidated may quote chunks that are gone and is dropped.
+        """
+        q = self._normalize(query_vector)
+        now = time.time()
+        entry = {
+            'query': query,
+            'answer': answer,
+            'sources': sources,
+            'latency': latency,
+            'created': now,
+            'last_used': now
+        }
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._expire(now)
+            if self.vectors is not None and self.vectors.shape[1] != q.shape[0]:
+                # Embedding model changed, old vectors are not comparable
+                self.entries, self.vectors = [], None
+            if len(self.entries) >= self.max_entries:
+                lru = int(np.argmin([e['last_used'] for e in self.entries]))
+                keep = np.ones(len(self.entries), dtype=bool)
+                keep[lru] = False
+                self._drop(keep)
+            self.entries.append(entry)
+            self.vectors = q[None, :] if self.vectors is None else np.vstack([self.vectors, q])
+
+    def invalidate(self) -> None:
+        """Forget all answers, e.g. after the vector table was re-ingested"""
+        with self.lock:
+            self.entries = []
+            self.vectors = None
+            self.generation += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'saved_seconds': self.saved_seconds
+        }
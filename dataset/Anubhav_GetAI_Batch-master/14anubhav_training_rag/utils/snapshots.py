@@ -0,0 +1,171 @@
+import io
+import json
+import logging
+import os
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from utils.local_vector_index import LocalVectorIndex, decode_fvecs
+
+SNAPSHOT_VERSION = 1
+
+
+def snapshot_format(path: str) -> str:
+    return 'parquet' if str(path).lower().endswith('.parquet') else 'npz'
+
+
+def read_rows(store, conn=None) -> Tuple[List[str], List[str], List[dict], np.ndarray]:
+    """ids, texts, metadata and float32 vectors of every row in a LocalVectorIndex or HanaDB table"""
+    if isinstance(store, LocalVectorIndex):
+        vectors = store.matrix()
+        dim = vectors.shape[1] if vectors is not None else 0
+        matrix = np.asarray(vectors, dtype=np.float32) if vectors is not None else np.zeros((0, dim), np.float32)
+        return list(store.ids), list(store.texts), [dict(m) for m in store.metadatas], matrix
+
+    cursor = conn.cursor()
+    texts, metadatas, vectors = [], [], []
+    try:
+        cursor.execute(
+            f'SELECT "{store.content_column}", "{store.metadata_column}", "{store.vector_column}" '
+            f'FROM "{store.table_name}"'
+        )
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            for text, metadata, vector in rows:
+                texts.append(text)
+                metadatas.append(json.loads(metadata) if metadata else {})
+                vectors.append(decode_fvecs(vector))
+    finally:
+        cursor.close()
+    # HANA vector tables have no id column, row numbers stand in
+    ids = [str(i) for i in range(len(texts))]
+    matrix = np.asarray(vectors, dtype=np.float32) if vectors else np.zeros((0, 0), np.float32)
+    return ids, texts, metadatas, matrix
+
+
+def write_snapshot(target, manifest: dict, ids: list, texts: list, metadatas: list, vectors: np.ndarray, fmt: str = 'npz') -> None:
+    """Write a snapshot to a path or a binary file object"""
+    if fmt == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        dim = vectors.shape[1] if vectors.ndim == 2 and vectors.shape[1] else manifest.get('dim', 0)
+        values = pa.array(vectors.reshape(-1), pa.float32())
+        if dim:
+            vector_column = pa.FixedSizeListArray.from_arrays(values, dim)
+        else:
+            # An empty HANA table gives no width, and fixed size lists need one
+            vector_column = pa.array([[] for _ in ids], pa.list_(pa.float32()))
+        table = pa.table({
+            'id': pa.array(ids, pa.string()),
+            'text': pa.array(texts, pa.string()),
+            'metadata': pa.array([json.dumps(m) for m in metadatas], pa.string()),
+            'vector': vector_column
+        }).replace_schema_metadata({'rag_snapshot': json.dumps(manifest)})
+        pq.write_table(table, target, compression='zstd')
+        return
+
+    records = [{"id": i, "text": t, "metadata": m} for i, t, m in zip(ids, texts, metadatas)]
+    # Texts and metadata travel as UTF-8 JSON so loading never needs allow_pickle
+    np.savez_compressed(
+        target,
+        manifest=np.frombuffer(json.dumps(manifest).encode("utf-8"), dtype=np.uint8),
+        records=np.frombuffer(json.dumps(records).encode("utf-8"), dtype=np.uint8),
+        vectors=np.ascontiguousarray(vectors, dtype=np.float32)
+    )
+
+
+def read_snapshot(source, fmt: str = 'npz') -> Tuple[dict, list, list, list, np.ndarray]:
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(source)
+        manifest = json.loads(table.schema.metadata[b'rag_snapshot'])
+        vectors = table.column('vector').combine_chunks()
+        matrix = vectors.flatten().to_numpy(zero_copy_only=False).reshape(len(table), manifest['dim'])
+        return (
+            manifest,
+            table.column('id').to_pylist(),
+            table.column('text').to_pylist(),
+            [json.loads(m) for m in table.column('metadata').to_pylist()],
+            matrix.astype(np.float32, copy=False)
+        )
+
+    with np.load(source) as data:
+        manifest = json.loads(data['manifest'].tobytes().decode("utf-8"))
+        records = json.loads(data['records'].tobytes().decode("utf-8"))
+        vectors = data['vectors']
+    return (
+        manifest,
+        [r['id'] for r in records],
+        [r['text'] for r in records],
+        [r['metadata'] for r in records],
+        vectors
+    )
+
+
+def export_snapshot(store, target, embedding_model: str, table_name: str, conn=None, fmt: Optional[str] = None) -> dict:
+    """Dump a vector table with the id of the embedding model that produced its vectors"""
+    fmt = fmt or snapshot_format(target)
+    ids, texts, metadatas, vectors = read_rows(store, conn)
+    manifest = {
+        'version': SNAPSHOT_VERSION,
+        'embedding_model': embedding_model,
+        'dim': int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+        'count': len(ids),
+        'table_name': table_name,
+        'created_at': datetime.now().isoformat()
+    }
+    write_snapshot(target, manifest, ids, texts, metadatas, vectors, fmt)
+    logging.info(f"Exported {len(ids)} vectors of {table_name} as {fmt}")
+    return manifest
+
+
+def import_snapshot(
+    source,
+    store,
+    embedding_model: Optional[str] = None,
+    fmt: Optional[str] = None,
+    replace: bool = True,
+    batch_size: int = 500,
+    force: bool = False
+) -> dict:
+    """Bulk load a snapshot into a store without calling the embedding service.
+
+    Vectors are only comparable with queries embedded by the same model, so a
+    snapshot from a different embedding model is refused unless force is set.
+    """
+    fmt = fmt or (snapshot_format(source) if isinstance(source, (str, os.PathLike)) else 'npz')
+    manifest, ids, texts, metadatas, vectors = read_snapshot(source, fmt)
+    if manifest.get('version') != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {manifest.get('version')}")
+    if embedding_model and manifest.get('embedding_model') != embedding_model and not force:
+        raise ValueError(
+            f"Snapshot was embedded with {manifest.get('embedding_model')}, "
+            f"this environment uses {embedding_model}"
+        )
+
+    if replace:
+        store.delete(filter={})
+    keep_ids = isinstance(store, LocalVectorIndex)
+    for i in range(0, len(texts), batch_size):
+        store.add_texts(
+            texts[i:i + batch_size],
+            metadatas[i:i + batch_size],
+            embeddings=vectors[i:i + batch_size].tolist(),
+            **({'ids': ids[i:i + batch_size]} if keep_ids else {})
+        )
+    if keep_ids:
+        store.save()
+    logging.info(f"Imported {len(texts)} vectors from snapshot of {manifest.get('table_name')}")
+    return manifest
+
+
+def export_bytes(store, embedding_model: str, table_name: str, conn=None) -> bytes:
+    buffer = io.BytesIO()
+    export_snapshot(store, buffer, embedding_model, table_name, conn=conn, fmt='npz')
+    return buffer.getvalue()
@@ -0,0 +1,20 @@
+from langchain.text_splitter import CharacterTextSplitter, RecursiveCharacterTextSplitter
+
+
+def build_text_splitter(splitter_type: str, chunk_size: int, chunk_overlap: int):
+    """Create the splitter selected in the text_splitter section of rag_config.json.
+
+    Chunks carry their start_index so overlapping neighbours can be merged again at query time.
+    """
+    if splitter_type == 'CharacterTextSplitter':
+        return CharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            add_start_index=True
+        )
+    # RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        add_start_index=True
+    )
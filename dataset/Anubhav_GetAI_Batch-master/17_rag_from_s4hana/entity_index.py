@@ -0,0 +1,194 @@
+# Copy of 17_rag_kge/entity_index.py, the canonical source: this scenario is deployed on its own and cannot import
+# from the other folder. Make changes there first and copy them here.
+# Anubhav Trainings : Entity lookup index for the KG retriever
+# Instead of letting every question scan the whole graph with REGEX(str(?s), ...) filters, question terms
+# are resolved to entity IRIs up front and the SPARQL query binds them with VALUES, which the triple store
+# answers from its subject/object indexes. Query latency then stays flat as the graph grows.
+#
+# The index holds, per entity IRI of our namespace, its normalized local name (underscores, dashes and
+# case folded), aliases from label-like literal properties, and the token n-grams of both.
+import json
+import math
+import os
+import re
+from collections import defaultdict
+from urllib.parse import unquote
+from xml.etree import ElementTree as ET
+
+from triple_loader import escape_iri
+
+NAMESPACE = "http://anubhavtrainings.com/"
+SPARQL_RESULTS_NS = "{http://www.w3.org/2005/sparql-results#}"
+# Literal properties whose values are other names of the same entity
+ALIAS_PREDICATES = {"label", "alias", "altlabel", "name", "title", "synonym", "abbreviation", "acronym"}
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "of", "in", "on", "for", "to", "and", "or", "with",
+    "what", "which", "who", "how", "why", "when", "where", "do", "does", "can", "about", "tell", "me",
+    "explain", "describe", "list", "give", "show", "i", "we", "you", "it", "its", "this", "that", "there"
+}
+MAX_NGRAM = 3
+
+
+# Local name of an IRI: the part after the last / or #
+def local_name(iri):
+    return unquote(re.split(r"[/#]", iri.rstrip("/#"))[-1])
+
+
+# Case folded word tokens; underscores, dashes, camelCase and punctuation separate words
+def tokens(text):
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", text)
+    words = re.findall(r"[0-9a-z]+", text.casefold().replace("_", " "))
+    # Crude plural folding so "hotspot" finds "Hotspots"
+    return [w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w for w in words]
+
+
+def normalize(text):
+    return " ".join(tokens(text))
+
+
+def ngrams(words, max_n=MAX_NGRAM):
+    return {" ".join(words[i:i + n]) for n in range(1, max_n + 1) for i in range(len(words) - n + 1)}
+
+
+class EntityIndex:
+    def __init__(self, namespace=NAMESPACE):
+        self.namespace = namespace
+        # normalized label or alias -> entity IRIs
+        self.labels = defaultdict(set)
+        # token n-gram -> entity IRIs
+        self.grams = defaultdict(set)
+        # entity IRI -> number of tokens of its shortest name
+        self.lengths = {}
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def add_name(self, iri, name):
+        words = tokens(name)
+        if not words:
+            return
+        self.labels[" ".join(words)].add(iri)
+        for gram in ngrams(words):
+            self.grams[gram].add(iri)
+        self.lengths[iri] = min(self.lengths.get(iri, len(words)), len(words))
+
+    # Index subjects and IRI objects of our namespace, plus label-like literal values as aliases
+    def add_triple(self, s, p, o, o_is_literal=False):
+        for term in (s,) if o_is_literal else (s, o):
+            if term.startswith(self.namespace) and term not in self.lengths:
+                self.add_name(term, local_name(term))
+        if o_is_literal and s.startswith(self.namespace) and local_name(p).casefold() in ALIAS_PREDICATES:
+            self.add_name(s, o)
+
+    # (s, p, o) rdflib terms, e.g. the Graph written by generate_triple.py
+    def add_triples(self, triples):
+        from rdflib import Literal
+        for s, p, o in triples:
+            self.add_triple(str(s), str(p), str(o), isinstance(o, Literal))
+
+    @classmethod
+    def build(cls, triples, namespace=NAMESPACE):
+        index = cls(namespace)
+        index.add_triples(triples)
+        return index
+
+    @classmethod
+    def from_store(cls, conn, namespace=NAMESPACE):
+        """One full read of the graph through SPARQL_EXECUTE, for a store loaded by other means"""
+        query = f'SELECT ?s ?p ?o WHERE {{ ?s ?p ?o . FILTER(STRSTARTS(STR(?s), "{namespace}")) }}'
+        cursor = conn.cursor()
+        try:
+            resp = cursor.callproc('SPARQL_EXECUTE', (query, 'Metadata headers describing Input and/or Output', '?', None))
+        finally:
+            cursor.close()
+        index = cls(namespace)
+        for result in ET.fromstring(resp[2]).iter(f"{SPARQL_RESULTS_NS}result"):
+            row = {b.attrib["name"]: b[0] for b in result}
+            if {"s", "p", "o"} <= row.keys():
+                index.add_triple(row["s"].text or "", row["p"].text or "", row["o"].text or "",
+                                 row["o"].tag == f"{SPARQL_RESULTS_NS}literal")
+        return index
+
+    def save(self, path):
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "namespace": self.namespace,
+                "labels": {k: sorted(v) for k, v in self.labels.items()},
+                "lengths": self.lengths
+            }, f)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(data["namespace"])
+        for label, iris in data["labels"].items():
+            for iri in iris:
+                index.add_name(iri, label)
+        index.lengths.update(data["lengths"])
+        return index
+
+    def resolve(self, question, limit=10, min_coverage=0.5, generic_share=0.02):
+        """Entity IRIs mentioned in a question, best first.
+
+        Exact label/alias matches of question n-grams win, longest phrase first,
+        unless the only ones are single generic words (found in the names of more
+        than generic_share of the entities, e.g. "sap"). Otherwise entities are
+        ranked by the IDF-weighted question n-grams found in their names, keeping
+        those with at least min_coverage of their name's IDF weight covered or with
+        their most distinctive word in the question. Returns [] when nothing fits,
+        and the caller lets the LLM write the query.
+        """
+        words = tokens(question)
+        total = max(len(self.lengths), 1)
+
+        def idf(gram):
+            return math.log(1 + total / max(len(self.grams.get(gram, ())), 1))
+
+        def generic(phrase):
+            named = len(self.grams.get(phrase, ()))
+            return " " not in phrase and named > 1 and named > generic_share * total
+
+        exact, covered = [], set()
+        for n in range(len(words), 0, -1):
+            for i in range(len(words) - n + 1):
+                span = set(range(i, i + n))
+                phrase = " ".join(words[i:i + n])
+                if span & covered or phrase in STOPWORDS or phrase not in self.labels or generic(phrase):
+                    continue
+                exact.extend(sorted(self.labels[phrase] - set(exact)))
+                covered |= span
+        if exact:
+            return exact[:limit]
+
+        content = [w for w in words if w not in STOPWORDS]
+        scores = defaultdict(float)
+        for gram in ngrams(content):
+            for iri in self.grams.get(gram, ()):
+                scores[iri] += len(gram.split()) * idf(gram)
+        ranked = []
+        for iri, score in scores.items():
+            # Share of the name's IDF weight found in the question. On a large graph "hotspot" covers most of
+            # SAP_HANA_Hotspots since "sap" and "hana" are common there; on a small one all three weigh the
+            # same, so naming the most distinctive word of the name is enough as well
+            weights = {w: idf(w) for w in tokens(local_name(iri))}
+            matched = weights.keys() & set(content)
+            coverage = sum(weights[w] for w in matched) / max(sum(weights.values()), 1e-9)
+            if coverage >= min_coverage or any(weights[w] >= max(weights.values()) for w in matched):
+                ranked.append((score * coverage, iri))
+        ranked.sort(key=lambda item: (-item[0], item[1]))
+        return [iri for _, iri in ranked[:limit]]
+
+
+def entity_query(iris):
+    """All triples with one of the entities as subject or object, bound with VALUES instead of REGEX"""
+    values = " ".join(f"<{escape_iri(iri)}>" for iri in iris)
+    return (
+        "SELECT ?s ?p ?o\n"
+        "WHERE {\n"
+        f"    {{ VALUES ?s {{ {values} }} ?s ?p ?o . }}\n"
+        "    UNION\n"
+        f"    {{ VALUES ?o {{ {values} }} ?s ?p ?o . }}\n"
+        "}"
+    )
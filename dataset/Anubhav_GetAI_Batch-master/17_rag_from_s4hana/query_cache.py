@@ -0,0 +1,156 @@
+# Copy of 17_rag_kge/query_cache.py, the canonical source: this scenario is deployed on its own and cannot import
+# from the other folder. Make changes there first and copy them here.
+# Anubhav Trainings : Question -> SPARQL cache for the KG retriever
+# Generating the SPARQL query is the slowest step of a question, and most questions are repeats.
+# Queries that ran and returned results are kept in SQLite under the normalized question and the graph
+# version. Every loader (generate_triple.py, topo_triple.py, triple_store.py load/clear) bumps the version
+# of the graph it changed, so answers never come from an older graph. With an embedding function, close rephrasings are matched by cosine similarity as well.
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from entity_index import normalize
+
+# Next to this module, so loaders and the retriever share it whatever folder they are started from
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "query_cache.sqlite")
+
+
+def cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+# SQLite backed cache of validated SPARQL queries keyed by (graph, graph version, normalized question)
+class QueryCache:
+    # embed: optional callable str -> list of floats, e.g. an embeddings model's embed_query
+    def __init__(self, path=DEFAULT_PATH, embed=None, similarity=0.95):
+        self.path = path
+        self.embed = embed
+        self.similarity = similarity
+        self.lock = threading.Lock()
+        # (graph, version) -> [(embedding, query)] of the cached questions, loaded on first use
+        self.vectors = {}
+        self.stats = {"hits": 0, "similar_hits": 0, "misses": 0}
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS graph_versions ("
+            " graph TEXT PRIMARY KEY,"
+            " version INTEGER NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS queries ("
+            " graph TEXT NOT NULL,"
+            " version INTEGER NOT NULL,"
+            " question TEXT NOT NULL,"
+            " query TEXT NOT NULL,"
+            " embedding TEXT,"
+            " hits INTEGER NOT NULL DEFAULT 0,"
+            " created_at REAL NOT NULL,"
+            " PRIMARY KEY (graph, version, question))"
+        )
+        self.conn.commit()
+
+    def version(self, graph):
+        with self.lock:
+            row = self.conn.execute("SELECT version FROM graph_versions WHERE graph = ?", (graph,)).fetchone()
+        return row[0] if row else 0
+
+    # Called after the triples of a graph were reloaded: drops its cached queries
+    def invalidate(self, graph):
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO graph_versions (graph, version, updated_at) VALUES (?, 1, ?) "
+                "ON CONFLICT(graph) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at",
+                (graph, time.time())
+            )
+            self.conn.execute(
+                "DELETE FROM queries WHERE graph = ? AND version < (SELECT version FROM graph_versions WHERE graph = ?)",
+                (graph, graph)
+            )
+            self.conn.commit()
+            self.vectors = {key: value for key, value in self.vectors.items() if key[0] != graph}
+
+    def get(self, graph, question):
+        version = self.version(graph)
+        key = normalize(question)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT query FROM queries WHERE graph = ? AND version = ? AND question = ?",
+                (graph, version, key)
+            ).fetchone()
+            if row:
+                self.conn.execute(
+                    "UPDATE queries SET hits = hits + 1 WHERE graph = ? AND version = ? AND question = ?",
+                    (graph, version, key)
+                )
+                self.conn.commit()
+                self.stats["hits"] += 1
+                return row[0]
+        if self.embed:
+            try:
+                query = self.similar(graph, version, question)
+            except Exception as e:
+                # The cache must never fail the question: an embedding error is just a miss
+                print(f"Query cache similarity lookup failed: {e}")
+                query = None
+            if query:
+                self.stats["similar_hits"] += 1
+                return query
+        self.stats["misses"] += 1
+        return None
+
+    # Query of the most similar cached question, if it is similar enough
+    def similar(self, graph, version, question):
+        with self.lock:
+            if (graph, version) not in self.vectors:
+                rows = self.conn.execute(
+                    "SELECT embedding, query FROM queries WHERE graph = ? AND version = ? AND embedding IS NOT NULL",
+                    (graph, version)
+                ).fetchall()
+                self.vectors[(graph, version)] = [(json.loads(e), q) for e, q in rows]
+            vectors = self.vectors[(graph, version)]
+        if not vectors:
+            return None
+        vector = self.embed(question)
+        score, query = max(((cosine(vector, e), q) for e, q in vectors), key=lambda item: item[0])
+        return query if score >= self.similarity else None
+
+    # Store a query that ran and returned results for this question
+    def put(self, graph, question, query):
+        version = self.version(graph)
+        embedding = None
+        if self.embed:
+            try:
+                embedding = self.embed(question)
+            except Exception as e:
+                # Still cached for exact repeats, only the similarity match is lost
+                print(f"Query cache embedding failed: {e}")
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO queries (graph, version, question, query, embedding, hits, created_at) "
+                "VALUES (?, ?, ?, ?, ?, 0, ?)",
+                (graph, version, normalize(question), query,
+                 json.dumps(embedding) if embedding else None, time.time())
+            )
+            self.conn.commit()
+            if embedding and (graph, version) in self.vectors:
+                self.vectors[(graph, version)].append((embedding, query))
+
+    def close(self):
+        self.conn.close()
+
+
+# Start a new version of a graph after its triples were (re)loaded, from any loader.
+# Loaders and the retriever of another folder have to point QUERY_CACHE_PATH at the same file.
+def bump_graph_version(graph, path=None):
+    cache = QueryCache(path or os.getenv("QUERY_CACHE_PATH", DEFAULT_PATH))
+    try:
+        cache.invalidate(graph)
+    finally:
+        cache.close()
@@ -11,6 +11,9 @@ import pandas as pd
 import os
 import dotenv
 
+# Local triple store for offline development (TRIPLE_STORE=local), copied from 17_rag_kge
+from triple_store import local_store_connection
+
 def setup(): 
     dotenv.load_dotenv()  # Load environment variables from .env file
 
@@ -410,8 +413,8 @@ def generate_response_structured(question: str, results: pd.DataFrame, anthropic
 def process_question(question: str, conn, anthropic) -> str:
     """Main function to process a user question with better error handling"""
     try:
-        # Step 1: Extract relevant metadata using SPARQL
-        metadata = extract_metadata(question, conn)
+        # Step 1: Extract relevant metadata using SPARQL (from the local triple store if TRIPLE_STORE=local)
+        metadata = extract_metadata(question, local_store_connection() or conn)
         
         if not metadata:
             return "Could not retrieve database metadata."
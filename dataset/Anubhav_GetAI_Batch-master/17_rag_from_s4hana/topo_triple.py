@@ -166,11 +166,14 @@ generate_ttl()
 
 #Set up HANA Cloud Connection to import the ttl file 
 from hdbcli import dbapi
+# With TRIPLE_STORE=local the ttl file is loaded into the local triple store (triple_store.py) instead
+from triple_store import local_store_connection
+from query_cache import bump_graph_version
 # Establish connection to SAP HANA Cloud database
 
 
 # Establish connection to SAP HANA database
-conn = dbapi.connect(
+conn = local_store_connection() or dbapi.connect(
     user=os.getenv("HANA_USER"),  # Database username
     password=os.getenv("HANA_PASSWORD"),  # Database password
     address=os.getenv("HANA_HOST"),  # DB address
@@ -190,6 +193,8 @@ try:
         conn.cursor().callproc('SPARQL_EXECUTE', (ttlfp.read(), request_hdrs, '', None))
     
     print("Success! The RDF graph has been successfully ingested into SAP HANA Cloud as graph:", graphname)
+    # Cached SPARQL queries were validated against the previous triples of this graph
+    bump_graph_version(graphname)
     
 except Exception as e:
     print("Error occurred while ingesting the graph:", str(e))
@@ -0,0 +1,156 @@
+# Anubhav Trainings : Adaptive concurrency for bulk LLM calls
+# Concurrency follows AIMD (additive increase, multiplicative decrease) like TCP congestion control:
+# every fast success opens the window a little, a 429, timeout or slow answer halves it.
+# Failed calls are retried with jittered exponential backoff, honouring Retry-After.
+import asyncio
+import random
+import time
+
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+# Errors worth retrying; anything else (bad request, parsing errors) fails the item right away
+RETRYABLE_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError, asyncio.TimeoutError)
+# Errors that signal the deployment is saturated and concurrency has to go down
+CONGESTION_ERRORS = (RateLimitError, APITimeoutError, InternalServerError, asyncio.TimeoutError)
+
+
+# Concurrency window adjusted by AIMD on the outcome of each call
+class AIMDLimiter:
+    def __init__(self, initial=4, minimum=1, maximum=32, latency_target=60.0, decrease_factor=0.5, cooldown=5.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.last_decrease = 0.0
+        self.condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self):
+        async with self.condition:
+            self.in_flight -= 1
+            # Wake only as many waiters as there are free slots, not every pending item
+            self.condition.notify(max(0, int(self.limit) - self.in_flight))
+
+    def on_success(self, latency):
+        if latency > self.latency_target:
+            # Answers slowing down are the first sign of a saturated deployment
+            self.decrease()
+        else:
+            # +1 per window: each of the `limit` calls in flight adds 1/limit
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+    def decrease(self):
+        now = time.monotonic()
+        # All calls in flight when the quota runs out fail together; count them as one congestion event
+        if now - self.last_decrease < self.cooldown:
+            return
+        self.limit = max(self.minimum, self.limit * self.decrease_factor)
+        self.last_decrease = now
+
+
+# Seconds to wait as requested by the server (Retry-After headers of a 429), if any
+def retry_after(error):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+# Runs an async call for many items under an AIMD limiter with timeouts, retries and throughput reporting
+class AdaptiveScheduler:
+    def __init__(self, limiter, timeout=120.0, max_attempts=6, base_delay=1.0, max_delay=60.0,
+                 report_every=30.0, token_counter=None):
+        self.limiter = limiter
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.report_every = report_every
+        # Callable returning the tokens used so far, e.g. from get_openai_callback()
+        self.token_counter = token_counter
+        self.stats = {"done": 0, "failed": 0, "retries": 0, "throttled": 0, "timeouts": 0}
+        self.started = None
+
+    # Full jitter: a random delay up to the exponential bound, so retries do not arrive in waves
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    async def run_one(self, item, call, on_result, on_error):
+        error = None
+        timed_out = False
+        for attempt in range(1, self.max_attempts + 1):
+            await self.limiter.acquire()
+            start = time.monotonic()
+            try:
+                result = await asyncio.wait_for(call(item), self.timeout)
+            except RETRYABLE_ERRORS as e:
+                error = e
+                is_timeout = isinstance(e, (APITimeoutError, asyncio.TimeoutError))
+                # A chunk that timed out before is more likely just slow than a sign of congestion,
+                # so only its first timeout shrinks the window
+                if isinstance(e, CONGESTION_ERRORS) and not (is_timeout and timed_out):
+                    self.limiter.decrease()
+                if isinstance(e, RateLimitError):
+                    self.stats["throttled"] += 1
+                if is_timeout:
+                    self.stats["timeouts"] += 1
+                    timed_out = True
+            except Exception as e:
+                self.stats["failed"] += 1
+                on_error(item, e)
+                return
+            else:
+                self.limiter.on_success(time.monotonic() - start)
+                self.stats["done"] += 1
+                on_result(item, result)
+                return
+            finally:
+                # The slot is given back before sleeping so backoff does not block other items
+                await self.limiter.release()
+
+            if attempt < self.max_attempts:
+                self.stats["retries"] += 1
+                await asyncio.sleep(max(retry_after(error) or 0, self.backoff(attempt)))
+
+        self.stats["failed"] += 1
+        on_error(item, error)
+
+    def throughput(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        tokens = self.token_counter() if self.token_counter else 0
+        return {
+            **self.stats,
+            "concurrency": round(self.limiter.limit, 1),
+            "chunks_per_minute": round(self.stats["done"] * 60 / elapsed, 1),
+            "tokens_per_second": round(tokens / elapsed, 1),
+            "elapsed_seconds": round(elapsed, 1)
+        }
+
+    async def report(self, total):
+        while True:
+            await asyncio.sleep(self.report_every)
+            print(f"Progress {self.stats['done'] + self.stats['failed']}/{total}:", self.throughput())
+
+    async def run(self, items, call, on_result, on_error):
+        self.started = time.monotonic()
+        reporter = asyncio.create_task(self.report(len(items)))
+        try:
+            await asyncio.gather(*(self.run_one(item, call, on_result, on_error) for item in items))
+        finally:
+            reporter.cancel()
+        return self.throughput()
@@ -0,0 +1,105 @@
+# Anubhav Trainings : Checkpoint store for the triple extraction in generate_triple.py
+# Every chunk's LLMGraphTransformer result is saved in SQLite under (chunk hash, model id),
+# so a re-run only pays for chunks that are new or failed last time.
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from langchain_community.graphs.graph_document import GraphDocument
+
+DONE = "done"
+FAILED = "failed"
+
+
+def chunk_hash(text):
+    # Whitespace differences from re-splitting should not trigger a new extraction
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+# SQLite backed per-chunk extraction results keyed by (chunk hash, model id)
+class ExtractionStore:
+    def __init__(self, path="extraction_checkpoint.sqlite"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS extractions ("
+            " chunk_hash TEXT NOT NULL,"
+            " model_id TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " source TEXT,"
+            " result TEXT,"
+            " error TEXT,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " updated_at REAL NOT NULL,"
+            " PRIMARY KEY (chunk_hash, model_id))"
+        )
+        self.conn.commit()
+
+    # Hashes of chunks already extracted with this model
+    def completed(self, model_id):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT chunk_hash FROM extractions WHERE model_id = ? AND status = ?",
+                (model_id, DONE)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    # Saved graph documents of the given chunks, in the order of hashes
+    def load(self, model_id, hashes):
+        results = {}
+        with self.lock:
+            hashes = list(hashes)
+            for i in range(0, len(hashes), 500):
+                part = hashes[i:i + 500]
+                placeholders = ", ".join("?" * len(part))
+                rows = self.conn.execute(
+                    f"SELECT chunk_hash, result FROM extractions "
+                    f"WHERE model_id = ? AND status = ? AND chunk_hash IN ({placeholders})",
+                    (model_id, DONE, *part)
+                ).fetchall()
+                results.update(rows)
+        graph_documents = []
+        for h in hashes:
+            if h in results:
+                graph_documents.extend(GraphDocument.model_validate(d) for d in json.loads(results[h]))
+        return graph_documents
+
+    def save(self, hash_, model_id, graph_documents, source=None):
+        result = json.dumps([d.model_dump() for d in graph_documents])
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO extractions (chunk_hash, model_id, status, source, result, error, attempts, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, NULL, 1, ?) "
+                "ON CONFLICT(chunk_hash, model_id) DO UPDATE SET "
+                " status = excluded.status, source = excluded.source, result = excluded.result,"
+                " error = NULL, attempts = attempts + 1, updated_at = excluded.updated_at",
+                (hash_, model_id, DONE, source, result, time.time())
+            )
+            self.conn.commit()
+
+    def mark_failed(self, hash_, model_id, error, source=None):
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO extractions (chunk_hash, model_id, status, source, result, error, attempts, updated_at) "
+                "VALUES (?, ?, ?, ?, NULL, ?, 1, ?) "
+                "ON CONFLICT(chunk_hash, model_id) DO UPDATE SET "
+                " status = excluded.status, error = excluded.error,"
+                " attempts = attempts + 1, updated_at = excluded.updated_at",
+                (hash_, model_id, FAILED, source, str(error), time.time())
+            )
+            self.conn.commit()
+
+    def stats(self, model_id):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT status, COUNT(*) FROM extractions WHERE model_id = ? GROUP BY status",
+                (model_id,)
+            ).fetchall()
+        return dict(rows)
+
+    def close(self):
+        self.conn.close()
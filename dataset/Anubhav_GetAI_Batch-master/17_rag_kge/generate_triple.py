@@ -6,10 +6,8 @@ from langchain_core.documents import Document
 from langchain_experimental.graph_transformers import LLMGraphTransformer
 # Importing Text Splitter for breaking down text into manageable chunks
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-# ThreadPoolExecutor for parallel processing of text chunks
-from concurrent.futures import ThreadPoolExecutor
-# 'concurrent.futures' provides high-level interface for asynchronous execution to improve performance
-import concurrent.futures
+# asyncio runs the chunk extractions concurrently on one thread
+import asyncio
 # Importing PyPDFLoader to extract text from PDF documents
 from langchain_community.document_loaders import PyPDFLoader
 # Importing AzureChatOpenAI to use Azure's OpenAI services for LLM processing
@@ -24,6 +22,20 @@ import os
 # Importing database API from SAP HANA client for database connections
 from hdbcli import dbapi
 from dotenv import load_dotenv
+# Per-chunk checkpoint of extraction results so re-runs skip chunks that are already done
+from extraction_store import ExtractionStore, chunk_hash
+# AIMD concurrency with timeouts, jittered retries and throughput reporting for the LLM calls
+from adaptive_scheduler import AIMDLimiter, AdaptiveScheduler
+# Token usage of all LLM calls made inside the context, for the tokens per second figure
+from langchain_community.callbacks import get_openai_callback
+# Size-bounded, escaped batch upload of the triples with bisection on failing batches
+from triple_loader import TripleLoader
+# Local triple store used instead of SAP HANA when TRIPLE_STORE=local
+from triple_store import local_store_connection
+# Question term -> entity IRI lookup, rebuilt after every upload
+from entity_index import EntityIndex
+# Cached question -> SPARQL queries of the retriever, invalidated after every upload
+from query_cache import bump_graph_version
 
 ##1. Load Environment Variables
 load_dotenv()
@@ -38,7 +50,8 @@ print("HANA_HOST:", os.getenv("HANA_HOST"))
 print("HANA_USER:", os.getenv("HANA_USER"))
 # Note: In a production environment, avoid printing sensitive information like passwords
 
-conn = dbapi.connect(
+# With TRIPLE_STORE=local the triples go to the local store file instead (see triple_store.py)
+conn = local_store_connection() or dbapi.connect(
     user = os.getenv("HANA_USER"), # Alternatively, replace with your HANA Cloud username
     password = os.getenv("HANA_PASSWORD"),
     address = os.getenv("HANA_HOST"),
@@ -51,8 +64,17 @@ AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION")
 AZURE_OPENAI_CHAT_DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT_NAME")
 
+# Extraction concurrency starts low and adapts to the deployment quota (see adaptive_scheduler.py)
+EXTRACTION_INITIAL_CONCURRENCY = int(os.getenv("EXTRACTION_INITIAL_CONCURRENCY", "4"))
+EXTRACTION_MAX_CONCURRENCY = int(os.getenv("EXTRACTION_MAX_CONCURRENCY", "32"))
+# Seconds per extraction call before it is cancelled and retried
+EXTRACTION_TIMEOUT = float(os.getenv("EXTRACTION_TIMEOUT", "120"))
+# Successful calls slower than this also reduce concurrency
+EXTRACTION_LATENCY_TARGET = float(os.getenv("EXTRACTION_LATENCY_TARGET", "60"))
+EXTRACTION_MAX_ATTEMPTS = int(os.getenv("EXTRACTION_MAX_ATTEMPTS", "6"))
+
 # Initialize the Azure OpenAI client with gpt-4o model
-# Configuration includes timeout handling and retry policies for robustness
+# Timeouts and retries are handled per chunk by the adaptive scheduler, so the client does not retry on its own
 client = AzureChatOpenAI(
     azure_deployment=AZURE_OPENAI_CHAT_DEPLOYMENT_NAME,
     azure_endpoint= AZURE_OPENAI_ENDPOINT,
@@ -60,10 +82,14 @@ client = AzureChatOpenAI(
     api_version=AZURE_OPENAI_API_VERSION,
     temperature=1,  # Higher temperature for more creative outputs
     max_tokens=None, # No limit on response length
-    timeout=None,    # No timeout limit
-    max_retries=2    # Retry failed requests up to 2 times
+    timeout=EXTRACTION_TIMEOUT,  # Per request timeout
+    max_retries=0    # The scheduler retries with backoff and lowers concurrency on 429s
 )
 
+# Extraction results are checkpointed per (chunk hash, model id); a different deployment re-extracts everything
+EXTRACTION_MODEL_ID = os.getenv("EXTRACTION_MODEL_ID", AZURE_OPENAI_CHAT_DEPLOYMENT_NAME)
+extraction_store = ExtractionStore(os.getenv("EXTRACTION_CHECKPOINT", "extraction_checkpoint.sqlite"))
+
 # Create an empty RDF graph to store our knowledge triples
 g = Graph()
 
@@ -132,8 +158,41 @@ def create_chunks(documents, chunk_size=500, chunk_overlap=50):
     # Return the list of chunk documents
     return chunks
 
+# Extract the graph of every pending chunk concurrently, saving each result as soon as it arrives
+async def extract_chunks(llm_transformer, todo, store, model_id):
+    # Save each successful chunk right away so a crash later on does not lose it
+    def on_result(item, graph_document):
+        h, chunk = item
+        store.save(h, model_id, graph_document, chunk.metadata.get("source"))
+
+    # Record the failure; the next run retries this chunk
+    def on_error(item, error):
+        h, chunk = item
+        store.mark_failed(h, model_id, error, chunk.metadata.get("source"))
+        print(f"Error processing chunk {h[:12]} after retries: {type(error).__name__}: {error}")
+
+    with get_openai_callback() as usage:
+        limiter = AIMDLimiter(
+            initial=EXTRACTION_INITIAL_CONCURRENCY,
+            maximum=EXTRACTION_MAX_CONCURRENCY,
+            latency_target=EXTRACTION_LATENCY_TARGET
+        )
+        scheduler = AdaptiveScheduler(
+            limiter,
+            timeout=EXTRACTION_TIMEOUT,
+            max_attempts=EXTRACTION_MAX_ATTEMPTS,
+            token_counter=lambda: usage.total_tokens
+        )
+        return await scheduler.run(
+            todo,
+            lambda item: llm_transformer.aconvert_to_graph_documents([item[1]]),
+            on_result,
+            on_error
+        )
+
 # Main function to process documents into graph format using parallel execution
-def process_documents(llm_transformer):
+# Chunks already extracted by the same model are loaded from the checkpoint store instead of calling the LLM
+def process_documents(llm_transformer, store, model_id):
     # Load all documents from the source
     documents = load_documents()
 
@@ -146,31 +205,24 @@ def process_documents(llm_transformer):
     chunks = create_chunks(documents)
     print(f"Documents split into {len(chunks)} chunks.")
 
-    # List to store processed graph documents
-    graph_document_list = []
-
-    # Use thread pool for parallel processing to improve performance
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        futures = []
+    # Hash every chunk; identical chunks (e.g. repeated headers) are extracted only once
+    chunk_by_hash = {}
+    for chunk in chunks:
+        chunk_by_hash.setdefault(chunk_hash(chunk.page_content), chunk)
 
-        # Submit each chunk for processing asynchronously
-        for i, chunk in enumerate(chunks):
-            futures.append(executor.submit(llm_transformer.convert_to_graph_documents, [chunk]))
+    # Only new chunks and chunks that failed in an earlier run go to the LLM
+    done = store.completed(model_id)
+    todo = [(h, chunk) for h, chunk in chunk_by_hash.items() if h not in done]
+    print(f"{len(chunk_by_hash) - len(todo)} chunks restored from checkpoint, {len(todo)} to extract.")
 
-        # Collect results as they complete (not necessarily in order)
-        for i, future in enumerate(concurrent.futures.as_completed(futures)):
-            try:
-                # Get the processed graph document
-                graph_document = future.result()
-                # Add to our collection of graph documents
-                graph_document_list.extend(graph_document)
-                print(f"Chunk {i} processed into graph document.")
-            except Exception as e:
-                # Log errors for specific chunks without failing the entire process
-                print(f"Error processing chunk {i}: {e}")
+    # Concurrency adapts to throttling and latency instead of a fixed thread pool
+    if todo:
+        throughput = asyncio.run(extract_chunks(llm_transformer, todo, store, model_id))
+        print("Extraction throughput:", throughput)
 
-    # Return all successfully processed graph documents
-    return graph_document_list
+    print("Extraction status:", store.stats(model_id))
+    # Return the graph documents of all chunks of the current documents, restored and new
+    return store.load(model_id, chunk_by_hash.keys())
 
 # Function to create safe URIs by replacing problematic characters
 # This ensures valid RDF identifiers for all entities
@@ -179,7 +231,7 @@ def safe_uri(string):
     return URIRef(EX[string.replace(" ", "_").replace("/", "_")])
 
 # Process documents to extract structured graph information
-graph_documents = process_documents(llm_transformer)
+graph_documents = process_documents(llm_transformer, extraction_store, EXTRACTION_MODEL_ID)
 
 # Convert all extracted knowledge into RDF triples
 for document in graph_documents:
@@ -206,47 +258,32 @@ for document in graph_documents:
         # Add a triple representing the relationship
         g.add((source_uri, relationship_type_uri, target_uri))
 
-# Create a list of all generated RDF triples for storage and querying
-rdf_triples = []
-# Extract all triples from the RDF graph
-for s, p, o in g:
-    # Convert RDF terms to strings and store as a tuple
-    rdf_triples.append((str(s), str(p), str(o)))
-
-# Print all generated RDF triples for verification
-print(rdf_triples)
+# Print the number of generated RDF triples for verification
+print(f"Generated {len(g)} RDF triples")
 
+# Upload the triples to SAP HANA in size-bounded batches (rqx-load-protocol when available, else INSERT DATA)
+loader = TripleLoader(
+    conn,
+    graph_name="anubhav_training",
+    max_batch_bytes=int(os.getenv("TRIPLE_BATCH_BYTES", str(256 * 1024))),
+    protocol=os.getenv("TRIPLE_LOAD_PROTOCOL", "auto")
+)
+load_stats = loader.load(g)
 
-# Create a list to store formatted triples for SPARQL insertion
-triples = []
+# Print details of the upload; rejected triples are listed individually by the loader
+print("Upload Result:", load_stats)
 
-# Prepare to execute database operations with SAP HANA
-cursor = conn.cursor()
+# Build the entity lookup index used by retreiver.py to bind question entities with VALUES instead of REGEX scans.
+# The graph accumulates across runs, so the index covers everything in the store, not only this run's triples
+ENTITY_INDEX_PATH = os.getenv("ENTITY_INDEX_PATH", "entity_index.json")
 try:
-    # Format each triple for SPARQL insertion
-    for s, p, o in rdf_triples:
-        # Format as N-Triples syntax with angle brackets around URIs
-        triples.append(f"<{str(s)}> <{str(p)}> <{str(o)}>")
-
-    # Join all formatted triples into a single SPARQL insert statement
-    triples_str = " .\n    ".join(triples) + " ."
-
-    # Create the complete SPARQL INSERT DATA query
-    sparql_insert_query = f"INSERT DATA {{\n GRAPH <anubhav_training> {{\n    {triples_str}\n }}\n}}"
-
-    # Execute the query using SAP HANA's SPARQL stored procedure
-    resp = cursor.callproc('SPARQL_EXECUTE', (sparql_insert_query,"Accept: application/sparql-results+xml Content-Type: application/sparql-query", '?', None))
-
-    # Extract response details for logging and verification
-    metadata_headers = resp[3]  # OUT: Response metadata and headers
-    query_response = resp[2]     # OUT: Query execution response
-
-    # Print details of the insertion operation
-    print("Inserted Triple:", (s, p, o))
-    print("Response Metadata:", metadata_headers)
-    print("Query Response:", query_response)
-
-    
-finally:
-    # Ensure cursor is closed to free resources
-    cursor.close()
\ No newline at end of file
+    entity_index = EntityIndex.from_store(conn, namespace=str(EX))
+except Exception as e:
+    print(f"Could not read the graph back ({e}), adding this run's triples to the existing entity index")
+    entity_index = EntityIndex.load(ENTITY_INDEX_PATH) if os.path.exists(ENTITY_INDEX_PATH) else EntityIndex(str(EX))
+    entity_index.add_triples(g)
+entity_index.save(ENTITY_INDEX_PATH)
+print(f"Entity index: {len(entity_index)} entities")
+
+# Queries cached by retreiver.py were validated against the previous triples; start a new graph version
+bump_graph_version("anubhav_training")
@@ -0,0 +1,80 @@
+# Anubhav Trainings : Compact SPARQL results for the summarization prompt
+# The raw SPARQL-results XML spends most of its tokens on tags and repeated namespace URIs.
+# Here the bindings are parsed, IRIs shortened to readable names (http://anubhavtrainings.com/SAP_HANA_Hotspots
+# becomes "SAP HANA Hotspots"), duplicates dropped and the triples grouped per subject, one line each:
+#   SAP HANA Hotspots: HAS PART Hdbkpic, Hdbcons; IS A Tool
+# Lines are added until the token budget is used up.
+from collections import OrderedDict
+from xml.etree import ElementTree as ET
+
+from entity_index import NAMESPACE, SPARQL_RESULTS_NS, local_name
+
+# Rough tokens per character for English text and names, to avoid a tokenizer dependency
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+# Readable form of one binding: our IRIs and other IRIs by their local name with underscores as spaces,
+# literals with whitespace collapsed
+def readable(node, namespace=NAMESPACE):
+    value = node.text or ""
+    if node.tag == f"{SPARQL_RESULTS_NS}literal":
+        return " ".join(value.split())
+    if node.tag == f"{SPARQL_RESULTS_NS}uri":
+        value = value[len(namespace):] if value.startswith(namespace) else local_name(value)
+    return " ".join(value.replace("_", " ").split())
+
+
+# Rows of {variable: readable value} from a SPARQL-results XML document
+def parse_bindings(query_response, namespace=NAMESPACE):
+    root = ET.fromstring(query_response)
+    return [
+        {binding.attrib["name"]: readable(binding[0], namespace) for binding in result if len(binding)}
+        for result in root.iter(f"{SPARQL_RESULTS_NS}result")
+    ]
+
+
+def compact_results(query_response, max_tokens=3000, namespace=NAMESPACE):
+    """Compact text of a SPARQL result for an LLM prompt, at most about max_tokens long.
+
+    ?s ?p ?o results become one line per subject with its predicates and objects;
+    any other projection becomes one "var: value; ..." line per distinct row.
+    Input that is not SPARQL-results XML is returned unchanged.
+    """
+    if not query_response:
+        return query_response
+    try:
+        rows = parse_bindings(query_response, namespace)
+    except (ET.ParseError, TypeError):
+        return query_response
+
+    if rows and all({"s", "p", "o"} <= row.keys() for row in rows):
+        # subject -> predicate -> objects, keeping the order of the result and dropping repeats
+        subjects = OrderedDict()
+        for row in rows:
+            objects = subjects.setdefault(row["s"], OrderedDict()).setdefault(row["p"], [])
+            if row["o"] not in objects:
+                objects.append(row["o"])
+        lines = [
+            f"{s}: " + "; ".join(f"{p} {', '.join(objects)}" for p, objects in predicates.items())
+            for s, predicates in subjects.items()
+        ]
+    else:
+        lines = list(OrderedDict.fromkeys("; ".join(f"{k}: {v}" for k, v in row.items()) for row in rows))
+
+    kept, used = [], 0
+    for line in lines:
+        tokens = estimate_tokens(line)
+        if used + tokens > max_tokens:
+            if kept:
+                break
+            # A single subject larger than the whole budget is cut instead of dropped
+            line = line[:max_tokens * CHARS_PER_TOKEN]
+        kept.append(line)
+        used += tokens
+    if len(kept) < len(lines):
+        kept.append(f"({len(lines) - len(kept)} more entries omitted)")
+    return "\n".join(kept)
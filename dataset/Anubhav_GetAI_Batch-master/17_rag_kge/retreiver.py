@@ -2,6 +2,7 @@
 from langchain_core.language_models.base import BaseLanguageModel  # Base class for language models
 from pydantic import BaseModel, Field  # For data validation and settings management
 import boto3  # AWS SDK for Python
+from botocore.config import Config  # Connection pool, keep-alive and timeout settings for boto3 clients
 from langchain_aws import ChatBedrock  # LangChain integration for AWS Bedrock
 from langchain_core.prompts import PromptTemplate  # For creating prompt templates
 from typing_extensions import TypedDict, Annotated  # For type hints
@@ -9,9 +10,42 @@ from hdbcli import dbapi  # SAP HANA database connector
 from dotenv import load_dotenv  # For loading environment variables from .env file
 import os
 import json  # CHANGE 1: Added json import
+import threading  # Guards creation of the shared Bedrock clients and reloads of the entity index
+from typing import Any
+from triple_store import local_store_connection  # Local triple store for offline development (TRIPLE_STORE=local)
+from entity_index import EntityIndex, entity_query  # Question term -> entity IRI lookup built by generate_triple.py
+from query_cache import DEFAULT_PATH as QUERY_CACHE_DEFAULT_PATH, QueryCache  # Question -> SPARQL cache, invalidated when generate_triple.py reloads the graph
+from xml.etree import ElementTree as ET  # For checking SPARQL results before caching a query
+from result_compactor import compact_results  # Shrinks SPARQL result XML to compact per-subject lines for the prompt
 
 load_dotenv()  # Load environment variables from .env file
 
+# Connection settings for the Bedrock runtime clients: pooled keep-alive connections shared by all requests
+BEDROCK_CLIENT_CONFIG = Config(
+    max_pool_connections=int(os.getenv("BEDROCK_MAX_POOL_CONNECTIONS", "50")),  # Concurrent requests per client
+    tcp_keepalive=True,  # Keep idle pooled connections open instead of a new TLS handshake per call
+    connect_timeout=float(os.getenv("BEDROCK_CONNECT_TIMEOUT", "5")),
+    read_timeout=float(os.getenv("BEDROCK_READ_TIMEOUT", "120")),  # Long answers take a while to generate
+    retries={"max_attempts": 3, "mode": "adaptive"}
+)
+
+# One bedrock-runtime client per credentials and region, created once and shared by all threads
+bedrock_clients = {}
+bedrock_clients_lock = threading.Lock()
+
+def get_bedrock_client(aws_access_key_id, aws_secret_access_key, region_name):
+    key = (aws_access_key_id, aws_secret_access_key, region_name)
+    with bedrock_clients_lock:
+        if key not in bedrock_clients:
+            # boto3 sessions are not thread-safe but clients are, so the session is only used here
+            session = boto3.Session(
+                aws_access_key_id=aws_access_key_id,
+                aws_secret_access_key=aws_secret_access_key,
+                region_name=region_name
+            )
+            bedrock_clients[key] = session.client('bedrock-runtime', config=BEDROCK_CLIENT_CONFIG)
+        return bedrock_clients[key]
+
 # Define configuration model for AWS Bedrock using Pydantic
 class CustomBedrockLLMConfig(BaseModel):
     # Required model ID field with description
@@ -29,26 +63,18 @@ class CustomBedrockLLMConfig(BaseModel):
 class CustomBedrockLLM(BaseLanguageModel):
     # Class variable to hold configuration
     config: CustomBedrockLLMConfig
+    # Shared bedrock-runtime client, reused by every call
+    client: Any = None
 
     # Constructor method
     def __init__(self, **kwargs):
-        # Call parent class constructor
-        super().__init__(**kwargs)
-        # Initialize configuration with provided keyword arguments
-        self.config = CustomBedrockLLMConfig(**kwargs)
+        # Initialize configuration with provided keyword arguments and pass it to the parent class constructor
+        config = CustomBedrockLLMConfig(**kwargs)
+        super().__init__(config=config)
+        self.client = get_bedrock_client(config.aws_access_key_id, config.aws_secret_access_key, config.aws_region_name)
 
     # CHANGE 2: Fixed the _call method to use direct Bedrock invocation
     def _call(self, query):
-        # Create AWS session with credentials
-        session = boto3.Session(
-            aws_access_key_id=self.config.aws_access_key_id,  # Set access key
-            aws_secret_access_key=self.config.aws_secret_access_key,  # Set secret key
-            region_name=self.config.aws_region_name  # Set AWS region
-        )
-
-        # Create Bedrock client from session
-        bedrock_client = session.client('bedrock-runtime')  # CHANGE: Use bedrock-runtime instead of bedrock
-
         # CHANGE 3: Use proper direct invocation method
         try:
             # Convert query to string if it's a PromptValue object
@@ -73,7 +99,7 @@ class CustomBedrockLLM(BaseLanguageModel):
             }
 
             # Make the API call with inference profile ARN as model ID
-            response = bedrock_client.invoke_model(
+            response = self.client.invoke_model(
                 modelId=self.config.inference_profile_arn,  # Use inference profile ARN directly
                 body=json.dumps(body),
                 contentType='application/json',
@@ -124,13 +150,8 @@ AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")  # AWS access key ID
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")  # AWS secret access key
 AWS_DEFAULT_REGION = os.getenv("AWS_REGION_NAME")  # AWS region name
 
-# Initialize Bedrock runtime client
-bedrock_client = boto3.client(
-    service_name='bedrock-runtime',  # Specify Bedrock runtime service
-    aws_access_key_id=AWS_ACCESS_KEY_ID,  # Pass AWS credentials
-    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    region_name=AWS_DEFAULT_REGION  # Set AWS region
-)
+# Initialize Bedrock runtime client (shared with CustomBedrockLLM)
+bedrock_client = get_bedrock_client(AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_DEFAULT_REGION)
 
 # CHANGE 4: Modified ChatBedrock configuration to use inference profile ARN
 try:
@@ -148,14 +169,75 @@ except Exception as e:
     # Fallback to custom implementation
     anthropic = None
 
-# Establish connection to SAP HANA database
-conn = dbapi.connect(
+# Custom implementation used when ChatBedrock is not available, created once for all requests
+custom_llm = None
+if anthropic is None:
+    try:
+        custom_llm = CustomBedrockLLM(
+            model_id=os.getenv("MODEL_ID"),
+            aws_access_key_id=AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+            aws_region_name=AWS_DEFAULT_REGION,
+            inference_profile_arn=os.getenv("INFERENCE_PROFILE_ARN")
+        )
+    except Exception as e:
+        print(f"❌ Failed to configure CustomBedrockLLM: {e}")
+
+# Establish connection to SAP HANA database, or to the local triple store when TRIPLE_STORE=local
+conn = local_store_connection() or dbapi.connect(
     user=os.getenv("HANA_USER"),  # Database username
     password=os.getenv("HANA_PASSWORD"),  # Database password
     address=os.getenv("HANA_HOST"),  # DB address
     port=443  # Connection port
 )
 
+# Graph the triples are loaded into by generate_triple.py; cached queries are tied to its version
+GRAPH_NAME = "anubhav_training"
+
+# Cache of generated SPARQL queries; set QUERY_CACHE_EMBEDDING_MODEL (e.g. amazon.titan-embed-text-v2:0)
+# to also reuse queries of rephrased questions with cosine similarity >= QUERY_CACHE_SIMILARITY
+embed = None
+if os.getenv("QUERY_CACHE_EMBEDDING_MODEL"):
+    from langchain_aws import BedrockEmbeddings
+    embed = BedrockEmbeddings(client=bedrock_client, model_id=os.getenv("QUERY_CACHE_EMBEDDING_MODEL")).embed_query
+query_cache = QueryCache(
+    os.getenv("QUERY_CACHE_PATH", QUERY_CACHE_DEFAULT_PATH),
+    embed=embed,
+    similarity=float(os.getenv("QUERY_CACHE_SIMILARITY", "0.95"))
+)
+
+# Entity index: resolves question terms to IRIs so queries bind them with VALUES instead of REGEX scans.
+# generate_triple.py rewrites the file after every upload; a reload through other paths (topo_triple.py,
+# triple_store.py load) only bumps the graph version, then the index is rebuilt from the store.
+ENTITY_INDEX_PATH = os.getenv("ENTITY_INDEX_PATH", "entity_index.json")
+entity_index_state = {"index": None, "mtime": -1, "version": -1}
+entity_index_lock = threading.Lock()
+
+def current_entity_index():
+    mtime = os.path.getmtime(ENTITY_INDEX_PATH) if os.path.exists(ENTITY_INDEX_PATH) else None
+    version = query_cache.version(GRAPH_NAME)
+    with entity_index_lock:
+        state = entity_index_state
+        if (mtime, version) == (state["mtime"], state["version"]):
+            return state["index"]
+        try:
+            if mtime is not None and mtime != state["mtime"]:
+                index = EntityIndex.load(ENTITY_INDEX_PATH)
+            else:
+                # No index file, or the graph was reloaded without rewriting it: build from the store
+                index = EntityIndex.from_store(conn)
+                index.save(ENTITY_INDEX_PATH)
+                mtime = os.path.getmtime(ENTITY_INDEX_PATH)
+            print(f"✓ Entity index with {len(index)} entities")
+        except Exception as e:
+            print(f"❌ Entity index not available, using LLM generated queries only: {e}")
+            index = state["index"]
+        # Remember what was tried so a broken index is not reloaded on every question
+        state.update(index=index, mtime=mtime, version=version)
+        return index
+
+current_entity_index()
+
 # Define template for SPARQL query generation
 #give example in template and try different LLMs
 template = '''Given an input question, your task is to create a syntactically correct SPARQL query to retrieve information from an RDF graph. The graph may contain variations in spacing, underscores, dashes, capitalization, reversed relationships, and word order. You must account for these variations using the `REGEX()` function in SPARQL. In the RDF graph, subjects are represented as "s", objects are represented as "o", and predicates are represented as "p". Account for underscores.
@@ -189,6 +271,8 @@ class State(TypedDict):
     p: str  # Predicate for SPARQL query
     o: str  # Object for SPARQL query
     query: str  # The generated query
+    source: str  # Where the query came from: "index", "cache" or "llm"
+    use_index: bool  # False to skip the entity index lookup
 
 # Define output type for structured LLM response
 class QueryOutput(TypedDict):
@@ -198,6 +282,25 @@ class QueryOutput(TypedDict):
 # CHANGE 5: Modified write_query function to handle both ChatBedrock and custom implementation
 def write_query(state: State):
     """Generate SPARQL query to fetch information."""
+    # Questions naming known entities get an indexed VALUES lookup, no LLM call or REGEX scan needed
+    entity_index = current_entity_index() if state.get("use_index", True) else None
+    iris = entity_index.resolve(state["question"]) if entity_index else []
+    if iris:
+        query = entity_query(iris)
+        print(query)
+        return {"query": query, "source": "index"}
+
+    # Repeated (or, with embeddings, rephrased) questions reuse the query generated before
+    try:
+        cached = query_cache.get(GRAPH_NAME, state["question"])
+    except Exception as e:
+        # A broken cache must not fail the question
+        print(f"Query cache lookup failed: {e}")
+        cached = None
+    if cached:
+        print(cached)
+        return {"query": cached, "source": "cache"}
+
     # Format the prompt with the input question
     prompt = query_prompt_template.invoke({"input": state["question"]})
     
@@ -207,21 +310,14 @@ def write_query(state: State):
             structured_llm = anthropic.with_structured_output(QueryOutput)
             result = structured_llm.invoke(prompt)
         else:
-            # Fallback to custom implementation
-            custom_llm = CustomBedrockLLM(
-                model_id=os.getenv("MODEL_ID"),
-                aws_access_key_id=AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-                aws_region_name=AWS_DEFAULT_REGION,
-                inference_profile_arn=os.getenv("INFERENCE_PROFILE_ARN")
-            )
+            # Fallback to the shared custom implementation
             response = custom_llm._call(prompt)
             # Parse response as needed
             result = {"query": response}
         
         # Print and return the query
         print(result["query"])
-        return {"query": result["query"]}
+        return {"query": result["query"], "source": "llm"}
         
     except Exception as e:
         print(f"Error in query generation: {e}")
@@ -265,7 +361,7 @@ def execute_sparql(query_response):
 # Function to summarize query results into natural language
 def summarize_info(question, query_response):
     # Define prompt template for summarization
-    prompt = """Answer the user question below given the following relational information in XML format. Use as much as the query response as possible to give a full, detailed explanation. Interpret the URI and predicate information using context. Don't use phrases like 'the entity identified by the URI,' just say what the entity is.
+    prompt = """Answer the user question below given the following relational information, one line per entity in the form "entity: relation object, object; relation object". Use as much as the query response as possible to give a full, detailed explanation. Interpret the entity and relation names using context. Don't use phrases like 'the entity identified by the URI,' just say what the entity is.
     Also make sure the output is readable in a format that can be display through an HTML file, add appropriate formatting.
     Please remove unnecessary information. Do not add information about the triples. Do not add the source of the data.
     Do not include details about what they are identified as or what kind of entity they are unless asked. Do not add any suggestions unless explicitly asked. Simply give a crisp and direct answer to what has been asked!
@@ -279,7 +375,7 @@ def summarize_info(question, query_response):
     # Format the prompt with question and results
     prompt_input = summarize.invoke({
         "question": question,
-        "information": query_response
+        "information": compact_results(query_response, int(os.getenv("SUMMARY_TOKEN_BUDGET", "3000")))  # Compact lines instead of raw XML
     })
 
     # Define output type for summarization
@@ -294,14 +390,7 @@ def summarize_info(question, query_response):
             translate_llm = anthropic.with_structured_output(QuestionAnswer)
             final_answer = translate_llm.invoke(prompt_input)
         else:
-            # Fallback to custom implementation
-            custom_llm = CustomBedrockLLM(
-                model_id=os.getenv("MODEL_ID"),
-                aws_access_key_id=AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-                aws_region_name=AWS_DEFAULT_REGION,
-                inference_profile_arn=os.getenv("INFERENCE_PROFILE_ARN")
-            )
+            # Fallback to the shared custom implementation
             response = custom_llm._call(prompt_input)
             final_answer = {"final_answer": response}
         
@@ -311,9 +400,25 @@ def summarize_info(question, query_response):
     except Exception as e:
         print(f"Error in summarization: {e}")
 
+# A generated query is only worth caching if it ran and found something
+def has_results(query_response):
+    try:
+        return ET.fromstring(query_response).find(".//{http://www.w3.org/2005/sparql-results#}result") is not None
+    except (ET.ParseError, TypeError):
+        return False
+
 def process_workflow(question):
     sparql = write_query({"question": question})  # Generate SPARQL query
     response = execute_sparql(sparql)  # Execute query
+    if sparql.get("source") == "index" and not has_results(response):
+        # Stale or wrongly matched entities: fall back to the cached or generated query
+        sparql = write_query({"question": question, "use_index": False})
+        response = execute_sparql(sparql)
+    if sparql["query"] and sparql.get("source") == "llm" and has_results(response):
+        try:
+            query_cache.put(GRAPH_NAME, question, sparql["query"])  # Remember the validated query
+        except Exception as e:
+            print(f"Query cache update failed: {e}")
     return summarize_info(question, response)  # Generate and print answer
 
 # Main execution flow
@@ -0,0 +1,144 @@
+# Anubhav Trainings : Bulk loader for RDF triples into the SAP HANA Cloud triple store
+# Streams triples in size-bounded batches instead of one giant INSERT DATA statement.
+# Batches go over the rqx-load-protocol upload path (as in 17_rag_from_s4hana/topo_triple.py) when the
+# database accepts it, otherwise as SPARQL INSERT DATA. A failing batch is split in halves and retried,
+# so one bad triple is isolated and reported instead of failing the whole upload.
+import time
+
+from rdflib import BNode, Literal
+
+try:
+    from hdbcli import dbapi
+except ImportError:
+    # The local triple store (triple_store.py) runs without the SAP HANA client
+    dbapi = None
+
+# Characters that are not allowed inside an IRIREF in N-Triples / SPARQL
+IRI_UNSAFE = set('<>"{}|^`\\')
+
+INSERT_HEADERS = "Accept: application/sparql-results+xml Content-Type: application/sparql-query"
+
+
+# hdbcli style errors of the local triple store's cursor
+class StoreError(Exception):
+    def __init__(self, errorcode, errortext):
+        super().__init__(errorcode, errortext)
+        self.errorcode = errorcode
+        self.errortext = errortext
+
+
+class StoreProgrammingError(StoreError):
+    pass
+
+
+# What a failed SPARQL_EXECUTE raises, on SAP HANA or on the local store
+SPARQL_ERRORS = (StoreError,) if dbapi is None else (dbapi.Error, StoreError)
+
+
+# Percent-encode characters that would end or break an <...> IRI
+def escape_iri(iri):
+    return "".join(
+        "".join(f"%{b:02X}" for b in ch.encode("utf-8")) if ch in IRI_UNSAFE or ord(ch) <= 0x20 else ch
+        for ch in iri
+    )
+
+
+# Escape a string for a "..." literal
+def escape_literal(value):
+    return (value.replace("\\", "\\\\").replace('"', '\\"')
+            .replace("\n", "\\n").replace("\r", "\\r").replace("\t", "\\t"))
+
+
+# One RDF term in N-Triples syntax; IRIs in <>, literals quoted with their language or datatype
+def format_term(term):
+    if isinstance(term, Literal):
+        text = f'"{escape_literal(str(term))}"'
+        if term.language:
+            return f"{text}@{term.language}"
+        if term.datatype:
+            return f"{text}^^<{escape_iri(str(term.datatype))}>"
+        return text
+    if isinstance(term, BNode):
+        return f"_:{term}"
+    return f"<{escape_iri(str(term))}>"
+
+
+def format_triple(s, p, o):
+    return f"{format_term(s)} {format_term(p)} {format_term(o)} ."
+
+
+class TripleLoader:
+    # protocol: "auto" tries rqx-load first and falls back to INSERT DATA, or force "rqx" / "insert"
+    def __init__(self, conn, graph_name, max_batch_bytes=256 * 1024, max_batch_triples=5000, protocol="auto"):
+        self.conn = conn
+        self.graph_name = graph_name
+        self.max_batch_bytes = max_batch_bytes
+        self.max_batch_triples = max_batch_triples
+        self.protocol = "rqx" if protocol == "auto" else protocol
+        self.probe_rqx = protocol == "auto"
+        self.rejected = []
+        self.stats = {"triples": 0, "loaded": 0, "rejected": 0, "batches": 0, "bisections": 0}
+
+    # Send one batch of N-Triples lines with the current protocol
+    def send(self, lines):
+        cursor = self.conn.cursor()
+        try:
+            if self.protocol == "rqx":
+                request_hdrs = ''
+                request_hdrs += 'rqx-load-protocol: true' + '\r\n'
+                request_hdrs += 'rqx-load-graphname: ' + self.graph_name + '\r\n'
+                cursor.callproc('SPARQL_EXECUTE', ("\n".join(lines), request_hdrs, '', None))
+            else:
+                query = f"INSERT DATA {{\n GRAPH <{escape_iri(self.graph_name)}> {{\n" + "\n".join(lines) + "\n }\n}"
+                cursor.callproc('SPARQL_EXECUTE', (query, INSERT_HEADERS, '?', None))
+        finally:
+            cursor.close()
+
+    # Load a batch, splitting it in halves on failure until the bad triples are isolated
+    def load_batch(self, lines):
+        try:
+            self.send(lines)
+        except SPARQL_ERRORS as e:
+            if self.probe_rqx:
+                # Until one protocol succeeds, a failed upload is retried as INSERT DATA
+                self.protocol = "insert"
+                try:
+                    self.send(lines)
+                    print(f"rqx-load-protocol not available ({e}), using INSERT DATA")
+                    self.probe_rqx = False
+                    self.stats["loaded"] += len(lines)
+                    return
+                except SPARQL_ERRORS:
+                    # INSERT DATA fails as well, so it is (also) the data: bisect and keep probing
+                    self.protocol = "rqx"
+            if len(lines) == 1:
+                self.rejected.append((lines[0], str(e)))
+                self.stats["rejected"] += 1
+                print(f"Rejected triple {lines[0][:200]}: {e}")
+                return
+            self.stats["bisections"] += 1
+            middle = len(lines) // 2
+            self.load_batch(lines[:middle])
+            self.load_batch(lines[middle:])
+            return
+        self.probe_rqx = False
+        self.stats["loaded"] += len(lines)
+
+    # Stream (s, p, o) rdflib terms, e.g. an rdflib Graph, into the triple store
+    def load(self, triples):
+        start = time.monotonic()
+        lines, size = [], 0
+        for s, p, o in triples:
+            line = format_triple(s, p, o)
+            line_size = len(line.encode("utf-8")) + 1
+            if lines and (size + line_size > self.max_batch_bytes or len(lines) >= self.max_batch_triples):
+                self.stats["batches"] += 1
+                self.load_batch(lines)
+                lines, size = [], 0
+            lines.append(line)
+            size += line_size
+            self.stats["triples"] += 1
+        if lines:
+            self.stats["batches"] += 1
+            self.load_batch(lines)
+        return {**self.stats, "protocol": self.protocol, "seconds": round(time.monotonic() - start, 1)}
@@ -0,0 +1,980 @@
+# Anubhav Trainings : Local stand-in for the SAP HANA Cloud triple store
+# Lets the KG RAG scenarios run, be tested and benchmarked without a HANA Cloud instance.
+# Triples are kept in SPO, POS and OSP hash indexes per graph and appended to an N-Quads file.
+# The connection mimics hdbcli: cursor().callproc('SPARQL_EXECUTE', (query, headers, '?', None)) answers
+# SELECT queries with SPARQL-results XML in resp[2], so execute_sparql / parse_sparql_results work unchanged,
+# and accepts INSERT DATA, CLEAR/DROP GRAPH and rqx-load-protocol uploads for the loaders.
+#
+# Supported SPARQL: PREFIX, SELECT [DISTINCT] with FROM, basic graph patterns (including ; , and "a"),
+# GRAPH blocks, VALUES, UNION, FILTER with || && ! comparisons and REGEX/STR/STRSTARTS/STRENDS/CONTAINS/LCASE/UCASE/...,
+# ORDER BY, LIMIT and OFFSET.
+#
+# Usage:
+#   TRIPLE_STORE=local python service.py
+#   python triple_store.py load graph.ttl --graph anubhav_training
+#   python triple_store.py query "SELECT * WHERE { ?s ?p ?o } LIMIT 10"
+import argparse
+import numbers
+import os
+import re
+import threading
+from collections import defaultdict
+from xml.etree import ElementTree as ET
+
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib.namespace import RDF, XSD
+
+from triple_loader import StoreError, StoreProgrammingError, format_term
+
+SPARQL_RESULTS_NS = "http://www.w3.org/2005/sparql-results#"
+# Graph used for data inserted without a GRAPH block or rqx-load-graphname header
+DEFAULT_GRAPH = ""
+# Solutions the join order cost is estimated on
+JOIN_COST_SAMPLE = 32
+
+TOKEN_PATTERN = re.compile(r'''
+    (?P<ws>\s+|\#[^\n]*)
+  | (?P<iri><[^<>"{}|^`\\\x00-\x20]*>)
+  | (?P<string>"""(?:[^"\\]|\\.|"(?!""))*"""|\'\'\'(?:[^'\\]|\\.|'(?!''))*\'\'\'|"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*')
+  | (?P<var>[?$][A-Za-z0-9_]+)
+  | (?P<lang>@[A-Za-z]+(?:-[A-Za-z0-9]+)*)
+  | (?P<datatype>\^\^)
+  | (?P<number>[+-]?(?:\d+\.\d+|\d+)(?:[eE][+-]?\d+)?)
+  | (?P<pname>(?:[A-Za-z_][\w\-]*(?:\.[\w\-]+)*)?:(?:[\w\-:%]+(?:\.[\w\-:%]+)*)?)
+  | (?P<bnode>_:[\w\-]+)
+  | (?P<name>[A-Za-z_]\w*)
+  | (?P<op>\|\||&&|!=|<=|>=|[=<>!(){}.;,*])
+''', re.VERBOSE)
+
+ESCAPES = {"t": "\t", "n": "\n", "r": "\r", "b": "\b", "f": "\f", '"': '"', "'": "'", "\\": "\\"}
+
+
+class SparqlError(ValueError):
+    pass
+
+
+COMPARISON_PATTERN = re.compile(r"<=|<")
+# Tokens that end an operand: inside an expression the next "<" compares, it cannot start an IRI
+OPERAND_END = {"var", "number", "string", "lang", "iri", "pname"}
+
+
+def tokenize(text):
+    tokens, position = [], 0
+    # Parenthesis depth inside FILTER, where "?n<5&&?n>1" must not read "<5&&?n>" as an IRI
+    filter_depth, in_filter = 0, False
+    while position < len(text):
+        match = None
+        if in_filter and tokens and (tokens[-1][0] in OPERAND_END or tokens[-1][1] == ")"):
+            match = COMPARISON_PATTERN.match(text, position)
+            kind = "op"
+        if match is None:
+            match = TOKEN_PATTERN.match(text, position)
+            kind = match.lastgroup if match else None
+        if match is None:
+            raise SparqlError(f"Unexpected character {text[position]!r} at {position}")
+        position = match.end()
+        if kind == "ws":
+            continue
+        value = match.group()
+        tokens.append((kind, value))
+        if kind == "name" and value.upper() == "FILTER":
+            in_filter, filter_depth = True, 0
+        elif in_filter and value == "(":
+            filter_depth += 1
+        elif in_filter and value == ")":
+            filter_depth -= 1
+            in_filter = filter_depth > 0
+    return tokens
+
+
+def unescape(body):
+    return re.sub(
+        r'\\(u[0-9A-Fa-f]{4}|U[0-9A-Fa-f]{8}|.)',
+        lambda m: chr(int(m.group(1)[1:], 16)) if m.group(1)[0] in "uU" else ESCAPES.get(m.group(1), m.group(1)),
+        body
+    )
+
+
+# Variables are kept as plain "?name" strings in patterns, terms are rdflib objects
+def is_var(term):
+    return isinstance(term, str) and not isinstance(term, (URIRef, Literal, BNode)) and term.startswith("?")
+
+
+# ---- parser -------------------------------------------------------------
+
+class Parser:
+    def __init__(self, text):
+        self.tokens = tokenize(text)
+        self.index = 0
+        self.prefixes = {"rdf": str(RDF), "xsd": str(XSD), "rdfs": "http://www.w3.org/2000/01/rdf-schema#"}
+        self.blank_nodes = 0
+
+    def peek(self, offset=0):
+        position = self.index + offset
+        return self.tokens[position] if position < len(self.tokens) else (None, None)
+
+    def next(self):
+        token = self.peek()
+        if token[0] is None:
+            raise SparqlError("Unexpected end of query")
+        self.index += 1
+        return token
+
+    def keyword(self, *words):
+        kind, value = self.peek()
+        return kind == "name" and value.upper() in words
+
+    def accept(self, value):
+        if self.peek()[1] == value or (self.peek()[0] == "name" and str(self.peek()[1]).upper() == value):
+            self.index += 1
+            return True
+        return False
+
+    def expect(self, value):
+        if not self.accept(value):
+            raise SparqlError(f"Expected {value} but found {self.peek()[1]}")
+
+    def parse(self):
+        self.prologue()
+        if self.keyword("SELECT"):
+            query = self.select()
+        elif self.keyword("INSERT"):
+            query = self.insert_data()
+        elif self.keyword("CLEAR", "DROP"):
+            query = self.clear()
+        else:
+            raise SparqlError(f"Unsupported query form {self.peek()[1]}")
+        if self.peek()[0] is not None:
+            raise SparqlError(f"Unexpected {self.peek()[1]} after the query")
+        return query
+
+    def prologue(self):
+        while self.keyword("PREFIX", "BASE"):
+            if self.next()[1].upper() == "BASE":
+                self.next()
+                continue
+            kind, pname = self.next()
+            if kind != "pname" or not pname.endswith(":"):
+                raise SparqlError(f"Invalid prefix {pname}")
+            self.prefixes[pname[:-1]] = self.next()[1][1:-1]
+
+    def select(self):
+        self.expect("SELECT")
+        distinct = self.accept("DISTINCT") or self.accept("REDUCED")
+        variables = []
+        if self.accept("*"):
+            variables = None
+        else:
+            while self.peek()[0] == "var":
+                variables.append("?" + self.next()[1][1:])
+            if not variables:
+                raise SparqlError("Expected variables or * after SELECT (aggregates are not supported)")
+        graphs = []
+        while self.accept("FROM"):
+            self.accept("NAMED")
+            graphs.append(str(self.iri()))
+        self.accept("WHERE")
+        block = self.group(None)
+        order, limit, offset = [], None, 0
+        while self.peek()[0] is not None:
+            if self.accept("ORDER"):
+                self.expect("BY")
+                order = self.order_conditions()
+            elif self.accept("LIMIT"):
+                limit = int(self.next()[1])
+            elif self.accept("OFFSET"):
+                offset = int(self.next()[1])
+            else:
+                raise SparqlError(f"Unsupported solution modifier {self.peek()[1]}")
+        return {"type": "select", "variables": variables, "distinct": distinct, "graphs": graphs,
+                "block": block, "order": order, "limit": limit, "offset": offset}
+
+    def order_conditions(self):
+        conditions = []
+        while True:
+            if self.keyword("ASC", "DESC"):
+                descending = self.next()[1].upper() == "DESC"
+                self.expect("(")
+                conditions.append((self.expression(), descending))
+                self.expect(")")
+            elif self.peek()[0] == "var":
+                conditions.append((("var", "?" + self.next()[1][1:]), False))
+            elif self.peek()[1] == "(":
+                self.next()
+                conditions.append((self.expression(), False))
+                self.expect(")")
+            else:
+                break
+        if not conditions:
+            raise SparqlError("Expected ORDER BY condition")
+        return conditions
+
+    def insert_data(self):
+        self.expect("INSERT")
+        self.expect("DATA")
+        block = self.group(DEFAULT_GRAPH)
+        patterns = block["patterns"]
+        if block["filters"] or block["values"] or block["unions"] or any(is_var(t) for pattern in patterns for t in pattern):
+            raise SparqlError("INSERT DATA must not contain variables, filters, VALUES or UNION")
+        return {"type": "insert", "quads": patterns}
+
+    def clear(self):
+        self.next()
+        self.accept("SILENT")
+        if self.accept("ALL"):
+            return {"type": "clear", "graph": None}
+        if self.accept("DEFAULT"):
+            return {"type": "clear", "graph": DEFAULT_GRAPH}
+        self.expect("GRAPH")
+        return {"type": "clear", "graph": str(self.iri())}
+
+    # Group graph pattern: (s, p, o, graph) patterns, filter expressions, VALUES tables and UNION branches
+    def group(self, graph):
+        self.expect("{")
+        block = {"patterns": [], "filters": [], "values": [], "unions": []}
+        while not self.accept("}"):
+            if self.accept("."):
+                continue
+            if self.accept("FILTER"):
+                block["filters"].append(self.constraint())
+            elif self.accept("VALUES"):
+                block["values"].append(self.values())
+            elif self.accept("GRAPH"):
+                kind, _ = self.peek()
+                name = "?" + self.next()[1][1:] if kind == "var" else str(self.iri())
+                merge_block(block, self.group(name))
+            elif self.peek()[1] == "{":
+                branches = [self.group(graph)]
+                while self.accept("UNION"):
+                    branches.append(self.group(graph))
+                if len(branches) > 1:
+                    block["unions"].append(branches)
+                else:
+                    merge_block(block, branches[0])
+            elif self.keyword("OPTIONAL", "MINUS", "BIND", "SERVICE"):
+                raise SparqlError(f"{self.peek()[1].upper()} is not supported by the local triple store")
+            else:
+                block["patterns"] += self.triples(graph)
+        return block
+
+    # VALUES ?x { ... } or VALUES (?x ?y) { (...) (...) }; UNDEF leaves a variable unbound
+    def values(self):
+        if self.peek()[0] == "var":
+            variables = ["?" + self.next()[1][1:]]
+            single = True
+        else:
+            self.expect("(")
+            variables = []
+            while self.peek()[0] == "var":
+                variables.append("?" + self.next()[1][1:])
+            self.expect(")")
+            single = False
+        self.expect("{")
+        rows = []
+        while not self.accept("}"):
+            if single:
+                rows.append((None if self.accept("UNDEF") else self.term(),))
+                continue
+            self.expect("(")
+            row = []
+            while not self.accept(")"):
+                row.append(None if self.accept("UNDEF") else self.term())
+            if len(row) != len(variables):
+                raise SparqlError("VALUES row does not match its variables")
+            rows.append(tuple(row))
+        return variables, rows
+
+    # Triples block with ; and , abbreviations
+    def triples(self, graph):
+        patterns = []
+        subject = self.term()
+        while True:
+            predicate = RDF.type if self.accept("a") else self.term()
+            while True:
+                patterns.append((subject, predicate, self.term(), graph))
+                if not self.accept(","):
+                    break
+            if not self.accept(";"):
+                break
+            if self.peek()[1] in (".", "}"):
+                break
+        return patterns
+
+    def iri(self):
+        kind, value = self.next()
+        if kind == "iri":
+            return URIRef(value[1:-1])
+        if kind == "pname":
+            prefix, local = value.split(":", 1)
+            if prefix not in self.prefixes:
+                raise SparqlError(f"Unknown prefix {prefix}:")
+            return URIRef(self.prefixes[prefix] + local)
+        raise SparqlError(f"Expected IRI but found {value}")
+
+    def term(self):
+        kind, value = self.peek()
+        if kind == "var":
+            self.next()
+            return "?" + value[1:]
+        if kind in ("iri", "pname"):
+            return self.iri()
+        if kind == "bnode":
+            self.next()
+            return BNode(value[2:])
+        return self.literal()
+
+    def literal(self):
+        kind, value = self.next()
+        if kind == "string":
+            quote = 3 if value[:3] in ('"""', "'''") else 1
+            text = unescape(value[quote:-quote])
+            if self.peek()[0] == "lang":
+                return Literal(text, lang=self.next()[1][1:])
+            if self.peek()[0] == "datatype":
+                self.next()
+                return Literal(text, datatype=self.iri())
+            return Literal(text)
+        if kind == "number":
+            if re.fullmatch(r"[+-]?\d+", value):
+                return Literal(value, datatype=XSD.integer)
+            return Literal(value, datatype=XSD.double if "e" in value.lower() else XSD.decimal)
+        if kind == "name" and value.lower() in ("true", "false"):
+            return Literal(value.lower(), datatype=XSD.boolean)
+        raise SparqlError(f"Expected RDF term but found {value}")
+
+    # ---- filter expressions ---------------------------------------------
+
+    def constraint(self):
+        if self.peek()[1] == "(":
+            self.next()
+            expression = self.expression()
+            self.expect(")")
+            return expression
+        return self.primary()
+
+    def expression(self):
+        left = self.conjunction()
+        while self.accept("||"):
+            left = ("or", left, self.conjunction())
+        return left
+
+    def conjunction(self):
+        left = self.relational()
+        while self.accept("&&"):
+            left = ("and", left, self.relational())
+        return left
+
+    def relational(self):
+        left = self.unary()
+        if self.peek()[1] in ("=", "!=", "<", ">", "<=", ">="):
+            operator = self.next()[1]
+            return ("compare", operator, left, self.unary())
+        return left
+
+    def unary(self):
+        if self.accept("!"):
+            return ("not", self.unary())
+        return self.primary()
+
+    def primary(self):
+        kind, value = self.peek()
+        if value == "(":
+            self.next()
+            expression = self.expression()
+            self.expect(")")
+            return expression
+        if kind == "var":
+            self.next()
+            return ("var", "?" + value[1:])
+        if kind == "name" and value.lower() not in ("true", "false") and self.peek(1)[1] == "(":
+            self.next()
+            self.expect("(")
+            arguments = []
+            if not self.accept(")"):
+                while True:
+                    arguments.append(self.expression())
+                    if self.accept(")"):
+                        break
+                    self.expect(",")
+            return ("call", value.upper(), arguments)
+        if kind in ("iri", "pname"):
+            return ("const", self.iri())
+        return ("const", self.literal())
+
+
+def merge_block(block, inner):
+    for key in block:
+        block[key] += inner[key]
+
+
+# Variables of a group in order of appearance, for SELECT *
+def block_vars(block, found=None):
+    found = [] if found is None else found
+    for variables, _ in block["values"]:
+        found += [v for v in variables if v not in found]
+    for pattern in block["patterns"]:
+        found += [t for t in pattern if is_var(t) and t not in found]
+    for branches in block["unions"]:
+        for branch in branches:
+            block_vars(branch, found)
+    return found
+
+
+# ---- filter evaluation ----------------------------------------------------
+
+class ExpressionError(Exception):
+    pass
+
+
+NUMERIC_TYPES = {XSD.integer, XSD.decimal, XSD.double, XSD.float, XSD.int, XSD.long}
+
+
+def python_value(term):
+    if isinstance(term, Literal):
+        if term.datatype in NUMERIC_TYPES or term.datatype == XSD.boolean:
+            return term.toPython()
+        return str(term)
+    return term
+
+
+def effective_boolean(term):
+    if isinstance(term, bool):
+        return term
+    if isinstance(term, Literal):
+        value = python_value(term)
+        return bool(value)
+    raise ExpressionError("No effective boolean value")
+
+
+def text_of(term):
+    if isinstance(term, (Literal, URIRef)):
+        return str(term)
+    raise ExpressionError("Expected a literal or IRI")
+
+
+_regex_cache = {}
+
+
+def compiled_regex(pattern, flags):
+    key = (pattern, flags)
+    if key not in _regex_cache:
+        options = 0
+        options |= re.IGNORECASE if "i" in flags else 0
+        options |= re.DOTALL if "s" in flags else 0
+        options |= re.MULTILINE if "m" in flags else 0
+        _regex_cache[key] = re.compile(pattern, options)
+    return _regex_cache[key]
+
+
+def call_function(name, args):
+    if name == "BOUND":
+        return args[0] is not None
+    if any(a is None for a in args):
+        raise ExpressionError("Unbound variable")
+    if name == "STR":
+        return Literal(text_of(args[0]))
+    if name == "REGEX":
+        flags = str(args[2]) if len(args) > 2 else ""
+        return compiled_regex(str(args[1]), flags).search(text_of(args[0])) is not None
+    if name == "STRSTARTS":
+        return text_of(args[0]).startswith(text_of(args[1]))
+    if name == "STRENDS":
+        return text_of(args[0]).endswith(text_of(args[1]))
+    if name == "CONTAINS":
+        return text_of(args[1]) in text_of(args[0])
+    if name == "LCASE":
+        return Literal(text_of(args[0]).lower())
+    if name == "UCASE":
+        return Literal(text_of(args[0]).upper())
+    if name == "STRLEN":
+        return Literal(len(text_of(args[0])))
+    if name == "LANG":
+        return Literal(args[0].language or "") if isinstance(args[0], Literal) else Literal("")
+    if name in ("ISIRI", "ISURI"):
+        return isinstance(args[0], URIRef)
+    if name == "ISLITERAL":
+        return isinstance(args[0], Literal)
+    if name == "ISBLANK":
+        return isinstance(args[0], BNode)
+    if name == "SAMETERM":
+        return args[0] == args[1]
+    raise ExpressionError(f"Unsupported function {name}")
+
+
+def compare(operator, left, right):
+    if left is None or right is None:
+        raise ExpressionError("Unbound variable")
+    if operator in ("=", "!=") and not (isinstance(left, Literal) and isinstance(right, Literal)):
+        equal = left == right
+        return equal if operator == "=" else not equal
+    a, b = python_value(left), python_value(right)
+    try:
+        return {"=": a == b, "!=": a != b, "<": a < b, ">": a > b, "<=": a <= b, ">=": a >= b}[operator]
+    except TypeError:
+        raise ExpressionError("Incomparable values")
+
+
+def evaluate(expression, solution):
+    kind = expression[0]
+    if kind == "var":
+        return solution.get(expression[1])
+    if kind == "const":
+        return expression[1]
+    if kind == "or":
+        # SPARQL: an error on one side is ignored if the other side is true
+        try:
+            if effective_boolean(evaluate(expression[1], solution)):
+                return True
+        except ExpressionError:
+            return effective_boolean(evaluate(expression[2], solution))
+        return effective_boolean(evaluate(expression[2], solution))
+    if kind == "and":
+        return effective_boolean(evaluate(expression[1], solution)) and effective_boolean(evaluate(expression[2], solution))
+    if kind == "not":
+        return not effective_boolean(evaluate(expression[1], solution))
+    if kind == "compare":
+        return compare(expression[1], evaluate(expression[2], solution), evaluate(expression[3], solution))
+    if kind == "call":
+        if expression[1] == "BOUND":
+            return call_function("BOUND", [solution.get(expression[2][0][1])])
+        return call_function(expression[1], [evaluate(a, solution) for a in expression[2]])
+    raise ExpressionError(f"Unknown expression {kind}")
+
+
+def passes(expression, solution):
+    try:
+        return effective_boolean(evaluate(expression, solution))
+    except ExpressionError:
+        return False
+
+
+def expression_vars(expression):
+    if expression[0] == "var":
+        return {expression[1]}
+    variables = set()
+    for part in expression[1:]:
+        if isinstance(part, tuple):
+            variables |= expression_vars(part)
+        elif isinstance(part, list):
+            for argument in part:
+                variables |= expression_vars(argument)
+    return variables
+
+
+# ---- store ----------------------------------------------------------------
+
+# SPO, POS and OSP hash indexes of one graph
+class TripleIndex:
+    def __init__(self):
+        self.spo = defaultdict(lambda: defaultdict(set))
+        self.pos = defaultdict(lambda: defaultdict(set))
+        self.osp = defaultdict(lambda: defaultdict(set))
+        self.size = 0
+
+    def add(self, s, p, o):
+        if o in self.spo[s][p]:
+            return False
+        self.spo[s][p].add(o)
+        self.pos[p][o].add(s)
+        self.osp[o][s].add(p)
+        self.size += 1
+        return True
+
+    # Number of triples a pattern can match, used to order the joins
+    def estimate(self, s, p, o):
+        if s is not None:
+            if s not in self.spo:
+                return 0
+            if p is not None:
+                return len(self.spo[s].get(p, ()))
+            return sum(len(v) for v in self.spo[s].values())
+        if p is not None:
+            if p not in self.pos:
+                return 0
+            if o is not None:
+                return len(self.pos[p].get(o, ()))
+            return sum(len(v) for v in self.pos[p].values())
+        if o is not None:
+            return sum(len(v) for v in self.osp.get(o, {}).values())
+        return self.size
+
+    # All triples matching a pattern; None is a wildcard. Each case is answered by the fitting index
+    def match(self, s, p, o):
+        if s is not None:
+            by_predicate = self.spo.get(s)
+            if not by_predicate:
+                return
+            if p is not None:
+                objects = by_predicate.get(p, ())
+                if o is not None:
+                    if o in objects:
+                        yield s, p, o
+                    return
+                for obj in objects:
+                    yield s, p, obj
+            elif o is not None:
+                for pred in self.osp.get(o, {}).get(s, ()):
+                    yield s, pred, o
+            else:
+                for pred, objects in by_predicate.items():
+                    for obj in objects:
+                        yield s, pred, obj
+        elif p is not None:
+            by_object = self.pos.get(p)
+            if not by_object:
+                return
+            if o is not None:
+                for subj in by_object.get(o, ()):
+                    yield subj, p, o
+            else:
+                for obj, subjects in by_object.items():
+                    for subj in subjects:
+                        yield subj, p, obj
+        elif o is not None:
+            for subj, predicates in self.osp.get(o, {}).items():
+                for pred in predicates:
+                    yield subj, pred, o
+        else:
+            for subj, by_predicate in self.spo.items():
+                for pred, objects in by_predicate.items():
+                    for obj in objects:
+                        yield subj, pred, obj
+
+
+def write_quads(f, quads):
+    for s, p, o, graph in quads:
+        graph_term = f" {format_term(URIRef(graph))}" if graph != DEFAULT_GRAPH else ""
+        f.write(f"{format_term(s)} {format_term(p)} {format_term(o)}{graph_term} .\n")
+
+
+class LocalTripleStore:
+    # path: N-Quads file the store is loaded from and appended to; None keeps everything in memory
+    def __init__(self, path=None):
+        self.path = path
+        self.graphs = {}
+        self.lock = threading.RLock()
+        if path and os.path.exists(path):
+            self.load_file()
+
+    def __len__(self):
+        return sum(index.size for index in self.graphs.values())
+
+    def graph(self, name):
+        if name not in self.graphs:
+            self.graphs[name] = TripleIndex()
+        return self.graphs[name]
+
+    # ---- persistence ----
+
+    def load_file(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                parser = Parser(line)
+                s, p, o = parser.term(), parser.term(), parser.term()
+                graph = str(parser.iri()) if parser.peek()[1] != "." else DEFAULT_GRAPH
+                self.graph(graph).add(s, p, o)
+        print(f"Loaded {len(self)} triples in {len(self.graphs)} graphs from {self.path}")
+
+    def append_file(self, quads):
+        if not self.path or not quads:
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            write_quads(f, quads)
+
+    # After a CLEAR/DROP the file is rewritten from the indexes
+    def rewrite_file(self):
+        if not self.path:
+            return
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            for name, index in self.graphs.items():
+                write_quads(f, ((s, p, o, name) for s, p, o in index.match(None, None, None)))
+        os.replace(self.path + ".tmp", self.path)
+
+    # ---- writes ----
+
+    # Add (s, p, o) rdflib terms to a graph, returns the number of new triples
+    def add_triples(self, triples, graph=DEFAULT_GRAPH):
+        with self.lock:
+            index = self.graph(graph)
+            added = [(s, p, o, graph) for s, p, o in triples if index.add(s, p, o)]
+            self.append_file(added)
+        return len(added)
+
+    def clear(self, graph=None):
+        with self.lock:
+            if graph is None:
+                self.graphs = {}
+            else:
+                self.graphs.pop(graph, None)
+            self.rewrite_file()
+
+    # Bulk load an RDF file (Turtle, N-Triples, RDF/XML ...) or string into a graph
+    def load_rdf(self, source=None, data=None, graph=DEFAULT_GRAPH, format="turtle"):
+        rdf = Graph()
+        rdf.parse(source=source, data=data, format=format)
+        return self.add_triples(rdf, graph)
+
+    # ---- queries ----
+
+    def active_graphs(self, names):
+        # Without FROM the query sees the union of all graphs, like the generated queries expect
+        if not names:
+            return list(self.graphs.items())
+        return [(name, self.graphs[name]) for name in names if name in self.graphs]
+
+    def solve(self, block, graphs, solutions):
+        # VALUES first: the bound entities make the triple patterns selective
+        for variables, rows in block["values"]:
+            joined = []
+            for solution in solutions:
+                for row in rows:
+                    result = dict(solution)
+                    if all(result.setdefault(v, t) == t for v, t in zip(variables, row) if t is not None):
+                        joined.append(result)
+            solutions = joined
+        # Each UNION branch is evaluated on the solutions so far and the results are concatenated
+        for branches in block["unions"]:
+            solutions = [result for branch in branches for result in self.solve(branch, graphs, solutions)]
+
+        patterns = list(block["patterns"])
+        filters = [(f, expression_vars(f)) for f in block["filters"]]
+        # Variables bound in every solution; UNION branches can bind different ones
+        bound = set.intersection(*(set(solution) for solution in solutions)) if solutions else set()
+
+        while patterns and solutions:
+            # Greedy join order: the pattern with the fewest candidate triples for the current bindings,
+            # averaged over a sample spread across the solutions
+            sample = solutions[::max(1, len(solutions) // JOIN_COST_SAMPLE)][:JOIN_COST_SAMPLE]
+
+            def cost(pattern):
+                return sum(
+                    index.estimate(*[solution.get(t) if is_var(t) else t for t in pattern[:3]])
+                    for solution in sample for _, index in graphs
+                ) / len(sample)
+            pattern = min(patterns, key=cost)
+            patterns.remove(pattern)
+
+            extended = []
+            for solution in solutions:
+                extended.extend(self.extend(solution, pattern, graphs))
+            solutions = extended
+            bound |= {t for t in pattern if is_var(t)}
+
+            # Apply filters as soon as their variables are bound to keep intermediate results small
+            ready = [f for f, variables in filters if variables <= bound]
+            filters = [(f, variables) for f, variables in filters if not variables <= bound]
+            for expression in ready:
+                solutions = [s for s in solutions if passes(expression, s)]
+
+        for expression, _ in filters:
+            solutions = [s for s in solutions if passes(expression, s)]
+        return solutions
+
+    def extend(self, solution, pattern, graphs):
+        s, p, o, graph = pattern
+        terms = [solution.get(t) if is_var(t) else t for t in (s, p, o)]
+        if is_var(graph) and graph in solution:
+            graph = str(solution[graph])
+        if graph is None:
+            candidates = graphs
+        elif is_var(graph):
+            candidates = graphs
+        else:
+            candidates = [(graph, self.graphs[graph])] if graph in self.graphs else []
+
+        seen = set() if graph is None and len(candidates) > 1 else None
+        for name, index in candidates:
+            for triple in index.match(*terms):
+                if seen is not None:
+                    if triple in seen:
+                        continue
+                    seen.add(triple)
+                result = dict(solution)
+                consistent = True
+                for variable, value in zip((s, p, o), triple):
+                    if is_var(variable):
+                        if result.setdefault(variable, value) != value:
+                            consistent = False
+                            break
+                if consistent and is_var(graph):
+                    result[graph] = URIRef(name)
+                if consistent:
+                    yield result
+
+    def select(self, query):
+        with self.lock:
+            solutions = self.solve(query["block"], self.active_graphs(query["graphs"]), [{}])
+        variables = query["variables"]
+        if variables is None:
+            variables = block_vars(query["block"])
+        if query["order"]:
+            for expression, descending in reversed(query["order"]):
+                solutions.sort(key=lambda s: order_key(safe_evaluate(expression, s)), reverse=descending)
+        rows = [tuple(s.get(v) for v in variables) for s in solutions]
+        if query["distinct"]:
+            rows = list(dict.fromkeys(rows))
+        end = None if query["limit"] is None else query["offset"] + query["limit"]
+        return [v[1:] for v in variables], rows[query["offset"]:end]
+
+    def execute(self, text, headers=""):
+        """Run a SPARQL statement the way SPARQL_EXECUTE does; returns the response body"""
+        if "rqx-load-protocol: true" in (headers or ""):
+            match = re.search(r"rqx-load-graphname:\s*(\S+)", headers)
+            added = self.load_rdf(data=text, graph=match.group(1) if match else DEFAULT_GRAPH, format="turtle")
+            return f"{added} triples loaded"
+        query = Parser(text).parse()
+        if query["type"] == "select":
+            return results_xml(*self.select(query))
+        if query["type"] == "insert":
+            added = 0
+            by_graph = defaultdict(list)
+            for s, p, o, graph in query["quads"]:
+                by_graph[graph].append((s, p, o))
+            for graph, triples in by_graph.items():
+                added += self.add_triples(triples, graph)
+            return f"{added} triples inserted"
+        self.clear(query["graph"])
+        return "graph cleared"
+
+    def connect(self):
+        return LocalConnection(self)
+
+
+def safe_evaluate(expression, solution):
+    try:
+        return evaluate(expression, solution)
+    except ExpressionError:
+        return None
+
+
+# Sort unbound first, then blank nodes, IRIs and literals, numbers numerically
+def order_key(term):
+    if term is None:
+        return (0, 0, "")
+    if isinstance(term, BNode):
+        return (1, 0, str(term))
+    if isinstance(term, URIRef):
+        return (2, 0, str(term))
+    value = python_value(term) if isinstance(term, Literal) else term
+    if isinstance(value, numbers.Number) and not isinstance(value, bool):
+        return (3, value, "")
+    return (4, 0, str(term))
+
+
+def results_xml(variables, rows):
+    """SPARQL Query Results XML Format, as returned by SPARQL_EXECUTE"""
+    ET.register_namespace("", SPARQL_RESULTS_NS)
+    root = ET.Element(f"{{{SPARQL_RESULTS_NS}}}sparql")
+    head = ET.SubElement(root, f"{{{SPARQL_RESULTS_NS}}}head")
+    for name in variables:
+        ET.SubElement(head, f"{{{SPARQL_RESULTS_NS}}}variable", name=name)
+    results = ET.SubElement(root, f"{{{SPARQL_RESULTS_NS}}}results")
+    for row in rows:
+        result = ET.SubElement(results, f"{{{SPARQL_RESULTS_NS}}}result")
+        for name, term in zip(variables, row):
+            if term is None:
+                continue
+            binding = ET.SubElement(result, f"{{{SPARQL_RESULTS_NS}}}binding", name=name)
+            if isinstance(term, URIRef):
+                ET.SubElement(binding, f"{{{SPARQL_RESULTS_NS}}}uri").text = str(term)
+            elif isinstance(term, BNode):
+                ET.SubElement(binding, f"{{{SPARQL_RESULTS_NS}}}bnode").text = str(term)
+            else:
+                literal = ET.SubElement(binding, f"{{{SPARQL_RESULTS_NS}}}literal")
+                literal.text = str(term)
+                if term.language:
+                    literal.set("{http://www.w3.org/XML/1998/namespace}lang", term.language)
+                elif term.datatype:
+                    literal.set("datatype", str(term.datatype))
+    return '<?xml version="1.0" encoding="UTF-8"?>\n' + ET.tostring(root, encoding="unicode")
+
+
+# hdbcli-like cursor: only the SPARQL_EXECUTE procedure exists
+class LocalCursor:
+    def __init__(self, store):
+        self.store = store
+
+    def callproc(self, name, parameters):
+        if name.upper() != "SPARQL_EXECUTE":
+            raise StoreProgrammingError(0, f"Procedure {name} is not available in the local triple store")
+        text, headers = parameters[0], parameters[1]
+        try:
+            response = self.store.execute(text, headers)
+        except SparqlError as e:
+            raise StoreProgrammingError(0, f"SPARQL error: {e}")
+        except Exception as e:
+            raise StoreError(0, f"Local triple store error: {e}")
+        return (text, headers, response, "Content-Type: application/sparql-results+xml")
+
+    def close(self):
+        pass
+
+
+class LocalConnection:
+    def __init__(self, store):
+        self.store = store
+
+    def cursor(self):
+        return LocalCursor(self.store)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path=None):
+    """One store per file and process, so the N-Quads file is read once"""
+    path = path or os.getenv("TRIPLE_STORE_PATH", "triple_store.nq")
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = LocalTripleStore(path)
+        return _stores[path]
+
+
+def local_store_connection():
+    """Connection to the local store if TRIPLE_STORE=local, else None (use SAP HANA)"""
+    if os.getenv("TRIPLE_STORE", "hana").lower() != "local":
+        return None
+    return get_store().connect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local triple store for the KG RAG scenarios")
+    parser.add_argument("command", choices=["load", "query", "clear", "stats"])
+    parser.add_argument("argument", nargs="?", help="RDF file to load or SPARQL query to run")
+    parser.add_argument("--graph", default="anubhav_training")
+    parser.add_argument("--format", default=None, help="rdflib format, guessed from the file extension by default")
+    parser.add_argument("--store", default=os.getenv("TRIPLE_STORE_PATH", "triple_store.nq"))
+    args = parser.parse_args()
+    # Cached retriever queries of a changed graph must not be served any more
+    from query_cache import bump_graph_version
+
+    store = LocalTripleStore(args.store)
+    if args.command == "load":
+        rdf_format = args.format or {"ttl": "turtle", "nt": "nt", "rdf": "xml", "xml": "xml"}.get(
+            args.argument.rsplit(".", 1)[-1].lower(), "turtle")
+        added = store.load_rdf(source=args.argument, graph=args.graph, format=rdf_format)
+        print(f"Loaded {added} new triples into graph {args.graph}")
+        bump_graph_version(args.graph)
+    elif args.command == "query":
+        print(store.execute(args.argument))
+    elif args.command == "clear":
+        store.clear(args.graph)
+        print(f"Cleared graph {args.graph}")
+        bump_graph_version(args.graph)
+    else:
+        for name, index in store.graphs.items():
+            print(f"{name or '(default)'}: {index.size} triples")
+
+
+if __name__ == "__main__":
+    main()